@@ -0,0 +1,11 @@
+"""
+Cấu hình pytest cho các unit test ở thư mục gốc
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+# ChatOpenAI kiểm tra API key lúc khởi tạo (test không gọi OpenAI thật)
+os.environ.setdefault("OPENAI_API_KEY", "test-key")
@@ -5,6 +5,7 @@ Quản lý việc tạo và lưu trữ embeddings
 
 from typing import Dict, List, Any, Optional
 from datetime import datetime
+from pymongo.errors import BulkWriteError
 from tools.embedding_tool import EmbeddingTool
 from tools.vector_search_tool import VectorSearchTool
 from models.document_model import DocumentModel, DocumentUtils
@@ -80,8 +81,9 @@ class EmbeddingService:
                     "error": f"Lỗi khi chunk và embed: {chunk_result['error']}"
                 }
             
-            # Lưu từng chunk vào database
+            # Tạo document cho từng chunk, lưu cả file bằng một lần insert_many
             saved_chunks = []
+            inserted_docs = []
             for chunk_data in chunk_result["chunks"]:
                 # Tạo embedding document
                 embedding_doc = DocumentModel.create_embedding_document(
@@ -101,17 +103,36 @@ class EmbeddingService:
                     }
                 )
                 
-                # Lưu vào MongoDB
-                collection = self.db_manager.db[self.embeddings_collection]
-                result = collection.insert_one(embedding_doc)
+                # Lưu kèm vector đã chuẩn hóa (float16) để search không phải tính lại norm
+                # và token chữ thường để so khớp keyword không phải lower() content mỗi query
+                embedding_doc.update(VectorSearchTool.pack_embedding(chunk_data["embedding"]))
+                embedding_doc["content_tokens"] = VectorSearchTool.tokenize_content(chunk_data["content"])
+                
+                inserted_docs.append(embedding_doc)
                 
                 saved_chunks.append({
                     "chunk_index": chunk_data["chunk_index"],
-                    "document_id": str(result.inserted_id),
+                    "document_id": str(embedding_doc["_id"]),
                     "content_preview": chunk_data["content"][:100] + "...",
                     "token_count": chunk_data["token_count"]
                 })
             
+            # Lưu vào MongoDB (một round-trip cho tất cả chunks)
+            if inserted_docs:
+                collection = self.db_manager.db[self.embeddings_collection]
+                try:
+                    collection.insert_many(inserted_docs, ordered=False)
+                except BulkWriteError as e:
+                    # ordered=False: các chunk không lỗi vẫn được lưu -> vẫn cộng vào thống kê
+                    failed = {item["index"] for item in e.details.get("writeErrors", [])}
+                    saved_docs = [doc for i, doc in enumerate(inserted_docs) if i not in failed]
+                    print(f"⚠️ Chỉ lưu được {e.details.get('nInserted', len(saved_docs))}/{len(inserted_docs)} chunks")
+                    VectorSearchTool.record_stats(self.db_manager.db, self.embeddings_collection, saved_docs)
+                    raise
+            
+            # Cộng dồn thống kê embeddings (một update cho cả file)
+            VectorSearchTool.record_stats(self.db_manager.db, self.embeddings_collection, inserted_docs)
+            
             # Cập nhật file status
             self._update_file_status(file_id, "completed", {
                 "total_chunks": len(saved_chunks),
@@ -231,7 +252,8 @@ class EmbeddingService:
             
             cursor = collection.find(
                 {"type": content_type},
-                {"embedding": 0}  # Không lấy embedding vector để giảm kích thước
+                # Không lấy embedding vector và tokens keyword search để giảm kích thước
+                {"embedding": 0, "embedding_f16": 0, "embedding_i8": 0, "embedding_i8_scale": 0, "content_tokens": 0}
             ).limit(limit).sort("created_at", -1)
             
             results = []
@@ -0,0 +1,108 @@
+"""
+Unit test cho cache kết quả OCR và bỏ trang PDF trùng
+"""
+
+import time
+
+import numpy as np
+import pytest
+
+from tools import ocr_tool
+
+
+@pytest.fixture
+def ocr_cache(tmp_path, monkeypatch):
+    """Cache OCR sạch, SQLite nằm trong thư mục tạm"""
+    monkeypatch.setattr(ocr_tool, "OCR_CACHE_DB", str(tmp_path / "ocr_cache.sqlite"))
+    monkeypatch.setattr(ocr_tool, "_OCR_DB", None)
+    monkeypatch.setattr(ocr_tool, "_OCR_DB_FAILED", False)
+    monkeypatch.setattr(ocr_tool, "_OCR_CACHE", ocr_tool.OrderedDict())
+    yield ocr_tool
+    if ocr_tool._OCR_DB is not None:
+        ocr_tool._OCR_DB.close()
+
+
+def _result(text: str) -> dict:
+    return {"success": True, "text": text, "details": [{"text": text, "confidence": 90}]}
+
+
+def test_dedup_pages_keeps_first_occurrence_order():
+    """Trang trùng không được yield lại; order ánh xạ từng trang về trang duy nhất"""
+    a = np.zeros((4, 4), dtype=np.uint8)
+    b = np.full((4, 4), 255, dtype=np.uint8)
+    c = np.eye(4, dtype=np.uint8)
+    order = []
+
+    tool = ocr_tool.OCRTool(ocr_engine="tesseract")
+    unique = list(tool._dedup_pages(iter([a, b, a.copy(), c, b]), order))
+
+    assert [page.tobytes() for page in unique] == [a.tobytes(), b.tobytes(), c.tobytes()]
+    assert order == [0, 1, 0, 2, 1]
+
+
+def test_dedup_pages_distinguishes_shape():
+    """Cùng bytes nhưng khác shape là hai trang khác nhau"""
+    page = np.arange(16, dtype=np.uint8)
+    order = []
+
+    tool = ocr_tool.OCRTool(ocr_engine="tesseract")
+    unique = list(tool._dedup_pages([page.reshape(4, 4), page.reshape(2, 8)], order))
+
+    assert len(unique) == 2
+    assert order == [0, 1]
+
+
+def test_cache_key_isolation(ocr_cache):
+    """Cùng ảnh nhưng khác engine không dùng chung kết quả; key có tag cấu hình pipeline"""
+    tesseract_key = ocr_cache._ocr_cache_key("hash", "tesseract")
+    easyocr_key = ocr_cache._ocr_cache_key("hash", "easyocr")
+    assert tesseract_key != easyocr_key
+    assert ocr_cache._OCR_CONFIG_TAG in tesseract_key[1]
+
+    ocr_cache._ocr_cache_put(tesseract_key, _result("tesseract text"))
+
+    assert ocr_cache._ocr_cache_get(easyocr_key) is None
+    assert ocr_cache._ocr_cache_get(tesseract_key)["text"] == "tesseract text"
+
+
+def test_cache_returns_deep_copies(ocr_cache):
+    """Caller sửa list lồng trong kết quả (trước hoặc sau khi cache) không làm hỏng cache"""
+    key = ocr_cache._ocr_cache_key("hash", "tesseract")
+    result = _result("hello")
+    ocr_cache._ocr_cache_put(key, result)
+    result["details"].append({"text": "mutated"})
+
+    cached = ocr_cache._ocr_cache_get(key)
+    cached["details"][0]["text"] = "changed"
+
+    assert ocr_cache._ocr_cache_get(key)["details"] == [{"text": "hello", "confidence": 90}]
+
+
+def test_cache_skips_failed_results(ocr_cache):
+    key = ocr_cache._ocr_cache_key("hash", "tesseract")
+    ocr_cache._ocr_cache_put(key, {"success": False, "error": "boom"})
+
+    assert ocr_cache._ocr_cache_get(key) is None
+
+
+def test_disk_cache_expires_and_prunes(ocr_cache, monkeypatch):
+    """Entry quá hạn không được đọc lại từ đĩa; prune giữ tối đa OCR_CACHE_DB_MAX_ROWS entry mới nhất"""
+    monkeypatch.setattr(ocr_cache, "OCR_CACHE_DB_MAX_ROWS", 2)
+    keys = [ocr_cache._ocr_cache_key(f"hash{i}", "tesseract") for i in range(3)]
+    for key in keys:
+        ocr_cache._ocr_cache_put(key, _result(key[0]))
+    db = ocr_cache._OCR_DB
+
+    # Entry đầu tiên quá hạn: bỏ khỏi cache RAM thì không đọc lại được từ đĩa
+    db.execute(
+        "UPDATE ocr_cache SET created_at = ? WHERE key = ?",
+        (time.time() - ocr_cache.OCR_CACHE_DB_TTL - 1, ":".join(keys[0]))
+    )
+    db.commit()
+    ocr_cache._OCR_CACHE.clear()
+    assert ocr_cache._ocr_cache_get(keys[0]) is None
+    assert ocr_cache._ocr_cache_get(keys[2])["text"] == "hash2"
+
+    ocr_cache._ocr_cache_prune(db)
+    remaining = {row[0] for row in db.execute("SELECT key FROM ocr_cache")}
+    assert remaining == {":".join(keys[1]), ":".join(keys[2])}
@@ -0,0 +1,92 @@
+"""
+Unit test cho phần số học của VectorSearchTool: đóng gói embedding float16/int8 và chọn top-k
+"""
+
+import numpy as np
+
+from tools.vector_search_tool import VectorSearchTool
+
+
+def _tool() -> VectorSearchTool:
+    """VectorSearchTool không kết nối MongoDB (các hàm được test không dùng database)"""
+    return VectorSearchTool.__new__(VectorSearchTool)
+
+
+def test_pack_embedding_f16_round_trip():
+    """embedding_f16 giải mã lại gần đúng unit vector của embedding gốc"""
+    rng = np.random.default_rng(0)
+    embedding = rng.normal(size=1536).astype(np.float32) * 3
+    unit = embedding / np.linalg.norm(embedding)
+
+    packed = VectorSearchTool.pack_embedding(embedding.tolist())
+
+    f16 = np.frombuffer(packed["embedding_f16"], dtype=np.float16).astype(np.float32)
+    assert f16.shape == unit.shape
+    np.testing.assert_allclose(f16, unit, atol=1e-3)
+
+
+def test_pack_embedding_i8_round_trip():
+    """embedding_i8 / embedding_i8_scale giải mã lại gần đúng unit vector, dùng hết dải int8"""
+    rng = np.random.default_rng(0)
+    embedding = rng.normal(size=1536).astype(np.float32) * 3
+    unit = embedding / np.linalg.norm(embedding)
+
+    packed = VectorSearchTool.pack_embedding(embedding.tolist())
+
+    i8 = np.frombuffer(packed["embedding_i8"], dtype=np.int8).astype(np.float32)
+    scale = packed["embedding_i8_scale"]
+    assert np.abs(i8).max() == 127
+    np.testing.assert_allclose(i8 / scale, unit, atol=0.5 / scale + 1e-6)
+
+
+def test_pack_embedding_zero_vector():
+    """Vector 0 không sinh NaN và dùng scale mặc định"""
+    packed = VectorSearchTool.pack_embedding([0.0] * 8)
+
+    assert packed["embedding_i8_scale"] == 1.0
+    assert not np.frombuffer(packed["embedding_i8"], dtype=np.int8).any()
+    assert not np.isnan(np.frombuffer(packed["embedding_f16"], dtype=np.float16)).any()
+
+
+def test_int8_ranking_matches_float():
+    """Chấm điểm bằng int8 giữ nguyên document tốt nhất so với cosine float32"""
+    rng = np.random.default_rng(1)
+    docs = rng.normal(size=(200, 256)).astype(np.float32)
+    query = docs[42] + rng.normal(scale=0.1, size=256).astype(np.float32)
+    query /= np.linalg.norm(query)
+
+    packed = [VectorSearchTool.pack_embedding(doc.tolist()) for doc in docs]
+    i8 = np.stack([np.frombuffer(p["embedding_i8"], dtype=np.int8) for p in packed]).astype(np.float32)
+    scales = np.array([p["embedding_i8_scale"] for p in packed], dtype=np.float32)
+    approx = (i8 @ query) / scales
+    exact = (docs / np.linalg.norm(docs, axis=1, keepdims=True)) @ query
+
+    assert int(np.argmax(approx)) == int(np.argmax(exact)) == 42
+
+
+def test_unit_embedding_matrix_mixes_packed_and_raw():
+    """Documents có embedding_f16 và documents cũ chỉ có embedding cho cùng ma trận unit vectors"""
+    rng = np.random.default_rng(2)
+    vectors = rng.normal(size=(3, 16)).astype(np.float32)
+    docs = [
+        {"_id": 0, "embedding": vectors[0].tolist(), **VectorSearchTool.pack_embedding(vectors[0].tolist())},
+        {"_id": 1, "embedding": vectors[1].tolist()},
+        {"_id": 2, "embedding": [1.0] * 4},  # khác số chiều -> bỏ qua
+        {"_id": 3, "embedding": vectors[2].tolist()},
+    ]
+
+    valid, matrix = _tool()._unit_embedding_matrix(docs, 16)
+
+    assert valid.tolist() == [0, 1, 3]
+    expected = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    np.testing.assert_allclose(matrix, expected, atol=1e-3)
+
+
+def test_top_k_orders_candidates():
+    """_top_k trả về k chỉ số score cao nhất theo thứ tự giảm dần, chỉ trong candidates"""
+    scores = np.array([0.1, 0.9, 0.5, 0.7, 0.3], dtype=np.float32)
+    tool = _tool()
+
+    assert tool._top_k(scores, 3).tolist() == [1, 3, 2]
+    assert tool._top_k(scores, 2, np.array([0, 2, 4])).tolist() == [2, 4]
+    assert tool._top_k(scores, 0).tolist() == []
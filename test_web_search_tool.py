@@ -0,0 +1,238 @@
+"""
+Unit test cho WebSearchTool: circuit breaker DuckDuckGo, tách cache và gộp đánh giá async
+"""
+
+import asyncio
+import re
+
+import httpx
+import pytest
+
+from tools import web_search_tool as wst
+
+
+DDG_PAYLOAD = {
+    "RelatedTopics": [
+        {"Text": "Present perfect is used for past actions with present relevance", "FirstURL": "https://a.example/1"},
+        {"Text": "Past simple describes finished actions", "FirstURL": "https://a.example/2"}
+    ]
+}
+
+
+@pytest.fixture
+def tool():
+    return wst.WebSearchTool()
+
+
+def _transport(calls: list, status: int = 200, error: Exception = None, payload: dict = DDG_PAYLOAD) -> httpx.MockTransport:
+    """Transport httpx ghi lại số request và trả về status/payload/lỗi cố định"""
+    def handler(request):
+        calls.append(request)
+        if error is not None:
+            raise error
+        return httpx.Response(status, json=payload if status == 200 else {})
+    return httpx.MockTransport(handler)
+
+
+def test_breaker_opens_after_repeated_failures(tool):
+    """Đủ BREAKER_MAX_FAILURES lỗi -> các lần search sau không gọi DuckDuckGo"""
+    calls = []
+    tool._http_sync = httpx.Client(transport=_transport(calls, error=httpx.ConnectError("down")))
+
+    for i in range(wst.BREAKER_MAX_FAILURES):
+        assert tool.search_duckduckgo(f"query {i}") == []
+    assert tool._breaker_is_open()
+
+    assert tool.search_duckduckgo("another query") == []
+    assert len(calls) == wst.BREAKER_MAX_FAILURES
+
+
+def test_breaker_counts_non_200_and_resets_on_success(tool):
+    """HTTP lỗi tính là failure; một lần thành công reset bộ đếm"""
+    calls = []
+    tool._http_sync = httpx.Client(transport=_transport(calls, status=503))
+    for i in range(wst.BREAKER_MAX_FAILURES - 1):
+        tool.search_duckduckgo(f"query {i}")
+    assert tool._breaker["failures"] == wst.BREAKER_MAX_FAILURES - 1
+
+    tool._http_sync = httpx.Client(transport=_transport(calls))
+    assert len(tool.search_duckduckgo("ok query")) == 2
+    assert tool._breaker["failures"] == 0
+    assert not tool._breaker_is_open()
+
+
+def test_breaker_closes_after_cooldown(tool):
+    """Hết thời gian ngắt thì DuckDuckGo được gọi lại"""
+    calls = []
+    tool._http_sync = httpx.Client(transport=_transport(calls))
+    for _ in range(wst.BREAKER_MAX_FAILURES):
+        tool._breaker_failure()
+    assert tool.search_duckduckgo("blocked") == []
+    assert calls == []
+
+    tool._breaker["open_until"] = 0.0
+    assert len(tool.search_duckduckgo("allowed")) == 2
+    assert len(calls) == 1
+
+
+def test_breaker_async_path(tool):
+    """Bản async dùng chung trạng thái breaker"""
+    calls = []
+
+    async def run():
+        tool._http[asyncio.get_running_loop()] = httpx.AsyncClient(
+            transport=_transport(calls, error=httpx.ConnectError("down"))
+        )
+        for i in range(wst.BREAKER_MAX_FAILURES + 2):
+            assert await tool.search_duckduckgo_async(f"query {i}") == []
+
+    asyncio.run(run())
+    assert len(calls) == wst.BREAKER_MAX_FAILURES
+    assert tool._breaker_is_open()
+
+
+def test_evaluation_does_not_touch_engine_cache(tool):
+    """Đánh giá kết quả gộp không được ghi vào cache riêng của DuckDuckGo"""
+    merged = [
+        {"title": "t", "content": "SearX content", "url": "https://searx.example/1", "source": "SearX"},
+        {"title": "t", "content": "DuckDuckGo content", "url": "https://a.example/1", "source": "DuckDuckGo"}
+    ]
+    evaluation = {"is_relevant": True, "quality_score": 8, "summary": "ok",
+                  "recommendation": "use_search", "ttl_seconds": 604800}
+
+    stored = tool._store_evaluation("query", merged, evaluation)
+
+    assert "ttl_seconds" not in stored
+    assert tool._search_cache.get(("query", 5)) is None
+    assert tool._eval_cache.get(tool._eval_key("query", merged)) == stored
+
+
+def test_engine_and_query_cache_keys_are_separate(tool):
+    """Kết quả cuối của search_with_llm_fallback cache theo key riêng, không đè cache engine"""
+    calls = []
+    tool._http_sync = httpx.Client(transport=_transport(calls))
+    tool.search_engines["searx"] = None
+    tool._embed_query = lambda query: None
+
+    results = tool.search_with_llm_fallback("grammar")
+    assert len(results) == 2 and len(calls) == 1
+
+    # Lần hai trả từ cache theo query, không gọi embedding hay DuckDuckGo
+    tool._embed_query = lambda query: pytest.fail("embedding called on exact cache hit")
+    assert tool.search_with_llm_fallback("grammar") == results
+    assert len(calls) == 1
+    assert tool._search_cache.get(("grammar", 5)) == results
+
+
+def test_empty_results_are_cached_briefly(tool):
+    """Engine không có kết quả -> cache EMPTY_RESULTS, lần sau cùng query không gọi lại DuckDuckGo"""
+    calls = []
+    tool._http_sync = httpx.Client(transport=_transport(calls, payload={"RelatedTopics": []}))
+
+    assert tool.search_duckduckgo("no results") == []
+    assert tool._search_cache.get(("no results", 5)) == wst.EMPTY_RESULTS
+
+    assert tool.search_duckduckgo("no results") == []
+    assert len(calls) == 1
+
+
+def test_async_fanout_lets_slow_engine_finish(tool, monkeypatch):
+    """Engine chậm không bị hủy khi đã có kết quả: chạy xong trong nền và ghi vào cache"""
+    monkeypatch.setattr(wst, "SEARCH_FANOUT_TIMEOUT", 0.05)
+    tool.search_engines["searx"] = "https://searx.example/search"
+
+    async def handler(request):
+        if request.url.host == "searx.example":
+            await asyncio.sleep(0.2)
+            return httpx.Response(200, json={"results": [{"title": "slow", "content": "SearX content", "url": "https://searx.example/1"}]})
+        return httpx.Response(200, json=DDG_PAYLOAD)
+
+    async def run():
+        tool._http[asyncio.get_running_loop()] = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        results = await tool.search_all_engines_async("grammar")
+        assert [r["source"] for r in results] == ["DuckDuckGo", "DuckDuckGo"]
+        await asyncio.gather(*wst._BACKGROUND_SEARCHES)
+
+    asyncio.run(run())
+    assert tool._search_cache.get(("searx", "grammar", 5))[0]["source"] == "SearX"
+    assert not wst._BACKGROUND_SEARCHES
+
+
+class _FakeStructuredLLM:
+    """LLM giả cho BatchingEvaluator: trả đánh giá có summary = câu hỏi, hoặc ném lỗi"""
+
+    def __init__(self, schema, calls: list, fail: bool):
+        self.schema = schema
+        self.calls = calls
+        self.fail = fail
+
+    async def ainvoke(self, messages):
+        self.calls.append(self.schema)
+        await asyncio.sleep(0)
+        if self.fail:
+            raise RuntimeError("LLM unavailable")
+        queries = re.findall(r"Câu hỏi(?: \d+)?: (\S+)", messages[-1].content)
+        evaluations = [
+            wst.SearchEvaluation(is_relevant=True, quality_score=7, summary=query,
+                                 recommendation="use_search", ttl_seconds=0)
+            for query in queries
+        ]
+        if self.schema is wst.SearchEvaluationBatch:
+            return wst.SearchEvaluationBatch(evaluations=evaluations)
+        return evaluations[0]
+
+
+def _patch_llm(monkeypatch, fail: bool = False) -> list:
+    calls = []
+    monkeypatch.setattr(
+        wst, "_async_chat_model",
+        lambda model, temperature, schema=None: _FakeStructuredLLM(schema, calls, fail)
+    )
+    return calls
+
+
+def _results(i: int) -> list:
+    return [{"title": f"title {i}", "content": f"content {i} " * 10, "url": f"https://r.example/{i}", "source": "DuckDuckGo"}]
+
+
+async def _evaluate_all(evaluator, n: int) -> list:
+    return await asyncio.gather(*[evaluator.evaluate(f"q{i}", _results(i)) for i in range(n)])
+
+
+def test_batching_evaluator_resolves_every_future(tool, monkeypatch):
+    """Mỗi yêu cầu nhận đúng đánh giá của nó; 11 yêu cầu đồng thời = 2 lần gọi LLM (8 + 3)"""
+    calls = _patch_llm(monkeypatch)
+    evaluator = wst.BatchingEvaluator(tool)
+
+    evaluations = asyncio.run(_evaluate_all(evaluator, 11))
+
+    assert [e["summary"] for e in evaluations] == [f"q{i}" for i in range(11)]
+    assert calls == [wst.SearchEvaluationBatch, wst.SearchEvaluationBatch]
+
+
+def test_batching_evaluator_resolves_every_future_on_failure(tool, monkeypatch):
+    """LLM lỗi: mọi yêu cầu trong batch nhận đánh giá lỗi thay vì bị treo"""
+    _patch_llm(monkeypatch, fail=True)
+    evaluator = wst.BatchingEvaluator(tool)
+
+    evaluations = asyncio.run(asyncio.wait_for(_evaluate_all(evaluator, 5), timeout=5))
+
+    assert len(evaluations) == 5
+    assert all(e["recommendation"] == "llm_response" for e in evaluations)
+    assert all("LLM unavailable" in e["summary"] for e in evaluations)
+
+
+def test_batching_evaluator_survives_new_event_loops(tool, monkeypatch):
+    """Timer bị hủy ở loop trước không làm treo các lần đánh giá ở loop sau"""
+    calls = _patch_llm(monkeypatch)
+    evaluator = wst.BatchingEvaluator(tool)
+
+    async def cancelled():
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(evaluator.evaluate("q0", _results(0)), timeout=evaluator.window / 10)
+
+    asyncio.run(cancelled())
+    evaluation = asyncio.run(asyncio.wait_for(evaluator.evaluate("q1", _results(1)), timeout=5))
+
+    assert evaluation["summary"] == "q1"
+    assert calls == [wst.SearchEvaluation]
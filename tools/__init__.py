@@ -1,25 +1,49 @@
 """
 Tools package init file
+
+Các tool được import lazy khi truy cập lần đầu (PEP 562): import tools.ocr_tool
+(ví dụ trong process con của pool OCR) không phải nạp chat_knowledge_tool (kết nối MongoDB)
+hay web_search_tool (tạo client LLM) cùng lúc.
 """
 
-from .file_upload_tool import FileUploadTool
-from .file_reader_tool import FileReaderTool
-from .ocr_tool import OCRTool
-from .embedding_tool import EmbeddingTool
-from .vector_search_tool import VectorSearchTool
-from .chat_knowledge_tool import (
-    save_chat_content,
-    get_chat_history_summary,
-    search_chat_and_documents,
-    auto_save_english_content
-)
-from .web_search_tool import (
-    search_web_with_evaluation,
-    generate_llm_response_for_query
-)
-
-# Builtin simple tools
-from .builtin_tools import get_weather, calculate_sum, semantic_search, wiki_search, wiki_summary
+import importlib
+
+# Tên export -> module con chứa nó
+_EXPORTS = {
+    'FileUploadTool': 'file_upload_tool',
+    'FileReaderTool': 'file_reader_tool',
+    'OCRTool': 'ocr_tool',
+    'EmbeddingTool': 'embedding_tool',
+    'VectorSearchTool': 'vector_search_tool',
+    'save_chat_content': 'chat_knowledge_tool',
+    'get_chat_history_summary': 'chat_knowledge_tool',
+    'search_chat_and_documents': 'chat_knowledge_tool',
+    'auto_save_english_content': 'chat_knowledge_tool',
+    'search_web_with_evaluation': 'web_search_tool',
+    'generate_llm_response_for_query': 'web_search_tool',
+    'generate_llm_response_stream': 'web_search_tool',
+    'generate_llm_response_astream': 'web_search_tool',
+    # Builtin simple tools
+    'get_weather': 'builtin_tools',
+    'calculate_sum': 'builtin_tools',
+    'semantic_search': 'builtin_tools',
+    'wiki_search': 'builtin_tools',
+    'wiki_summary': 'builtin_tools',
+}
+
+
+def __getattr__(name):
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_EXPORTS))
+
 
 __all__ = [
     'FileUploadTool',
@@ -37,5 +61,7 @@ __all__ = [
     'search_chat_and_documents',
     'auto_save_english_content',
     'search_web_with_evaluation',
-    'generate_llm_response_for_query'
+    'generate_llm_response_for_query',
+    'generate_llm_response_stream',
+    'generate_llm_response_astream'
 ]
@@ -1,32 +1,77 @@
 from langchain.tools import tool
 import os
-import openai
+from openai import OpenAI
 from PIL import Image, ImageDraw, ImageFont
 import requests
 from io import BytesIO
 
+# Model sinh từ vựng: mặc định dùng model nhỏ, đặt FLASHCARD_MODEL=gpt-4.1 nếu cần chất lượng cao hơn
+FLASHCARD_MODEL = os.getenv("FLASHCARD_MODEL", "gpt-4o-mini")
+
+# Font: đọc bytes một lần khi import, các lần vẽ sau chỉ tạo font từ bộ nhớ
+FONT_VI_PATH = os.path.join(os.path.dirname(__file__), "../NataSans-VariableFont_wght.ttf")
+
+def _read_font_bytes(path: str):
+    """Đọc nội dung file font, trả về None nếu không đọc được."""
+    try:
+        with open(path, "rb") as f:
+            return f.read()
+    except OSError:
+        return None
+
+_FONT_VI_BYTES = _read_font_bytes(FONT_VI_PATH)
+
+def _load_font(font_bytes, fallback_name: str, size: int):
+    """
+    Tạo ImageFont từ bytes đã cache (nếu có), ngược lại thử tải theo tên font hệ thống.
+    Trả về None nếu không tải được (dùng font mặc định).
+    """
+    try:
+        if font_bytes is not None:
+            return ImageFont.truetype(BytesIO(font_bytes), size)
+        return ImageFont.truetype(fallback_name, size)
+    except Exception:
+        return None
+
+# OpenAI client dùng chung cho cả module (giữ connection pool giữa các lần gọi)
+_client = None
+
+def _get_client() -> OpenAI:
+    """
+    Trả về OpenAI client dùng chung, khởi tạo lần đầu khi cần.
+    Raise Exception nếu chưa cấu hình OPENAI_API_KEY.
+    """
+    global _client
+    if _client is None:
+        api_key = os.getenv("OPENAI_API_KEY")
+        if not api_key:
+            raise Exception("Chưa cấu hình OPENAI_API_KEY trong biến môi trường.")
+        _client = OpenAI(api_key=api_key, max_retries=3)
+    return _client
+
 def get_flashcards_from_openai(topic: str, n_words: int = 10) -> str:
     """
     Gọi OpenAI API để sinh danh sách từ vựng tiếng Anh theo chủ đề.
     Đầu vào: topic (chủ đề), n_words (số lượng từ vựng, mặc định 10)
     Đầu ra: danh sách từ vựng dạng 'word: meaning' mỗi dòng một cặp.
     """
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
+    try:
+        client = _get_client()
+    except Exception:
         return "Lỗi: Chưa cấu hình OPENAI_API_KEY trong biến môi trường."
-    openai.api_key = api_key
     prompt = (
         f"Hãy liệt kê {n_words} từ vựng tiếng Anh về chủ đề \"{topic}\", "
         "kèm nghĩa tiếng Việt, mỗi dòng một cặp theo định dạng: word: meaning."
     )
     try:
-        response = openai.ChatCompletion.create(
-            model="gpt-4.1",
+        response = client.chat.completions.create(
+            model=FLASHCARD_MODEL,
             messages=[{"role": "user", "content": prompt}],
-            max_tokens=512,
-            temperature=0.7,
+            # Mỗi dòng 'word: meaning' chỉ vài chục token
+            max_tokens=max(256, n_words * 25),
+            temperature=0,
         )
-        content = response['choices'][0]['message']['content']
+        content = response.choices[0].message.content
         return content.strip()
     except Exception as e:
         return f"Lỗi khi gọi OpenAI API: {str(e)}"
@@ -36,42 +81,35 @@ def generate_flashcard_image(english: str, vietnamese: str, save_path: str = Non
     Sinh flashcard ảnh: trên là tiếng Anh, giữa là ảnh minh họa (OpenAI DALL·E), dưới là tiếng Việt.
     Trả về đối tượng PIL Image hoặc lưu ra file nếu có save_path.
     """
-    api_key = os.getenv("OPENAI_API_KEY")
-    if not api_key:
-        raise Exception("Chưa cấu hình OPENAI_API_KEY trong biến môi trường.")
-    openai.api_key = api_key
+    client = _get_client()
 
     # Gọi OpenAI DALL·E để sinh ảnh minh họa
     dalle_prompt = f"A simple illustration of {english} for language learning, white background, no text"
     try:
-        dalle_response = openai.Image.create(
+        dalle_response = client.images.generate(
+            model="dall-e-2",
             prompt=dalle_prompt,
             n=1,
             size="256x256"
         )
-        image_url = dalle_response['data'][0]['url']
+        image_url = dalle_response.data[0].url
         img_data = requests.get(image_url).content
-        illustration = Image.open(BytesIO(img_data)).convert("RGBA")
+        # DALL·E trả về ảnh nền trắng, không trong suốt -> dùng RGB để dán không cần mask
+        illustration = Image.open(BytesIO(img_data)).convert("RGB")
     except Exception as e:
         # Nếu lỗi, tạo ảnh trắng thay thế
-        illustration = Image.new("RGBA", (256, 256), (255, 255, 255, 255))
+        illustration = Image.new("RGB", (256, 256), (255, 255, 255))
 
     # Tạo flashcard: 256x400 (trên: 60, giữa: 256, dưới: 84)
     card_w, card_h = 256, 400
-    card = Image.new("RGBA", (card_w, card_h), (255, 255, 255, 255))
+    card = Image.new("RGB", (card_w, card_h), (255, 255, 255))
     draw = ImageDraw.Draw(card)
 
     # Font
-    try:
-        font_en = ImageFont.truetype("arial.ttf", 32)
-    except:
-        font_en = None  # fallback default
+    font_en = _load_font(None, "arial.ttf", 32)
 
-    # Load NataSans font cho tiếng Việt
-    try:
-        font_vi = ImageFont.truetype(os.path.join(os.path.dirname(__file__), "../NataSans-VariableFont_wght.ttf"), 24)
-    except:
-        font_vi = None  # fallback default
+    # NataSans font cho tiếng Việt (từ bytes đã cache)
+    font_vi = _load_font(_FONT_VI_BYTES, FONT_VI_PATH, 24)
 
     # Vẽ tiếng Anh phía trên
     en_text = english
@@ -79,7 +117,7 @@ def generate_flashcard_image(english: str, vietnamese: str, save_path: str = Non
     draw.text(((card_w - en_w) // 2, 10), en_text, fill=(0, 0, 0), font=font_en)
 
     # Dán ảnh minh họa vào giữa
-    card.paste(illustration, (0, 60), illustration)
+    card.paste(illustration, (0, 60))
 
     # Vẽ tiếng Việt phía dưới
     vi_text = vietnamese
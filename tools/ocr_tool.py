@@ -4,13 +4,27 @@ OCR Tool - Optical Character Recognition
 """
 
 import os
+import importlib.util
 import cv2
 import numpy as np
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Tuple, Union, Iterator, Iterable
 from pathlib import Path
 from datetime import datetime
 import base64
 import io
+import threading
+import queue
+import hashlib
+import json
+import copy
+import sqlite3
+import time
+from collections import OrderedDict
+from contextlib import nullcontext, contextmanager
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+from concurrent.futures.process import BrokenProcessPool
+import multiprocessing
+from multiprocessing import shared_memory
 
 # Import các thư viện OCR
 try:
@@ -19,14 +33,23 @@ try:
 except ImportError:
     TESSERACT_AVAILABLE = False
 
+# Binding C++ trực tiếp của libtesseract: không spawn process tesseract mỗi lần gọi.
+# Chỉ kiểm tra có cài không, import thật khi dùng lần đầu: nạp tesserocr là nạp OpenMP,
+# process con của pool Tesseract phải đặt OMP_THREAD_LIMIT trước thời điểm đó
 try:
-    import easyocr
-    EASYOCR_AVAILABLE = True
-except ImportError:
+    TESSEROCR_AVAILABLE = importlib.util.find_spec("tesserocr") is not None
+except (ImportError, ValueError):
+    TESSEROCR_AVAILABLE = False
+
+# EasyOCR kéo theo torch (~1s, vài trăm MB RAM) -> chỉ kiểm tra có cài không,
+# import thật khi tạo reader lần đầu (dùng Tesseract thì không phải nạp torch)
+try:
+    EASYOCR_AVAILABLE = importlib.util.find_spec("easyocr") is not None
+except (ImportError, ValueError):
     EASYOCR_AVAILABLE = False
 
 try:
-    from PIL import Image, ImageEnhance, ImageFilter
+    from PIL import Image
     PIL_AVAILABLE = True
 except ImportError:
     PIL_AVAILABLE = False
@@ -37,6 +60,673 @@ try:
 except ImportError:
     PDF2IMAGE_AVAILABLE = False
 
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+# EasyOCR reader dùng chung cho mọi OCRTool trong process, key theo (ngôn ngữ, gpu, thư mục model)
+_EASYOCR_READERS: Dict[Tuple[Tuple[str, ...], bool, Optional[str]], Any] = {}
+_EASYOCR_LOCK = threading.Lock()
+
+# Ngôn ngữ OCR (Tesseract 'vie+eng', EasyOCR ['vi', 'en']) - một phần của key cache kết quả
+OCR_LANGUAGES = "vie+eng"
+
+# Thư mục model EasyOCR dùng chung (None = mặc định ~/.EasyOCR)
+EASYOCR_MODEL_DIR = os.getenv("EASYOCR_MODEL_DIR") or None
+
+# Số ảnh tối đa trong một lần gọi readtext_batched
+EASYOCR_BATCH_SIZE = 8
+
+# Làm tròn kích thước ảnh (pixel) khi gom batch EasyOCR: ảnh lệch nhau vài pixel
+# được pad nền trắng về cùng kích thước để chạy chung một batch
+EASYOCR_BATCH_BUCKET = 32
+
+# Dynamic int8 quantization (Linear/LSTM) cho detector/recognizer EasyOCR khi chạy CPU;
+# đặt EASYOCR_QUANTIZE=0 để giữ FP32 (vd. khi so sánh độ chính xác)
+EASYOCR_QUANTIZE = os.getenv("EASYOCR_QUANTIZE", "1") != "0"
+
+# Chạy EasyOCR trong process con riêng (EASYOCR_ISOLATE=1): readtext của EasyOCR rò rỉ bộ nhớ
+# qua mỗi lần gọi, process con được thay mới sau EASYOCR_WORKER_MAX_TASKS task để trả lại RAM
+EASYOCR_ISOLATE = os.getenv("EASYOCR_ISOLATE", "0") == "1"
+EASYOCR_WORKER_MAX_TASKS = 20
+EASYOCR_WORKER_TIMEOUT = 300
+
+# Compile recognizer EasyOCR bằng torch.compile (PyTorch >= 2.0); mặc định tắt vì
+# lần gọi đầu phải chờ compile, chỉ có lợi cho worker chạy lâu (EASYOCR_TORCH_COMPILE=1 để bật)
+EASYOCR_TORCH_COMPILE = os.getenv("EASYOCR_TORCH_COMPILE", "0") == "1"
+
+# Kernel của ImageFilter.SHARPEN trong PIL (đã chia scale 16)
+PIL_SHARPEN_KERNEL = np.array([[-2, -2, -2], [-2, 32, -2], [-2, -2, -2]], dtype=np.float32) / 16
+
+# Số trang PDF tối đa đã convert nhưng chưa OCR (hàng đợi producer-consumer)
+PDF_PREFETCH_PAGES = 2
+
+# Số trang render mỗi lần gọi pdftoppm (giảm chi phí spawn process so với từng trang,
+# bộ nhớ vẫn giới hạn ở PDF_RENDER_CHUNK_PAGES + PDF_PREFETCH_PAGES trang)
+PDF_RENDER_CHUNK_PAGES = 4
+
+# Các cấu hình Tesseract thử lần lượt (dựng sẵn một lần, xếp theo khả năng tốt nhất trước).
+# Không dùng tessedit_char_whitelist: traineddata 'vie' đã đủ ký tự, whitelist chỉ làm chậm;
+# bỏ nạp dictionary dawg vì chỉ cần OCR thô. Tất cả dùng --oem 1 (chỉ LSTM, không nạp engine
+# legacy); cùng oem nên tesserocr dùng chung một API cho cả ba cấu hình.
+_TESSERACT_DAWG_FLAGS = '-c load_system_dawg=0 -c load_freq_dawg=0'
+TESSERACT_CONFIGS = (
+    f'--oem 1 --psm 6 {_TESSERACT_DAWG_FLAGS}',  # Single uniform block of text (LSTM only)
+    f'--oem 1 --psm 4 {_TESSERACT_DAWG_FLAGS}',  # Single column of text (LSTM only)
+    f'--oem 1 --psm 3 {_TESSERACT_DAWG_FLAGS}',  # Fully automatic page segmentation (LSTM only)
+)
+
+# Ngưỡng dừng sớm khi thử các cấu hình PSM của Tesseract
+TESSERACT_GOOD_CONFIDENCE = 85
+TESSERACT_GOOD_MIN_CHARS = 50
+
+# Chế độ auto: số ký tự tối thiểu để chấp nhận kết quả Tesseract (EasyOCR fallback nhận mọi kết quả thành công)
+AUTO_MIN_TEXT_CHARS = 20
+
+# Tham số adaptive threshold cho pipeline tiền xử lý thông thường
+ADAPTIVE_THRESH_BLOCK_SIZE = 31
+ADAPTIVE_THRESH_C = 10
+
+# Tỉ lệ pixel nằm ở 2 bin histogram ngoài cùng (tối/sáng) để coi ảnh đã gần nhị phân
+# (screenshot, ảnh chụp văn bản số) -> bỏ qua tiền xử lý
+NEAR_BINARY_RATIO = 0.95
+
+# Giới hạn kích thước pool buffer tiền xử lý ảnh
+BUF_POOL_MAX_SHAPES = 16
+BUF_POOL_MAX_PER_SHAPE = 4
+
+# Số process chạy Tesseract song song trong batch_ocr
+TESSERACT_WORKERS = max(1, (os.cpu_count() or 1) // 2)
+
+# Kết quả kiểm tra Tesseract, chỉ chạy một lần mỗi process
+_TESSERACT_PROBED = False
+_TESSERACT_WORKING = False
+_TESSERACT_LOCK = threading.Lock()
+
+def _cuda_available() -> bool:
+    """Kiểm tra có GPU CUDA cho EasyOCR không"""
+    try:
+        import torch
+        return torch.cuda.is_available()
+    except Exception:
+        return False
+
+def _get_easyocr_reader(langs: Tuple[str, ...] = ('vi', 'en'), gpu: Optional[bool] = None,
+                        model_dir: Optional[str] = None) -> Any:
+    """
+    Lấy EasyOCR reader dùng chung theo (ngôn ngữ, gpu, thư mục model), khởi tạo lần đầu khi cần
+    
+    Args:
+        langs (Tuple[str, ...]): Danh sách ngôn ngữ
+        gpu (Optional[bool]): Dùng GPU không (None = tự phát hiện)
+        model_dir (Optional[str]): Thư mục chứa model EasyOCR (None = EASYOCR_MODEL_DIR hoặc mặc định ~/.EasyOCR)
+        
+    Returns:
+        Any: easyocr.Reader hoặc None nếu không khởi tạo được
+    """
+    if gpu is None:
+        gpu = _cuda_available()
+    if model_dir is None:
+        model_dir = EASYOCR_MODEL_DIR
+    key = (tuple(langs), gpu, model_dir)
+    reader = _EASYOCR_READERS.get(key)
+    if reader is not None:
+        return reader
+    
+    with _EASYOCR_LOCK:
+        reader = _EASYOCR_READERS.get(key)
+        if reader is None:
+            try:
+                import easyocr
+                
+                # Thư mục model đã có sẵn (prewarm) -> không kiểm tra/tải lại model
+                download_enabled = not (model_dir and os.path.isdir(model_dir) and os.listdir(model_dir))
+                # quantize: EasyOCR tự gọi torch.quantization.quantize_dynamic (qint8)
+                # cho detector/recognizer khi chạy CPU, GPU bỏ qua cờ này
+                reader = easyocr.Reader(
+                    list(langs),
+                    gpu=gpu,
+                    model_storage_directory=model_dir,
+                    download_enabled=download_enabled,
+                    cudnn_benchmark=gpu,
+                    quantize=EASYOCR_QUANTIZE
+                )
+                if EASYOCR_TORCH_COMPILE:
+                    _compile_easyocr_reader(reader)
+                _EASYOCR_READERS[key] = reader
+                print(f"✅ EasyOCR reader đã được khởi tạo thành công")
+            except Exception as e:
+                print(f"❌ Không thể khởi tạo EasyOCR: {e}")
+                return None
+    return reader
+
+def _compile_easyocr_reader(reader: Any):
+    """
+    Thay recognizer của EasyOCR bằng bản torch.compile
+    
+    EasyOCR pad các crop trong một batch theo chiều rộng lớn nhất, nên chiều rộng
+    thay đổi giữa các lần gọi -> dùng dynamic=True để không compile lại theo từng shape.
+    Lỗi (PyTorch cũ, backend không hỗ trợ) thì giữ model gốc.
+    
+    Args:
+        reader (Any): easyocr.Reader
+    """
+    try:
+        import torch
+        if not hasattr(torch, "compile"):
+            print("⚠️ PyTorch không hỗ trợ torch.compile, bỏ qua")
+            return
+        reader.recognizer = torch.compile(reader.recognizer, dynamic=True)
+        print("✅ EasyOCR recognizer đã được torch.compile")
+    except Exception as e:
+        print(f"⚠️ Không thể torch.compile EasyOCR recognizer: {e}")
+
+def _easyocr_inference_context(reader: Any) -> Any:
+    """
+    Context chạy inference EasyOCR: FP16 autocast trên GPU hỗ trợ (compute capability >= 7.0),
+    ngược lại giữ nguyên (CPU đã dùng int8 quantization khi khởi tạo reader)
+    
+    Args:
+        reader (Any): easyocr.Reader
+        
+    Returns:
+        Any: Context manager
+    """
+    if not str(getattr(reader, 'device', 'cpu')).startswith('cuda'):
+        return nullcontext()
+    try:
+        import torch
+        if torch.cuda.get_device_capability() >= (7, 0):
+            return torch.autocast(device_type='cuda', dtype=torch.float16)
+    except Exception:
+        pass
+    return nullcontext()
+
+def _probe_tesseract() -> bool:
+    """
+    Kiểm tra Tesseract có hoạt động không (cache kết quả cho cả process)
+    
+    Returns:
+        bool: True nếu Tesseract hoạt động
+    """
+    global _TESSERACT_PROBED, _TESSERACT_WORKING
+    if _TESSERACT_PROBED:
+        return _TESSERACT_WORKING
+    
+    with _TESSERACT_LOCK:
+        if _TESSERACT_PROBED:
+            return _TESSERACT_WORKING
+        
+        working = False
+        if TESSEROCR_AVAILABLE:
+            try:
+                import tesserocr
+                version = tesserocr.tesseract_version().splitlines()[0]
+                working = True
+                print(f"✅ Tesseract (tesserocr) {version} đã được phát hiện")
+            except Exception as e:
+                print(f"❌ tesserocr không khả dụng: {e}")
+        if not working and TESSERACT_AVAILABLE:
+            try:
+                # Kiểm tra đơn giản bằng cách test version
+                version = pytesseract.get_tesseract_version()
+                working = True
+                print(f"✅ Tesseract version {version} đã được phát hiện")
+            except Exception as e:
+                print(f"❌ Tesseract không khả dụng: {e}")
+        
+        _TESSERACT_WORKING = working
+        _TESSERACT_PROBED = True
+    return _TESSERACT_WORKING
+
+# PyTessBaseAPI của tesserocr không thread-safe -> mỗi thread giữ bộ API riêng,
+# key theo (ngôn ngữ, oem, biến init) để chỉ nạp traineddata một lần
+_TESSEROCR_LOCAL = threading.local()
+
+def _parse_tesseract_config(config: str) -> Tuple[int, int, Dict[str, str]]:
+    """
+    Tách chuỗi config kiểu pytesseract ('--oem 1 --psm 6 -c key=value') cho tesserocr
+    
+    Args:
+        config (str): Chuỗi config Tesseract
+        
+    Returns:
+        Tuple[int, int, Dict[str, str]]: (oem, psm, các biến -c)
+    """
+    oem, psm = 3, 3
+    variables: Dict[str, str] = {}
+    tokens = config.split()
+    for token, value in zip(tokens, tokens[1:]):
+        if token == '--oem':
+            oem = int(value)
+        elif token == '--psm':
+            psm = int(value)
+        elif token == '-c' and '=' in value:
+            key, val = value.split('=', 1)
+            variables[key] = val
+    return oem, psm, variables
+
+def _get_tesserocr_api(lang: str, oem: int, variables: Dict[str, str]) -> Any:
+    """
+    Lấy PyTessBaseAPI của thread hiện tại, khởi tạo lần đầu khi cần
+    
+    Args:
+        lang (str): Ngôn ngữ Tesseract (vd. 'vie+eng')
+        oem (int): OCR engine mode
+        variables (Dict[str, str]): Biến truyền lúc Init (vd. load_system_dawg)
+        
+    Returns:
+        Any: tesserocr.PyTessBaseAPI
+    """
+    apis = getattr(_TESSEROCR_LOCAL, "apis", None)
+    if apis is None:
+        apis = _TESSEROCR_LOCAL.apis = {}
+    key = (lang, oem, tuple(sorted(variables.items())))
+    api = apis.get(key)
+    if api is None:
+        import tesserocr
+        api = tesserocr.PyTessBaseAPI(lang=lang, oem=oem, variables=variables)
+        apis[key] = api
+    return api
+
+def _tesserocr_image_to_data(image: np.ndarray, lang: str, config: str) -> Dict[str, List[Any]]:
+    """
+    OCR bằng tesserocr, trả về dict cùng dạng pytesseract.image_to_data(output_type=DICT)
+    (chỉ gồm các dòng cấp word) để dùng chung code ghép text và danh sách từ
+    
+    Args:
+        image (np.ndarray): Ảnh đã tiền xử lý (grayscale/binary hoặc BGR)
+        lang (str): Ngôn ngữ Tesseract
+        config (str): Chuỗi config Tesseract
+        
+    Returns:
+        Dict[str, List[Any]]: Dữ liệu text, conf, vị trí theo từng từ
+    """
+    import tesserocr
+    oem, psm, variables = _parse_tesseract_config(config)
+    api = _get_tesserocr_api(lang, oem, variables)
+    api.SetPageSegMode(psm)
+    
+    if image.ndim == 3:
+        image = cv2.cvtColor(image, cv2.COLOR_BGR2RGB)
+    image = np.ascontiguousarray(image)
+    height, width = image.shape[:2]
+    bytes_per_pixel = 1 if image.ndim == 2 else image.shape[2]
+    api.SetImageBytes(image.tobytes(), width, height, bytes_per_pixel, width * bytes_per_pixel)
+    api.Recognize()
+    
+    keys = ('level', 'block_num', 'par_num', 'line_num', 'word_num',
+            'left', 'top', 'width', 'height', 'conf', 'text')
+    data: Dict[str, List[Any]] = {key: [] for key in keys}
+    level = tesserocr.RIL.WORD
+    block_num = par_num = line_num = word_num = 0
+    try:
+        iterator = api.GetIterator()
+        if iterator is None:
+            return data
+        
+        for word in tesserocr.iterate_level(iterator, level):
+            # Đánh số block/đoạn/dòng giống output TSV của Tesseract
+            if word.IsAtBeginningOf(tesserocr.RIL.BLOCK):
+                block_num += 1
+                par_num = 0
+            if word.IsAtBeginningOf(tesserocr.RIL.PARA):
+                par_num += 1
+                line_num = 0
+            if word.IsAtBeginningOf(tesserocr.RIL.TEXTLINE):
+                line_num += 1
+                word_num = 0
+            word_num += 1
+            
+            text = word.GetUTF8Text(level)
+            box = word.BoundingBox(level)
+            if text is None or box is None:
+                continue
+            left, top, right, bottom = box
+            row = (5, block_num, par_num, line_num, word_num,
+                   left, top, right - left, bottom - top, word.Confidence(level), text)
+            for key, value in zip(keys, row):
+                data[key].append(value)
+    finally:
+        # Giải phóng ảnh và kết quả nhận dạng, giữ lại model đã nạp
+        api.Clear()
+    return data
+
+# Cache kết quả OCR theo hash nội dung ảnh:
+# - tầng 1: LRU trong RAM, dùng chung trong process
+# - tầng 2: SQLite trên đĩa, dùng chung giữa các process/lần chạy (OCR_CACHE_DB="" để tắt)
+OCR_CACHE_SIZE = 256
+OCR_CACHE_DB = os.getenv("OCR_CACHE_DB", ".ocr_cache.sqlite")
+
+# Giới hạn cache trên đĩa: bỏ entry quá hạn và giữ tối đa OCR_CACHE_DB_MAX_ROWS entry mới nhất
+# (dọn lúc mở kết nối và sau mỗi OCR_CACHE_PRUNE_EVERY lần ghi)
+OCR_CACHE_DB_TTL = 30 * 24 * 3600  # giây
+OCR_CACHE_DB_MAX_ROWS = 10000
+OCR_CACHE_PRUNE_EVERY = 100
+
+# Phiên bản pipeline OCR: tăng khi đổi tiền xử lý / hậu xử lý để không dùng lại text cũ.
+# Tag cấu hình (hash các tham số ảnh hưởng kết quả) cũng nằm trong key cache
+OCR_CACHE_VERSION = 1
+_OCR_CONFIG_TAG = hashlib.blake2b(repr((
+    OCR_CACHE_VERSION, TESSERACT_CONFIGS, TESSERACT_GOOD_CONFIDENCE, TESSERACT_GOOD_MIN_CHARS,
+    AUTO_MIN_TEXT_CHARS, ADAPTIVE_THRESH_BLOCK_SIZE, ADAPTIVE_THRESH_C, NEAR_BINARY_RATIO, EASYOCR_QUANTIZE
+)).encode(), digest_size=4).hexdigest()
+
+_OCR_CACHE: "OrderedDict[Tuple[str, str], Dict[str, Any]]" = OrderedDict()
+_OCR_CACHE_LOCK = threading.Lock()
+_OCR_DB = None
+_OCR_DB_PID = None
+_OCR_DB_FAILED = False
+_OCR_DB_WRITES = 0
+
+def _content_hash(data: Any) -> str:
+    """
+    Hash nhanh nội dung ảnh (xxh3 nếu có, ngược lại blake2b)
+    
+    Args:
+        data (Any): bytes hoặc buffer
+        
+    Returns:
+        str: Chuỗi hash hex
+    """
+    if XXHASH_AVAILABLE:
+        return xxhash.xxh3_64(data).hexdigest()
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def _ocr_cache_db() -> Optional[sqlite3.Connection]:
+    """Mở (một lần) kết nối SQLite của cache OCR; None nếu bị tắt hoặc lỗi (gọi khi đang giữ lock)"""
+    global _OCR_DB, _OCR_DB_PID, _OCR_DB_FAILED
+    # Kết nối SQLite không dùng lại được sau fork -> process con mở kết nối riêng
+    if _OCR_DB is not None and _OCR_DB_PID == os.getpid():
+        return _OCR_DB
+    if _OCR_DB_FAILED or not OCR_CACHE_DB:
+        return None
+    try:
+        _OCR_DB = sqlite3.connect(OCR_CACHE_DB, check_same_thread=False, timeout=5)
+        _OCR_DB_PID = os.getpid()
+        _OCR_DB.execute(
+            "CREATE TABLE IF NOT EXISTS ocr_cache (key TEXT PRIMARY KEY, result TEXT NOT NULL, created_at REAL NOT NULL)"
+        )
+        _OCR_DB.execute("CREATE INDEX IF NOT EXISTS ocr_cache_created_at ON ocr_cache (created_at)")
+        _ocr_cache_prune(_OCR_DB)
+    except sqlite3.Error as e:
+        print(f"⚠️ Không mở được OCR cache trên đĩa, chỉ dùng cache RAM: {e}")
+        _OCR_DB = None
+        _OCR_DB_FAILED = True
+    return _OCR_DB
+
+def _ocr_cache_prune(db: sqlite3.Connection):
+    """Xóa entry quá OCR_CACHE_DB_TTL và entry cũ nhất vượt OCR_CACHE_DB_MAX_ROWS"""
+    db.execute("DELETE FROM ocr_cache WHERE created_at < ?", (time.time() - OCR_CACHE_DB_TTL,))
+    db.execute(
+        "DELETE FROM ocr_cache WHERE key IN "
+        "(SELECT key FROM ocr_cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+        (OCR_CACHE_DB_MAX_ROWS,)
+    )
+    db.commit()
+
+def _ocr_cache_key(content_hash: str, engine: str) -> Tuple[str, str]:
+    """Key cache OCR: hash nội dung ảnh + engine, ngôn ngữ và tag cấu hình pipeline"""
+    return (content_hash, f"{engine}:{OCR_LANGUAGES}:{_OCR_CONFIG_TAG}")
+
+def _ocr_cache_get(key: Tuple[str, str]) -> Optional[Dict[str, Any]]:
+    """Lấy kết quả OCR đã cache (trả bản deep copy để caller sửa không ảnh hưởng cache)"""
+    with _OCR_CACHE_LOCK:
+        result = _OCR_CACHE.get(key)
+        if result is not None:
+            _OCR_CACHE.move_to_end(key)
+            return copy.deepcopy(result)
+        
+        db = _ocr_cache_db()
+        if db is None:
+            return None
+        try:
+            row = db.execute(
+                "SELECT result FROM ocr_cache WHERE key = ? AND created_at >= ?",
+                (":".join(key), time.time() - OCR_CACHE_DB_TTL)
+            ).fetchone()
+        except sqlite3.Error:
+            return None
+        if row is None:
+            return None
+        result = json.loads(row[0])
+        _OCR_CACHE[key] = result
+        while len(_OCR_CACHE) > OCR_CACHE_SIZE:
+            _OCR_CACHE.popitem(last=False)
+        return copy.deepcopy(result)
+
+def _ocr_cache_put(key: Tuple[str, str], result: Dict[str, Any]):
+    """Lưu kết quả OCR thành công vào cache (deep copy: caller sửa result sau đó không ảnh hưởng cache)"""
+    global _OCR_DB_WRITES
+    if not result.get("success"):
+        return
+    with _OCR_CACHE_LOCK:
+        _OCR_CACHE[key] = copy.deepcopy(result)
+        _OCR_CACHE.move_to_end(key)
+        while len(_OCR_CACHE) > OCR_CACHE_SIZE:
+            _OCR_CACHE.popitem(last=False)
+        
+        db = _ocr_cache_db()
+        if db is None:
+            return
+        try:
+            # bbox của EasyOCR có thể là số numpy -> chuyển về kiểu Python khi serialize
+            payload = json.dumps(result, ensure_ascii=False, default=lambda o: o.tolist() if hasattr(o, 'tolist') else str(o))
+            db.execute(
+                "INSERT OR REPLACE INTO ocr_cache (key, result, created_at) VALUES (?, ?, ?)",
+                (":".join(key), payload, time.time())
+            )
+            db.commit()
+            _OCR_DB_WRITES += 1
+            if _OCR_DB_WRITES % OCR_CACHE_PRUNE_EVERY == 0:
+                _ocr_cache_prune(db)
+        except sqlite3.Error as e:
+            print(f"⚠️ Không ghi được OCR cache: {e}")
+
+# OCRTool riêng của mỗi process con khi chạy batch Tesseract song song
+_WORKER_TOOL = None
+
+def _init_tesseract_worker():
+    """
+    Khởi tạo process con: giới hạn OpenMP rồi tạo sẵn OCRTool để task đầu tiên không phải chờ kiểm tra Tesseract
+    
+    OpenMP (libgomp) chỉ đọc OMP_THREAD_LIMIT lúc nạp thư viện, nên biến được đặt ở đây - chỉ trong
+    process con, trước khi tesserocr được import hay pytesseract chạy tesseract lần đầu - để OpenMP
+    của Tesseract không tranh CPU với các worker khác. Môi trường của process cha không bị đổi.
+    """
+    global _WORKER_TOOL
+    os.environ["OMP_THREAD_LIMIT"] = "1"
+    if _WORKER_TOOL is None:
+        _WORKER_TOOL = OCRTool(ocr_engine="tesseract")
+
+@contextmanager
+def _new_tesseract_pool(workers: int) -> Iterator[ProcessPoolExecutor]:
+    """
+    Process pool cho Tesseract, dùng trong khối with
+    
+    Dùng context spawn riêng (không đổi start method hay forkserver preload toàn cục): process
+    fork sẽ kế thừa OpenMP đã khởi tạo của process cha. Process con chỉ import tools.ocr_tool
+    (tools/__init__ import lazy, không kết nối MongoDB hay tạo client LLM).
+    Không recycle worker (max_tasks_per_child): pool chỉ sống trong một lần batch.
+    
+    Args:
+        workers (int): Số process
+        
+    Returns:
+        Iterator[ProcessPoolExecutor]: Process pool
+    """
+    with ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context("spawn"),
+        initializer=_init_tesseract_worker
+    ) as executor:
+        yield executor
+
+def _tesseract_ocr_worker(image_path: str) -> Dict[str, Any]:
+    """
+    OCR một ảnh bằng Tesseract trong process con (hàm top-level để pickle được)
+    
+    Args:
+        image_path (str): Đường dẫn ảnh
+        
+    Returns:
+        Dict[str, Any]: Kết quả OCR
+    """
+    global _WORKER_TOOL
+    if _WORKER_TOOL is None:
+        _WORKER_TOOL = OCRTool(ocr_engine="tesseract")
+    return _WORKER_TOOL.extract_text_from_image(image_path, engine="tesseract")
+
+def _tesseract_ocr_shm_worker(shm_name: str, shape: Tuple[int, ...], dtype: str) -> Dict[str, Any]:
+    """
+    OCR một ảnh nằm trong shared memory bằng Tesseract trong process con
+    (nhận handle thay vì pickle cả ndarray)
+    
+    Args:
+        shm_name (str): Tên vùng SharedMemory
+        shape (Tuple[int, ...]): Kích thước ảnh
+        dtype (str): Kiểu dữ liệu ảnh
+        
+    Returns:
+        Dict[str, Any]: Kết quả OCR
+    """
+    global _WORKER_TOOL
+    if _WORKER_TOOL is None:
+        _WORKER_TOOL = OCRTool(ocr_engine="tesseract")
+    shm = shared_memory.SharedMemory(name=shm_name)
+    try:
+        image = np.ndarray(shape, dtype=np.dtype(dtype), buffer=shm.buf)
+        result = _WORKER_TOOL.extract_text_from_array(image, engine="tesseract")
+        del image
+        return result
+    finally:
+        shm.close()
+
+# Process pool EasyOCR dùng chung trong process cha (chế độ EASYOCR_ISOLATE)
+_EASYOCR_POOL = None
+_EASYOCR_POOL_LOCK = threading.Lock()
+
+def _get_easyocr_pool() -> ProcessPoolExecutor:
+    """
+    Lấy process pool một worker cho EasyOCR, tạo lần đầu khi cần
+    
+    Dùng start method 'spawn' (an toàn với CUDA/torch thread và bắt buộc khi dùng
+    max_tasks_per_child); Python < 3.11 không hỗ trợ recycle -> dùng pool thường.
+    
+    Returns:
+        ProcessPoolExecutor: Process pool
+    """
+    global _EASYOCR_POOL
+    with _EASYOCR_POOL_LOCK:
+        if _EASYOCR_POOL is None:
+            context = multiprocessing.get_context("spawn")
+            try:
+                _EASYOCR_POOL = ProcessPoolExecutor(
+                    max_workers=1,
+                    mp_context=context,
+                    max_tasks_per_child=EASYOCR_WORKER_MAX_TASKS
+                )
+            except TypeError:
+                _EASYOCR_POOL = ProcessPoolExecutor(max_workers=1, mp_context=context)
+        return _EASYOCR_POOL
+
+def _reset_easyocr_pool():
+    """Bỏ pool EasyOCR bị hỏng (process con chết, vd. OOM) để lần gọi sau tạo pool mới"""
+    global _EASYOCR_POOL
+    with _EASYOCR_POOL_LOCK:
+        if _EASYOCR_POOL is not None:
+            _EASYOCR_POOL.shutdown(wait=False)
+            _EASYOCR_POOL = None
+
+def _easyocr_worker_reader(langs: Tuple[str, ...], gpu: Optional[bool]) -> Any:
+    """
+    Lấy EasyOCR reader thật trong process con
+    
+    Args:
+        langs (Tuple[str, ...]): Danh sách ngôn ngữ
+        gpu (Optional[bool]): Dùng GPU không (None = tự phát hiện)
+        
+    Returns:
+        Any: easyocr.Reader
+    """
+    reader = _get_easyocr_reader(langs, gpu)
+    if reader is None:
+        raise RuntimeError("EasyOCR chưa được cài đặt hoặc khởi tạo trong process con")
+    return reader
+
+def _easyocr_prewarm_worker(langs: Tuple[str, ...], gpu: Optional[bool]) -> bool:
+    """Nạp trước EasyOCR reader trong process con"""
+    return _get_easyocr_reader(langs, gpu) is not None
+
+def _easyocr_readtext_worker(langs: Tuple[str, ...], gpu: Optional[bool], image: np.ndarray,
+                             kwargs: Dict[str, Any]) -> List[Any]:
+    """
+    Gọi reader.readtext trong process con (hàm top-level để pickle được)
+    
+    Args:
+        langs (Tuple[str, ...]): Danh sách ngôn ngữ
+        gpu (Optional[bool]): Dùng GPU không
+        image (np.ndarray): Ảnh đã tiền xử lý
+        kwargs (Dict[str, Any]): Tham số cho readtext
+        
+    Returns:
+        List[Any]: Kết quả readtext
+    """
+    reader = _easyocr_worker_reader(langs, gpu)
+    with _easyocr_inference_context(reader):
+        return reader.readtext(image, **kwargs)
+
+def _easyocr_readtext_batched_worker(langs: Tuple[str, ...], gpu: Optional[bool], images: List[np.ndarray],
+                                     kwargs: Dict[str, Any]) -> List[List[Any]]:
+    """
+    Gọi reader.readtext_batched trong process con
+    
+    Args:
+        langs (Tuple[str, ...]): Danh sách ngôn ngữ
+        gpu (Optional[bool]): Dùng GPU không
+        images (List[np.ndarray]): Các ảnh cùng kích thước
+        kwargs (Dict[str, Any]): Tham số cho readtext_batched
+        
+    Returns:
+        List[List[Any]]: Kết quả theo từng ảnh
+    """
+    reader = _easyocr_worker_reader(langs, gpu)
+    with _easyocr_inference_context(reader):
+        return reader.readtext_batched(images, **kwargs)
+
+class _IsolatedEasyOCRReader:
+    """
+    Thay thế easyocr.Reader trong process cha: chuyển readtext/readtext_batched
+    sang process con của _get_easyocr_pool(), model chỉ nạp trong process con
+    """
+    
+    def __init__(self, langs: Tuple[str, ...] = ('vi', 'en'), gpu: Optional[bool] = None):
+        self.langs = tuple(langs)
+        self.gpu = gpu
+    
+    def _call(self, fn: Any, *args: Any) -> Any:
+        try:
+            future = _get_easyocr_pool().submit(fn, self.langs, self.gpu, *args)
+            return future.result(timeout=EASYOCR_WORKER_TIMEOUT)
+        except BrokenProcessPool:
+            _reset_easyocr_pool()
+            raise
+    
+    def prewarm(self) -> bool:
+        try:
+            return self._call(_easyocr_prewarm_worker)
+        except Exception as e:
+            print(f"❌ Không thể khởi tạo EasyOCR trong process con: {e}")
+            return False
+    
+    def readtext(self, image: np.ndarray, **kwargs: Any) -> List[Any]:
+        return self._call(_easyocr_readtext_worker, image, kwargs)
+    
+    def readtext_batched(self, images: List[np.ndarray], **kwargs: Any) -> List[List[Any]]:
+        return self._call(_easyocr_readtext_batched_worker, images, kwargs)
+
 class OCRTool:
     """Tool OCR để đọc text từ ảnh và PDF scan"""
     
@@ -50,54 +740,41 @@ class OCRTool:
         self.ocr_engine = ocr_engine
         self.easyocr_reader = None
         
-        # Khởi tạo EasyOCR reader nếu có
+        # Lấy EasyOCR reader dùng chung (chỉ khởi tạo một lần mỗi process)
         if EASYOCR_AVAILABLE and ocr_engine in ["easyocr", "auto"]:
-            try:
-                # Hỗ trợ tiếng Việt và tiếng Anh
-                self.easyocr_reader = easyocr.Reader(['vi', 'en'], gpu=False)
-                print(f"✅ EasyOCR reader đã được khởi tạo thành công")
-            except Exception as e:
-                print(f"❌ Không thể khởi tạo EasyOCR: {e}")
-                self.easyocr_reader = None
+            # Hỗ trợ tiếng Việt và tiếng Anh
+            if EASYOCR_ISOLATE:
+                # Model nạp trong process con khi gọi lần đầu
+                self.easyocr_reader = _IsolatedEasyOCRReader(('vi', 'en'))
+            else:
+                self.easyocr_reader = _get_easyocr_reader(('vi', 'en'))
         
-        # Kiểm tra Tesseract
-        self.tesseract_available = False
-        if TESSERACT_AVAILABLE:
-            try:
-                # Kiểm tra đơn giản bằng cách test version
-                version = pytesseract.get_tesseract_version()
-                self.tesseract_available = True
-                print(f"✅ Tesseract version {version} đã được phát hiện")
-            except Exception as e:
-                print(f"❌ Tesseract không khả dụng: {e}")
-                # Thử test khác
-                try:
-                    # Test với string đơn giản
-                    from PIL import Image
-                    import io
-                    
-                    # Tạo ảnh test trong memory
-                    test_img = Image.new('RGB', (100, 30), color='white')
-                    from PIL import ImageDraw
-                    draw = ImageDraw.Draw(test_img)
-                    draw.text((10, 10), "test", fill='black')
-                    
-                    # Convert to bytes
-                    img_byte_arr = io.BytesIO()
-                    test_img.save(img_byte_arr, format='PNG')
-                    img_byte_arr.seek(0)
-                    
-                    # Test OCR
-                    result = pytesseract.image_to_string(Image.open(img_byte_arr))
-                    self.tesseract_available = True
-                    print(f"✅ Tesseract hoạt động với memory test")
-                except Exception as test_error:
-                    print(f"❌ Tesseract test cuối cũng thất bại: {test_error}")
-                    self.tesseract_available = False
+        # Kiểm tra Tesseract (chỉ chạy một lần mỗi process)
+        self.tesseract_available = _probe_tesseract()
+        
+        # Bảng engine -> hàm OCR (dựng một lần) và thứ tự thử ở chế độ auto:
+        # ưu tiên Tesseract cho tiếng Việt (tốt hơn cho văn bản giáo dục), EasyOCR làm fallback
+        self._engine_dispatch = {
+            "tesseract": self._ocr_with_tesseract,
+            "easyocr": self._ocr_with_easyocr
+        }
+        self._engine_priority = [
+            name for name, available in (
+                ("tesseract", self.tesseract_available),
+                ("easyocr", EASYOCR_AVAILABLE and self.easyocr_reader is not None)
+            ) if available
+        ]
+        
+        # Đối tượng CLAHE dùng lại giữa các lần tiền xử lý (pipeline tiếng Việt)
+        self._clahe_vi = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
+        
+        # Pool buffer ndarray cho các ảnh trung gian khi tiền xử lý, key theo (shape, dtype)
+        self._buf_pool: Dict[Tuple[Tuple[int, ...], Any], List[np.ndarray]] = {}
         
         # Debug availability
         print(f"🔍 OCR Engine Status:")
         print(f"  - TESSERACT_AVAILABLE: {TESSERACT_AVAILABLE}")
+        print(f"  - TESSEROCR_AVAILABLE: {TESSEROCR_AVAILABLE}")
         print(f"  - Tesseract working: {self.tesseract_available}")
         print(f"  - EASYOCR_AVAILABLE: {EASYOCR_AVAILABLE}")
         print(f"  - EasyOCR Reader: {self.easyocr_reader is not None}")
@@ -109,6 +786,30 @@ class OCRTool:
             # pytesseract.pytesseract.tesseract_cmd = r'C:\Program Files\Tesseract-OCR\tesseract.exe'
             pass
     
+    @classmethod
+    def prewarm(cls, langs: Tuple[str, ...] = ('vi', 'en'), gpu: Optional[bool] = None) -> Dict[str, bool]:
+        """
+        Nạp trước EasyOCR reader và kiểm tra Tesseract cho process hiện tại
+        (gọi khi khởi động worker để request đầu tiên không phải chờ nạp model)
+        
+        Args:
+            langs (Tuple[str, ...]): Danh sách ngôn ngữ EasyOCR
+            gpu (Optional[bool]): Dùng GPU không (None = tự phát hiện)
+            
+        Returns:
+            Dict[str, bool]: Trạng thái các engine
+        """
+        if not EASYOCR_AVAILABLE:
+            easyocr_ready = False
+        elif EASYOCR_ISOLATE:
+            easyocr_ready = _IsolatedEasyOCRReader(langs, gpu).prewarm()
+        else:
+            easyocr_ready = _get_easyocr_reader(langs, gpu) is not None
+        return {
+            "easyocr": easyocr_ready,
+            "tesseract": _probe_tesseract()
+        }
+    
     def _preprocess_image(self, image_path: str, enhance: bool = True, max_size: int = 2048, for_vietnamese: bool = True) -> np.ndarray:
         """
         Tiền xử lý ảnh để cải thiện độ chính xác OCR
@@ -122,11 +823,56 @@ class OCRTool:
         Returns:
             np.ndarray: Ảnh đã được xử lý
         """
+        image = self._load_image(image_path)
+        if image is None:
+            print("Lỗi khi xử lý ảnh: Không thể đọc ảnh")
+            return None
+        
+        return self._preprocess_array(image, enhance=enhance, max_size=max_size, for_vietnamese=for_vietnamese)
+    
+    def _load_image(self, image_path: str) -> Optional[np.ndarray]:
+        """
+        Đọc và decode ảnh một lần (BGR)
+        
+        Dùng np.fromfile + cv2.imdecode thay cho cv2.imread để đọc file một lần
+        và hỗ trợ đường dẫn có ký tự Unicode (tên file tiếng Việt trên Windows).
+        
+        Args:
+            image_path (str): Đường dẫn ảnh
+            
+        Returns:
+            Optional[np.ndarray]: Ảnh BGR hoặc None nếu không đọc được
+        """
+        try:
+            buffer = np.fromfile(image_path, dtype=np.uint8)
+            if buffer.size == 0:
+                return None
+            return cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+        except Exception as e:
+            print(f"Lỗi khi đọc ảnh: {e}")
+            return None
+    
+    def _preprocess_array(self, image: np.ndarray, enhance: bool = True, max_size: int = 2048, for_vietnamese: bool = True) -> np.ndarray:
+        """
+        Tiền xử lý ảnh đã decode (BGR) để cải thiện độ chính xác OCR
+        
+        Args:
+            image (np.ndarray): Ảnh BGR
+            enhance (bool): Có enhance ảnh không
+            max_size (int): Kích thước tối đa cho cạnh dài nhất
+            for_vietnamese (bool): Có tối ưu cho tiếng Việt không
+            
+        Returns:
+            np.ndarray: Ảnh đã được xử lý
+        """
+        original = image
+        pooled: List[np.ndarray] = []
         try:
-            # Đọc ảnh bằng OpenCV
-            image = cv2.imread(image_path)
-            if image is None:
-                raise ValueError("Không thể đọc ảnh")
+            if enhance and image.ndim == 3:
+                # Chuyển sang grayscale trước khi resize để resize 1 kênh thay vì 3
+                gray_buf = self._get_buf(image.shape[:2])
+                image = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY, dst=gray_buf)
+                pooled.append(gray_buf)
             
             # Resize ảnh nếu quá lớn để tránh lỗi memory
             height, width = image.shape[:2]
@@ -134,12 +880,24 @@ class OCRTool:
                 scale = max_size / max(height, width)
                 new_width = int(width * scale)
                 new_height = int(height * scale)
-                image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
+                if enhance:
+                    # Ảnh trung gian -> ghi vào buffer trong pool
+                    resized_buf = self._get_buf((new_height, new_width))
+                    image = cv2.resize(image, (new_width, new_height), dst=resized_buf, interpolation=cv2.INTER_AREA)
+                    pooled.append(resized_buf)
+                else:
+                    image = cv2.resize(image, (new_width, new_height), interpolation=cv2.INTER_AREA)
                 print(f"🔧 Resized image from {width}x{height} to {new_width}x{new_height}")
             
             if enhance:
-                # Chuyển sang grayscale
-                gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY)
+                gray = image
+                
+                if gray.ndim == 2 and self._is_near_binary(gray):
+                    # Ảnh đã tương phản cao: tiền xử lý chỉ làm mất nét chữ, trả luôn grayscale
+                    print("🔧 Image is already near-binary, skipping enhancement")
+                    # Ảnh trả về có thể là buffer trong pool -> không trả buffer đó về pool
+                    pooled = [buf for buf in pooled if buf is not gray]
+                    return gray
                 
                 if for_vietnamese:
                     # Preprocessing đặc biệt cho tiếng Việt
@@ -150,33 +908,37 @@ class OCRTool:
                         scale_factor = 600 / min(gray.shape)
                         new_w = int(gray.shape[1] * scale_factor)
                         new_h = int(gray.shape[0] * scale_factor)
-                        gray = cv2.resize(gray, (new_w, new_h), interpolation=cv2.INTER_CUBIC)
+                        upscaled_buf = self._get_buf((new_h, new_w))
+                        gray = cv2.resize(gray, (new_w, new_h), dst=upscaled_buf, interpolation=cv2.INTER_CUBIC)
+                        pooled.append(upscaled_buf)
                         print(f"🔧 Upscaled for better text recognition: {new_w}x{new_h}")
                     
+                    # Chạy pipeline trên UMat (OpenCV T-API): dùng OpenCL nếu có,
+                    # các bước trung gian không phải copy qua lại bộ nhớ host
+                    umat = cv2.UMat(gray)
+                    
                     # Tăng contrast mạnh hơn
-                    clahe = cv2.createCLAHE(clipLimit=3.0, tileGridSize=(8, 8))
-                    enhanced = clahe.apply(gray)
+                    umat = self._clahe_vi.apply(umat)
                     
                     # Khử noise với median filter (tốt hơn cho text)
-                    denoised = cv2.medianBlur(enhanced, 3)
+                    umat = cv2.medianBlur(umat, 3)
                     
-                    # Sharpen filter để làm rõ text
-                    kernel = np.array([[-1,-1,-1], [-1,9,-1], [-1,-1,-1]])
-                    sharpened = cv2.filter2D(denoised, -1, kernel)
+                    # Sharpen filter để làm rõ text: kernel [[-1,-1,-1],[-1,9,-1],[-1,-1,-1]]
+                    # tương đương 10*I - 9*mean3x3(I), tính bằng boxFilter + addWeighted (có nhánh SIMD)
+                    blurred = cv2.boxFilter(umat, -1, (3, 3))
+                    umat = cv2.addWeighted(umat, 10.0, blurred, -9.0, 0)
                     
                     # Adaptive threshold tốt hơn cho text
-                    processed = cv2.adaptiveThreshold(sharpened, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
+                    umat = cv2.adaptiveThreshold(umat, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY, 11, 2)
+                    processed = umat.get()
                 else:
-                    # Preprocessing thông thường
-                    # Khử noise bằng Gaussian blur
-                    denoised = cv2.GaussianBlur(gray, (5, 5), 0)
-                    
-                    # Tăng contrast bằng CLAHE
-                    clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-                    enhanced = clahe.apply(denoised)
-                    
-                    # Threshold để tạo ảnh binary
-                    _, processed = cv2.threshold(enhanced, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+                    # Preprocessing thông thường: một lượt adaptive threshold (Gaussian)
+                    # thay cho GaussianBlur -> CLAHE -> Otsu (3 lượt đọc/ghi toàn ảnh).
+                    # Ngưỡng cục bộ đã bù được nền sáng không đều như CLAHE.
+                    processed = cv2.adaptiveThreshold(
+                        gray, 255, cv2.ADAPTIVE_THRESH_GAUSSIAN_C, cv2.THRESH_BINARY,
+                        ADAPTIVE_THRESH_BLOCK_SIZE, ADAPTIVE_THRESH_C
+                    )
                 
                 return processed
             else:
@@ -184,52 +946,146 @@ class OCRTool:
                 
         except Exception as e:
             print(f"Lỗi khi xử lý ảnh: {e}")
-            # Fallback: đọc ảnh gốc
-            return cv2.imread(image_path)
+            # Fallback: trả về ảnh gốc
+            return original
+        finally:
+            # Trả các buffer trung gian về pool cho lần xử lý sau
+            self._return_buf(*pooled)
+    
+    def _is_near_binary(self, gray: np.ndarray) -> bool:
+        """
+        Kiểm tra ảnh grayscale đã gần nhị phân chưa (histogram 4 bin, một lượt quét)
+        
+        Args:
+            gray (np.ndarray): Ảnh grayscale
+            
+        Returns:
+            bool: True nếu > NEAR_BINARY_RATIO pixel nằm ở bin tối nhất hoặc sáng nhất
+        """
+        hist = cv2.calcHist([gray], [0], None, [4], [0, 256]).ravel()
+        total = hist.sum()
+        return total > 0 and (hist[0] + hist[-1]) / total > NEAR_BINARY_RATIO
+    
+    def _get_buf(self, shape: Tuple[int, ...], dtype: Any = np.uint8) -> np.ndarray:
+        """
+        Lấy buffer ndarray từ pool (hoặc cấp phát mới nếu chưa có)
+        
+        Args:
+            shape (Tuple[int, ...]): Kích thước buffer
+            dtype (Any): Kiểu dữ liệu
+            
+        Returns:
+            np.ndarray: Buffer chưa khởi tạo giá trị
+        """
+        bufs = self._buf_pool.get((tuple(shape), np.dtype(dtype)))
+        if bufs:
+            try:
+                return bufs.pop()
+            except IndexError:
+                pass
+        return np.empty(shape, dtype=dtype)
+    
+    def _return_buf(self, *bufs: np.ndarray):
+        """
+        Trả buffer về pool để dùng lại
+        
+        Args:
+            *bufs (np.ndarray): Các buffer lấy từ _get_buf
+        """
+        # Tránh pool phình to khi xử lý ảnh nhiều kích thước khác nhau
+        if len(self._buf_pool) > BUF_POOL_MAX_SHAPES:
+            self._buf_pool.clear()
+        for buf in bufs:
+            free = self._buf_pool.setdefault((buf.shape, buf.dtype), [])
+            if len(free) < BUF_POOL_MAX_PER_SHAPE:
+                free.append(buf)
+    
+    def _preprocess_for_easyocr(self, image: np.ndarray, max_size: int = 1024) -> np.ndarray:
+        """
+        Tiền xử lý nhẹ cho EasyOCR: chỉ chuyển grayscale và thu nhỏ
+        
+        EasyOCR tự chuẩn hóa ảnh trước detector/recognizer, pipeline
+        CLAHE/sharpen/threshold chỉ cần cho Tesseract.
+        
+        Args:
+            image (np.ndarray): Ảnh BGR hoặc grayscale
+            max_size (int): Kích thước tối đa cho cạnh dài nhất
+            
+        Returns:
+            np.ndarray: Ảnh grayscale đã resize
+        """
+        gray = cv2.cvtColor(image, cv2.COLOR_BGR2GRAY) if image.ndim == 3 else image
+        height, width = gray.shape[:2]
+        if max(height, width) > max_size:
+            scale = max_size / max(height, width)
+            gray = cv2.resize(gray, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+        return gray
+    
+    def _preprocess_input(self, image: Union[str, np.ndarray], **kwargs) -> np.ndarray:
+        """
+        Tiền xử lý ảnh đầu vào dạng đường dẫn hoặc ndarray
+        
+        Args:
+            image (Union[str, np.ndarray]): Đường dẫn ảnh hoặc ảnh BGR đã decode
+            **kwargs: Tham số truyền cho _preprocess_array
+            
+        Returns:
+            np.ndarray: Ảnh đã được xử lý
+        """
+        if isinstance(image, np.ndarray):
+            return self._preprocess_array(image, **kwargs)
+        return self._preprocess_image(image, **kwargs)
     
-    def _preprocess_image_pil(self, image_path: str) -> Any:
+    def _preprocess_image_pil(self, image_path: Union[str, Any]) -> Any:
         """
         Tiền xử lý ảnh bằng PIL
         
         Args:
-            image_path (str): Đường dẫn ảnh
+            image_path (Union[str, Image.Image]): Đường dẫn ảnh hoặc ảnh PIL đã mở
             
         Returns:
-            Image.Image: Ảnh đã được xử lý
+            Image.Image: Ảnh đã được xử lý (ảnh gốc nếu xử lý lỗi)
         """
+        original = None
         try:
-            image = Image.open(image_path)
+            # Chỉ đọc file một lần, lỗi xử lý thì trả lại ảnh đã mở thay vì đọc lại
+            original = Image.open(image_path) if isinstance(image_path, (str, os.PathLike)) else image_path
+            image = original
             
             # Convert sang grayscale nếu cần
             if image.mode != 'L':
                 image = image.convert('L')
             
-            # Tăng contrast
-            enhancer = ImageEnhance.Contrast(image)
-            image = enhancer.enhance(2.0)
+            # Tăng contrast x2 quanh độ sáng trung bình (tương đương ImageEnhance.Contrast(2.0)),
+            # tính in-place trên mảng int16 thay vì tạo ảnh trung gian rồi blend
+            arr = np.asarray(image, dtype=np.int16)
+            mean = int(arr.mean() + 0.5)
+            np.multiply(arr, 2, out=arr)
+            np.subtract(arr, mean, out=arr)
+            np.clip(arr, 0, 255, out=arr)
             
-            # Tăng độ sắc nét
-            image = image.filter(ImageFilter.SHARPEN)
+            # Tăng độ sắc nét (cùng kernel với ImageFilter.SHARPEN)
+            sharpened = cv2.filter2D(arr.astype(np.uint8), -1, PIL_SHARPEN_KERNEL)
             
-            return image
+            return Image.fromarray(sharpened)
             
         except Exception as e:
             print(f"Lỗi khi xử lý ảnh PIL: {e}")
-            return Image.open(image_path)
+            return original
     
-    def _ocr_with_tesseract(self, image_path: str, languages: str = "vie+eng") -> Dict[str, Any]:
+    def _ocr_with_tesseract(self, image: Union[str, np.ndarray], languages: str = "vie+eng") -> Dict[str, Any]:
         """
         OCR sử dụng Tesseract với cấu hình tối ưu cho tiếng Việt
         
         Args:
-            image_path (str): Đường dẫn ảnh
+            image (Union[str, np.ndarray]): Đường dẫn ảnh hoặc ảnh BGR đã decode
             languages (str): Ngôn ngữ OCR
             
         Returns:
             Dict[str, Any]: Kết quả OCR
         """
         try:
-            if not TESSERACT_AVAILABLE or not self.tesseract_available:
+            if not (TESSEROCR_AVAILABLE or TESSERACT_AVAILABLE) or not self.tesseract_available:
                 return {
                     "success": False,
                     "error": "Tesseract chưa được cài đặt hoặc không hoạt động"
@@ -238,34 +1094,26 @@ class OCRTool:
             print("🚀 Trying Tesseract with Vietnamese optimization...")
             
             # Tiền xử lý ảnh với tối ưu cho tiếng Việt
-            processed_image = self._preprocess_image(image_path, enhance=True, for_vietnamese=True)
-            
-            # Thử nhiều cấu hình PSM khác nhau cho tiếng Việt
-            configs = [
-                '--oem 3 --psm 6 -c tessedit_char_whitelist=ABCDEFGHIJKLMNOPQRSTUVWXYZabcdefghijklmnopqrstuvwxyzÀÁÂÃÈÉÊÌÍÒÓÔÕÙÚÝàáâãèéêìíòóôõùúýĂĐĨŨƠăđĩũơƯĂẠẢẤẦẨẪẬẮẰẲẴẶẸẺẼỀỀỂưăạảấầẩẫậắằẳẵặẹẻẽềềểỄỆỈỊỌỎỐỒỔỖỘỚỜỞỠỢỤỦỨỪễệỉịọỏốồổỗộớờởỡợụủứừỬỮỰỲỴÝỶỸửữựỳỵỷỹ0123456789 .,;:!?()[]{}\"\'+-*/=<>%$&@#',
-                '--oem 3 --psm 4',  # Single column of text
-                '--oem 3 --psm 6',  # Single uniform block of text
-                '--oem 3 --psm 8',  # Single word
-                '--oem 3 --psm 3'   # Fully automatic page segmentation
-            ]
+            processed_image = self._preprocess_input(image, enhance=True, for_vietnamese=True)
             
             best_result = None
             best_confidence = 0
             
-            for config in configs:
+            # Thử nhiều cấu hình PSM khác nhau cho tiếng Việt
+            for config in TESSERACT_CONFIGS:
                 try:
                     print(f"🔧 Trying config: {config}")
                     
                     # Lấy text với confidence
-                    data = pytesseract.image_to_data(processed_image, lang=languages, config=config, output_type=pytesseract.Output.DICT)
+                    data = self._tesseract_image_to_data(processed_image, languages, config)
                     
-                    # Tính confidence trung bình
-                    confidences = [int(conf) for conf in data['conf'] if int(conf) > 0]
-                    avg_confidence = sum(confidences) / len(confidences) if confidences else 0
+                    # Tính confidence trung bình (vector hóa bằng NumPy)
+                    conf_arr = np.asarray(data['conf'], dtype=np.float32)
+                    valid_conf = conf_arr[conf_arr > 0]
+                    avg_confidence = float(valid_conf.mean()) if valid_conf.size else 0
                     
-                    # Lấy text
-                    text = pytesseract.image_to_string(processed_image, lang=languages, config=config)
-                    text = text.strip()
+                    # Ghép text từ kết quả image_to_data (không gọi Tesseract lần thứ hai)
+                    text = self._tesseract_data_to_text(data)
                     
                     print(f"   📊 Text length: {len(text)}, Confidence: {avg_confidence:.1f}%")
                     
@@ -273,9 +1121,15 @@ class OCRTool:
                         best_result = {
                             'text': text,
                             'confidence': avg_confidence,
-                            'config': config
+                            'config': config,
+                            'data': data
                         }
                         best_confidence = avg_confidence
+                    
+                    # Kết quả đã đủ tốt -> bỏ qua các cấu hình còn lại
+                    if avg_confidence > TESSERACT_GOOD_CONFIDENCE and len(text) > TESSERACT_GOOD_MIN_CHARS:
+                        print("   ✅ Confidence đủ cao, dừng thử cấu hình khác")
+                        break
                         
                 except Exception as e:
                     print(f"   ❌ Config failed: {e}")
@@ -293,12 +1147,12 @@ class OCRTool:
             print(f"📝 Sample: {text[:200]}...")
             
             # Tính word count
-            words = text.split()
-            word_count = len(words)
+            word_count = len(text.split())
             
             return {
                 "success": True,
                 "text": text,
+                "words": self._tesseract_words(best_result['data']),
                 "word_count": word_count,
                 "average_confidence": best_result['confidence'],
                 "engine": "tesseract",
@@ -306,50 +1160,6 @@ class OCRTool:
                 "config_used": best_result['config']
             }
             
-            # Nếu không có kết quả, thử với PSM khác
-            if not text.strip():
-                print("🔄 Trying with different PSM settings...")
-                config = '--oem 3 --psm 3'  # PSM 3: fully automatic page segmentation
-                text = pytesseract.image_to_string(processed_image, lang=languages, config=config)
-            
-            # Lấy thông tin chi tiết (bounding boxes)
-            data = pytesseract.image_to_data(processed_image, lang=languages, output_type=pytesseract.Output.DICT)
-            
-            # Tạo danh sách từ với vị trí
-            words = []
-            confidences = []
-            
-            for i in range(len(data['text'])):
-                if int(data['conf'][i]) > 0:  # Chỉ lấy từ có confidence > 0
-                    word_text = data['text'][i].strip()
-                    if word_text:  # Chỉ thêm từ không rỗng
-                        words.append({
-                            "text": word_text,
-                            "confidence": int(data['conf'][i]),
-                            "bbox": {
-                                "x": int(data['left'][i]),
-                                "y": int(data['top'][i]),
-                                "width": int(data['width'][i]),
-                                "height": int(data['height'][i])
-                            }
-                        })
-                        confidences.append(int(data['conf'][i]))
-            
-            # Tính confidence trung bình
-            avg_confidence = sum(confidences) / len(confidences) if confidences else 0
-            
-            print(f"📊 Tesseract results: {len(text)} chars, {len(words)} words, avg confidence: {avg_confidence:.1f}")
-            
-            return {
-                "success": True,
-                "engine": "tesseract",
-                "text": text.strip(),
-                "words": words,
-                "word_count": len([w for w in words if w['text'].strip()]),
-                "average_confidence": avg_confidence,
-                "languages": languages
-            }
-            
         except Exception as e:
             return {
                 "success": False,
@@ -357,12 +1167,118 @@ class OCRTool:
                 "engine": "tesseract"
             }
     
-    def _ocr_with_easyocr(self, image_path: str) -> Dict[str, Any]:
+    def _tesseract_image_to_data(self, image: np.ndarray, languages: str, config: str) -> Dict[str, List[Any]]:
+        """
+        Chạy Tesseract một lượt, lấy cả text lẫn confidence/vị trí từng từ
+        
+        Dùng tesserocr (gọi libtesseract trong process, model nạp một lần) nếu có,
+        ngược lại dùng pytesseract (spawn process tesseract mỗi lần gọi).
+        
+        Args:
+            image (np.ndarray): Ảnh đã tiền xử lý
+            languages (str): Ngôn ngữ OCR
+            config (str): Chuỗi config Tesseract
+            
+        Returns:
+            Dict[str, List[Any]]: Kết quả dạng pytesseract.image_to_data DICT
+        """
+        if TESSEROCR_AVAILABLE:
+            try:
+                return _tesserocr_image_to_data(image, languages, config)
+            except Exception as e:
+                if not TESSERACT_AVAILABLE:
+                    raise
+                print(f"⚠️ tesserocr lỗi, chuyển sang pytesseract: {e}")
+        return pytesseract.image_to_data(image, lang=languages, config=config, output_type=pytesseract.Output.DICT)
+    
+    def _tesseract_data_to_text(self, data: Dict[str, List[Any]]) -> str:
+        """
+        Ghép text theo thứ tự đọc từ kết quả pytesseract.image_to_data
+        
+        Các từ cùng dòng nối bằng dấu cách, các dòng nối bằng xuống dòng,
+        giữa các đoạn có một dòng trống (giống image_to_string).
+        
+        Args:
+            data (Dict[str, List[Any]]): Kết quả image_to_data dạng DICT
+            
+        Returns:
+            str: Text đã ghép
+        """
+        lines = []
+        line_words = []
+        current_line = None
+        current_par = None
+        
+        for i, word in enumerate(data['text']):
+            word = str(word).strip()
+            if not word or float(data['conf'][i]) < 0:
+                continue
+            
+            par_key = (data['block_num'][i], data['par_num'][i])
+            line_key = par_key + (data['line_num'][i],)
+            if line_key != current_line:
+                if line_words:
+                    lines.append(" ".join(line_words))
+                if current_par is not None and par_key != current_par:
+                    lines.append("")
+                line_words = []
+                current_line = line_key
+                current_par = par_key
+            line_words.append(word)
+        
+        if line_words:
+            lines.append(" ".join(line_words))
+        
+        return "\n".join(lines).strip()
+    
+    def _tesseract_words(self, data: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+        """
+        Tạo danh sách từ kèm vị trí từ kết quả pytesseract.image_to_data
+        
+        Args:
+            data (Dict[str, List[Any]]): Kết quả image_to_data dạng DICT
+            
+        Returns:
+            List[Dict[str, Any]]: Danh sách từ với confidence và bbox
+        """
+        if not data['text']:
+            return []
+        
+        text_arr = np.char.strip(np.asarray(data['text'], dtype=str))
+        conf_arr = np.asarray(data['conf'], dtype=np.float32)
+        left_arr = np.asarray(data['left'], dtype=np.int32)
+        top_arr = np.asarray(data['top'], dtype=np.int32)
+        width_arr = np.asarray(data['width'], dtype=np.int32)
+        height_arr = np.asarray(data['height'], dtype=np.int32)
+        
+        # Chỉ lấy từ không rỗng có confidence > 0
+        mask = (conf_arr > 0) & (np.char.str_len(text_arr) > 0)
+        
+        # Lọc theo cột rồi tolist() một lần (chuyển sang int/str Python trong C),
+        # không ép kiểu từng phần tử numpy trong vòng lặp Python
+        columns = zip(
+            text_arr[mask].tolist(),
+            conf_arr[mask].astype(np.int32).tolist(),
+            left_arr[mask].tolist(),
+            top_arr[mask].tolist(),
+            width_arr[mask].tolist(),
+            height_arr[mask].tolist()
+        )
+        return [
+            {
+                "text": text,
+                "confidence": conf,
+                "bbox": {"x": x, "y": y, "width": w, "height": h}
+            }
+            for text, conf, x, y, w, h in columns
+        ]
+    
+    def _ocr_with_easyocr(self, image: Union[str, np.ndarray]) -> Dict[str, Any]:
         """
         OCR sử dụng EasyOCR
         
         Args:
-            image_path (str): Đường dẫn ảnh
+            image (Union[str, np.ndarray]): Đường dẫn ảnh hoặc ảnh BGR đã decode
             
         Returns:
             Dict[str, Any]: Kết quả OCR
@@ -374,58 +1290,34 @@ class OCRTool:
                     "error": "EasyOCR chưa được cài đặt hoặc khởi tạo"
                 }
             
-            # Tiền xử lý ảnh (resize để tránh lỗi memory)
+            # Decode một lần, dùng lại khi phải thử ảnh nhỏ hơn
+            if isinstance(image, str):
+                image = self._load_image(image)
+                if image is None:
+                    raise ValueError("Không thể đọc ảnh")
+            
+            # Tiền xử lý ảnh (chỉ grayscale + resize để tránh lỗi memory)
             print(f"🔧 Preprocessing image for EasyOCR...")
-            processed_image = self._preprocess_image(image_path, enhance=True, max_size=1024)
+            processed_image = self._preprocess_for_easyocr(image, max_size=1024)
             
             # OCR với EasyOCR
             try:
                 print(f"🚀 Running EasyOCR...")
-                results = self.easyocr_reader.readtext(processed_image)
+                with _easyocr_inference_context(self.easyocr_reader):
+                    results = self.easyocr_reader.readtext(processed_image)
                 print(f"📊 EasyOCR found {len(results)} text regions")
             except Exception as e:
                 if "memory" in str(e).lower() or "alloc" in str(e).lower():
                     # Thử với ảnh nhỏ hơn nữa
                     print("⚠️ Memory error, trying with smaller image...")
-                    processed_image = self._preprocess_image(image_path, enhance=True, max_size=512)
-                    results = self.easyocr_reader.readtext(processed_image)
+                    processed_image = self._preprocess_for_easyocr(image, max_size=512)
+                    with _easyocr_inference_context(self.easyocr_reader):
+                        results = self.easyocr_reader.readtext(processed_image)
                     print(f"📊 EasyOCR found {len(results)} text regions (smaller image)")
                 else:
                     raise e
             
-            # Chuyển đổi kết quả
-            text_parts = []
-            words = []
-            confidences = []
-            
-            for (bbox, text, confidence) in results:
-                print(f"  📝 Found: '{text}' (confidence: {confidence:.3f})")
-                if confidence > 0.3:  # Giảm threshold để lấy nhiều text hơn
-                    text_parts.append(text)
-                    words.append({
-                        "text": text,
-                        "confidence": float(confidence * 100),  # Convert to percentage
-                        "bbox": {
-                            "points": bbox  # EasyOCR trả về 4 điểm góc
-                        }
-                    })
-                    confidences.append(confidence * 100)
-            
-            # Kết hợp text
-            full_text = " ".join(text_parts)
-            avg_confidence = sum(confidences) / len(confidences) if confidences else 0
-            
-            print(f"📊 EasyOCR results: {len(full_text)} chars, {len(words)} words, avg confidence: {avg_confidence:.1f}%")
-            
-            return {
-                "success": True,
-                "engine": "easyocr",
-                "text": full_text,
-                "words": words,
-                "word_count": len(words),
-                "average_confidence": avg_confidence,
-                "languages": ["vi", "en"]
-            }
+            return self._easyocr_results_to_dict(results)
             
         except Exception as e:
             return {
@@ -434,25 +1326,320 @@ class OCRTool:
                 "engine": "easyocr"
             }
     
-    def extract_text_from_image(self, image_path: str, engine: Optional[str] = None) -> Dict[str, Any]:
+    def _ocr_with_easyocr_batch(self, images: List[np.ndarray]) -> List[Dict[str, Any]]:
+        """
+        OCR nhiều ảnh (BGR) bằng EasyOCR readtext_batched
+        
+        Ảnh được gom theo kích thước sau tiền xử lý (làm tròn lên bội số EASYOCR_BATCH_BUCKET,
+        pad nền trắng ở cạnh phải/dưới) để chạy detector theo batch mà không phải resize
+        méo ảnh; tọa độ bbox không đổi vì ảnh gốc nằm ở góc trên trái.
+        
+        Args:
+            images (List[np.ndarray]): Danh sách ảnh BGR
+            
+        Returns:
+            List[Dict[str, Any]]: Kết quả OCR theo đúng thứ tự ảnh đầu vào
+        """
+        if not EASYOCR_AVAILABLE or self.easyocr_reader is None:
+            return [{
+                "success": False,
+                "error": "EasyOCR chưa được cài đặt hoặc khởi tạo"
+            } for _ in images]
+        
+        outputs: List[Optional[Dict[str, Any]]] = [None] * len(images)
+        
+        # Gom ảnh cùng kích thước (đã làm tròn theo bucket) thành từng nhóm
+        groups: Dict[Tuple[int, ...], List[Tuple[int, np.ndarray]]] = {}
+        bucket = EASYOCR_BATCH_BUCKET
+        for idx, image in enumerate(images):
+            processed_image = self._preprocess_for_easyocr(image, max_size=1024)
+            height, width = processed_image.shape[:2]
+            pad_bottom = -height % bucket
+            pad_right = -width % bucket
+            if pad_bottom or pad_right:
+                processed_image = cv2.copyMakeBorder(
+                    processed_image, 0, pad_bottom, 0, pad_right, cv2.BORDER_CONSTANT, value=255
+                )
+            groups.setdefault(processed_image.shape, []).append((idx, processed_image))
+        
+        for shape, members in groups.items():
+            for start in range(0, len(members), EASYOCR_BATCH_SIZE):
+                chunk = members[start:start + EASYOCR_BATCH_SIZE]
+                try:
+                    print(f"🚀 Running EasyOCR batch: {len(chunk)} images {shape[1]}x{shape[0]}")
+                    with _easyocr_inference_context(self.easyocr_reader):
+                        batch_results = self.easyocr_reader.readtext_batched(
+                            [img for _, img in chunk],
+                            n_width=shape[1],
+                            n_height=shape[0]
+                        )
+                    for (idx, _), results in zip(chunk, batch_results):
+                        outputs[idx] = self._easyocr_results_to_dict(results)
+                except Exception as e:
+                    print(f"⚠️ EasyOCR batch failed, falling back to per-image: {e}")
+                    for idx, img in chunk:
+                        try:
+                            with _easyocr_inference_context(self.easyocr_reader):
+                                results = self.easyocr_reader.readtext(img)
+                            outputs[idx] = self._easyocr_results_to_dict(results)
+                        except Exception as single_error:
+                            outputs[idx] = {
+                                "success": False,
+                                "error": f"Lỗi EasyOCR: {str(single_error)}",
+                                "engine": "easyocr"
+                            }
+        
+        return outputs
+    
+    def _easyocr_results_to_dict(self, results: List[Any]) -> Dict[str, Any]:
+        """
+        Chuyển kết quả thô của EasyOCR thành dict kết quả OCR
+        
+        Args:
+            results (List[Any]): Danh sách (bbox, text, confidence) từ EasyOCR
+            
+        Returns:
+            Dict[str, Any]: Kết quả OCR
+        """
+        text_parts = []
+        words = []
+        confidences = []
+        
+        for (bbox, text, confidence) in results:
+            print(f"  📝 Found: '{text}' (confidence: {confidence:.3f})")
+            if confidence > 0.3:  # Giảm threshold để lấy nhiều text hơn
+                text_parts.append(text)
+                words.append({
+                    "text": text,
+                    "confidence": float(confidence * 100),  # Convert to percentage
+                    "bbox": {
+                        "points": bbox  # EasyOCR trả về 4 điểm góc
+                    }
+                })
+                confidences.append(confidence * 100)
+        
+        # Kết hợp text
+        full_text = " ".join(text_parts)
+        avg_confidence = float(np.mean(confidences)) if confidences else 0
+        
+        print(f"📊 EasyOCR results: {len(full_text)} chars, {len(words)} words, avg confidence: {avg_confidence:.1f}%")
+        
+        return {
+            "success": True,
+            "engine": "easyocr",
+            "text": full_text,
+            "words": words,
+            "word_count": len(words),
+            "average_confidence": avg_confidence,
+            "languages": ["vi", "en"]
+        }
+    
+    def _use_tesseract_pool(self, n_images: int) -> bool:
+        """Kiểm tra có nên chạy Tesseract song song bằng process pool không"""
+        if n_images < 2 or TESSERACT_WORKERS < 2 or not self.tesseract_available:
+            return False
+        return self.ocr_engine in ("tesseract", "auto")
+    
+    def _ocr_with_tesseract_pool(self, image_paths: List[str]) -> List[Dict[str, Any]]:
+        """
+        OCR nhiều ảnh bằng Tesseract song song trên nhiều process
+        
+        Ở chế độ auto, ảnh nào Tesseract cho kết quả kém sẽ được chạy lại bằng EasyOCR
+        trong process chính (dùng chung reader đã nạp).
+        
+        Args:
+            image_paths (List[str]): Danh sách đường dẫn ảnh
+            
+        Returns:
+            List[Dict[str, Any]]: Kết quả OCR theo đúng thứ tự ảnh đầu vào
+        """
+        workers = min(TESSERACT_WORKERS, len(image_paths))
+        print(f"🚀 Running Tesseract on {len(image_paths)} images with {workers} processes...")
+        with _new_tesseract_pool(workers) as executor:
+            results = list(executor.map(_tesseract_ocr_worker, image_paths))
+        
+        for i, result in enumerate(results):
+            if self._needs_easyocr_fallback(result) and os.path.exists(image_paths[i]):
+                print(f"🚀 Trying EasyOCR as fallback for {os.path.basename(image_paths[i])}...")
+                fallback = self._ocr_with_easyocr(image_paths[i])
+                if fallback["success"]:
+                    results[i] = fallback
+        
+        return results
+    
+    def _ocr_arrays_with_tesseract_pool(self, images: Iterable[np.ndarray]) -> List[Dict[str, Any]]:
+        """
+        OCR nhiều ảnh trong bộ nhớ bằng Tesseract song song trên nhiều process
+        
+        Mỗi ảnh được copy một lần vào shared memory, process con chỉ nhận
+        (tên vùng nhớ, shape, dtype) nên không phải pickle ndarray. Số ảnh đang
+        xử lý được giới hạn để ảnh đọc từ iterator (ví dụ trang PDF) không dồn trong RAM.
+        
+        Args:
+            images (Iterable[np.ndarray]): Các ảnh BGR
+            
+        Returns:
+            List[Dict[str, Any]]: Kết quả OCR theo đúng thứ tự ảnh đầu vào
+        """
+        results: Dict[int, Dict[str, Any]] = {}
+        in_flight: Dict[Any, Tuple[int, Any, np.ndarray]] = {}
+        
+        def collect(futures):
+            for future in futures:
+                idx, shm, shared_image = in_flight.pop(future)
+                try:
+                    result = future.result()
+                except Exception as e:
+                    result = {
+                        "success": False,
+                        "error": f"Lỗi Tesseract OCR: {str(e)}",
+                        "engine": "tesseract"
+                    }
+                if self._needs_easyocr_fallback(result):
+                    print(f"🚀 Trying EasyOCR as fallback for image {idx + 1}...")
+                    fallback = self._ocr_with_easyocr(shared_image)
+                    if fallback["success"]:
+                        result = fallback
+                results[idx] = result
+                del shared_image
+                shm.close()
+                shm.unlink()
+        
+        print(f"🚀 Running Tesseract with {TESSERACT_WORKERS} processes (shared memory)...")
+        with _new_tesseract_pool(TESSERACT_WORKERS) as executor:
+            try:
+                for idx, image in enumerate(images):
+                    image = np.ascontiguousarray(image)
+                    shm = shared_memory.SharedMemory(create=True, size=image.nbytes)
+                    shared_image = np.ndarray(image.shape, dtype=image.dtype, buffer=shm.buf)
+                    shared_image[...] = image
+                    future = executor.submit(_tesseract_ocr_shm_worker, shm.name, image.shape, image.dtype.str)
+                    in_flight[future] = (idx, shm, shared_image)
+                    del shared_image, image
+                    
+                    if len(in_flight) >= TESSERACT_WORKERS * 2:
+                        done, _ = wait(list(in_flight), return_when=FIRST_COMPLETED)
+                        collect(done)
+                
+                collect(list(in_flight))
+            finally:
+                # Giải phóng shared memory còn lại nếu có lỗi giữa chừng
+                leftover = [shm for _, shm, _ in in_flight.values()]
+                in_flight.clear()
+                for shm in leftover:
+                    shm.close()
+                    shm.unlink()
+        
+        return [results[i] for i in range(len(results))]
+    
+    def _needs_easyocr_fallback(self, result: Dict[str, Any]) -> bool:
+        """Kiểm tra kết quả Tesseract (chế độ auto) có cần chạy lại bằng EasyOCR không"""
+        if self.ocr_engine != "auto" or not EASYOCR_AVAILABLE or not self.easyocr_reader:
+            return False
+        return not (result["success"] and len(result["text"]) > 20)
+    
+    def _use_easyocr_batch(self) -> bool:
+        """Kiểm tra engine hiện tại có chạy EasyOCR theo batch được không"""
+        if self.easyocr_reader is None:
+            return False
+        return self.ocr_engine == "easyocr" or (self.ocr_engine == "auto" and not self.tesseract_available)
+    
+    def extract_text_from_image(self, image_path: Union[str, np.ndarray, Any], engine: Optional[str] = None) -> Dict[str, Any]:
         """
         Extract text từ ảnh
         
         Args:
-            image_path (str): Đường dẫn ảnh
+            image_path (Union[str, np.ndarray, Image.Image]): Đường dẫn ảnh, hoặc ảnh trong bộ nhớ
+                (ndarray BGR / PIL Image) để không phải ghi file tạm
             engine (Optional[str]): OCR engine cụ thể
             
         Returns:
             Dict[str, Any]: Kết quả OCR
         """
+        if not isinstance(image_path, (str, os.PathLike)):
+            return self.extract_text_from_array(image_path, engine)
+        
+        # Kiểm tra file có tồn tại
+        if not os.path.exists(image_path):
+            return {
+                "success": False,
+                "error": "File ảnh không tồn tại"
+            }
+        
+        # Đọc file một lần: dùng để hash (cache) và decode
         try:
-            # Kiểm tra file có tồn tại
-            if not os.path.exists(image_path):
-                return {
-                    "success": False,
-                    "error": "File ảnh không tồn tại"
-                }
+            with open(image_path, 'rb') as f:
+                content = f.read()
+        except OSError as e:
+            return {
+                "success": False,
+                "error": f"Không thể đọc ảnh: {str(e)}"
+            }
+        
+        # Ảnh trùng nội dung đã OCR trước đó -> trả kết quả cache
+        cache_key = _ocr_cache_key(_content_hash(content), engine or self.ocr_engine)
+        cached = _ocr_cache_get(cache_key)
+        if cached is not None:
+            print(f"♻️ OCR cache hit: {os.path.basename(image_path)}")
+            return cached
+        
+        # Decode một lần, các engine và bước fallback dùng chung ndarray
+        image = cv2.imdecode(np.frombuffer(content, dtype=np.uint8), cv2.IMREAD_COLOR) if content else None
+        if image is None:
+            return {
+                "success": False,
+                "error": "Không thể đọc ảnh"
+            }
+        
+        result = self._extract_text(image, engine, image_path=image_path)
+        _ocr_cache_put(cache_key, result)
+        return result
+    
+    def extract_text_from_array(self, image: np.ndarray, engine: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Extract text từ ảnh đã decode trong bộ nhớ (không cần ghi file tạm)
+        
+        Args:
+            image (np.ndarray): Ảnh BGR (theo quy ước OpenCV) hoặc PIL Image
+            engine (Optional[str]): OCR engine cụ thể
+            
+        Returns:
+            Dict[str, Any]: Kết quả OCR
+        """
+        if PIL_AVAILABLE and isinstance(image, Image.Image):
+            image = self._pil_to_bgr(image)
+        
+        if image is None or image.size == 0:
+            return {
+                "success": False,
+                "error": "Ảnh rỗng"
+            }
+        
+        # Hash cả shape để hai ảnh khác kích thước cùng bytes không trùng key
+        image = np.ascontiguousarray(image)
+        cache_key = _ocr_cache_key(_content_hash(image.data) + str(image.shape), engine or self.ocr_engine)
+        cached = _ocr_cache_get(cache_key)
+        if cached is not None:
+            print("♻️ OCR cache hit (in-memory image)")
+            return cached
+        
+        result = self._extract_text(image, engine)
+        _ocr_cache_put(cache_key, result)
+        return result
+    
+    def _extract_text(self, image: Union[str, np.ndarray], engine: Optional[str] = None, image_path: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Chọn engine và chạy OCR cho ảnh (đường dẫn hoặc ndarray)
+        
+        Args:
+            image (Union[str, np.ndarray]): Đường dẫn ảnh hoặc ảnh BGR đã decode
+            engine (Optional[str]): OCR engine cụ thể
+            image_path (Optional[str]): Đường dẫn gốc (dùng cho thông tin lỗi)
             
+        Returns:
+            Dict[str, Any]: Kết quả OCR
+        """
+        try:
             # Xác định engine sử dụng
             use_engine = engine or self.ocr_engine
             
@@ -462,43 +1649,31 @@ class OCRTool:
                 print(f"  - EasyOCR reader initialized: {self.easyocr_reader is not None}")
                 print(f"  - Tesseract available: {TESSERACT_AVAILABLE}")
                 
-                # Ưu tiên Tesseract cho tiếng Việt (tốt hơn cho văn bản giáo dục)
-                if self.tesseract_available:
-                    print("🚀 Trying Tesseract first (better for Vietnamese)...")
-                    result = self._ocr_with_tesseract(image_path)
-                    if result["success"] and len(result["text"]) > 20:  # Chỉ chấp nhận nếu có đủ text
-                        print("✅ Tesseract succeeded with good result")
+                # Thử lần lượt các engine khả dụng theo thứ tự ưu tiên. Tesseract chỉ được
+                # chấp nhận khi có đủ text, kể cả khi là engine duy nhất; EasyOCR là fallback
+                # nên nhận mọi kết quả thành công
+                for position, name in enumerate(self._engine_priority, 1):
+                    print(f"🚀 Trying {name} ({position}/{len(self._engine_priority)})...")
+                    result = self._engine_dispatch[name](image)
+                    accept_short = name == "easyocr"
+                    if result["success"] and (accept_short or len(result["text"]) > AUTO_MIN_TEXT_CHARS):
+                        print(f"✅ {name} succeeded")
                         return result
-                    else:
-                        error_msg = result.get('error', f'Short text: {len(result.get("text", ""))} chars')
-                        print(f"❌ Tesseract failed or low quality: {error_msg}")
-                
-                # Fallback sang EasyOCR
-                if EASYOCR_AVAILABLE and self.easyocr_reader:
-                    print("🚀 Trying EasyOCR as fallback...")
-                    result = self._ocr_with_easyocr(image_path)
-                    if result["success"]:
-                        print("✅ EasyOCR succeeded")
-                        return result
-                    else:
-                        print(f"❌ EasyOCR failed: {result.get('error', 'Unknown error')}")
+                    error_msg = result.get('error', f'Short text: {len(result.get("text", ""))} chars')
+                    print(f"❌ {name} failed or low quality: {error_msg}")
                 
                 return {
                     "success": False,
                     "error": f"Không có OCR engine nào khả dụng hoặc tất cả đều thất bại. EasyOCR: {EASYOCR_AVAILABLE and self.easyocr_reader is not None}, Tesseract: {self.tesseract_available}"
                 }
             
-            elif use_engine == "easyocr":
-                return self._ocr_with_easyocr(image_path)
-            
-            elif use_engine == "tesseract":
-                return self._ocr_with_tesseract(image_path)
-            
-            else:
+            ocr_fn = self._engine_dispatch.get(use_engine)
+            if ocr_fn is None:
                 return {
                     "success": False,
                     "error": f"OCR engine '{use_engine}' không được hỗ trợ"
                 }
+            return ocr_fn(image)
         
         except Exception as e:
             # Fallback khi tất cả OCR engines đều thất bại
@@ -507,7 +1682,7 @@ class OCRTool:
                 "error": f"Lỗi OCR: {str(e)}. Suggestion: File ảnh có thể quá lớn hoặc OCR engines chưa được cài đặt đúng cách.",
                 "fallback_info": {
                     "message": "Không thể đọc text từ ảnh, nhưng file đã được upload thành công",
-                    "image_path": image_path,
+                    "image_path": image_path or (image if isinstance(image, str) else None),
                     "available_engines": {
                         "easyocr": EASYOCR_AVAILABLE and self.easyocr_reader is not None,
                         "tesseract": self.tesseract_available if hasattr(self, 'tesseract_available') else False
@@ -527,7 +1702,7 @@ class OCRTool:
         
         Args:
             pdf_path (str): Đường dẫn file PDF
-            output_dir (Optional[str]): Thư mục lưu ảnh tạm
+            output_dir (Optional[str]): Không còn dùng (các trang được OCR trực tiếp trong bộ nhớ)
             
         Returns:
             Dict[str, Any]: Kết quả OCR tất cả trang
@@ -545,40 +1720,42 @@ class OCRTool:
                     "error": "File PDF không tồn tại"
                 }
             
-            # Tạo thư mục tạm nếu cần
-            if output_dir is None:
-                output_dir = "temp_images"
+            all_results = []
+            text_parts = []
             
-            os.makedirs(output_dir, exist_ok=True)
+            page_count = pdf2image.pdfinfo_from_path(pdf_path)["Pages"]
             
-            # Convert PDF thành ảnh
-            pages = pdf2image.convert_from_path(pdf_path)
+            # Các trang được convert dần ở thread nền, tối đa PDF_PREFETCH_PAGES trang nằm trong RAM.
+            # Trang trùng lặp (trang trắng, trang scan lặp lại) chỉ OCR một lần.
+            page_order: List[int] = []
+            pages = self._dedup_pages(self._iter_pdf_pages(pdf_path, page_count), page_order)
+            page_results = []
+            if self._use_easyocr_batch():
+                # EasyOCR: chạy detector theo batch trên từng nhóm trang
+                chunk = []
+                for page_array in pages:
+                    chunk.append(page_array)
+                    if len(chunk) >= EASYOCR_BATCH_SIZE:
+                        page_results.extend(self._ocr_with_easyocr_batch(chunk))
+                        chunk = []
+                if chunk:
+                    page_results.extend(self._ocr_with_easyocr_batch(chunk))
+            elif self._use_tesseract_pool(page_count):
+                # Tesseract: OCR song song các trang qua shared memory
+                page_results = self._ocr_arrays_with_tesseract_pool(pages)
+            else:
+                for page_array in pages:
+                    page_results.append(self.extract_text_from_array(page_array))
             
-            all_results = []
-            total_text = ""
+            if len(page_results) < len(page_order):
+                print(f"♻️ Reused OCR results for {len(page_order) - len(page_results)} duplicate pages")
+            page_results = [dict(page_results[i]) for i in page_order]
             
-            for page_num, page in enumerate(pages, 1):
-                # Lưu page thành ảnh tạm
-                temp_image_path = os.path.join(output_dir, f"page_{page_num}.png")
-                page.save(temp_image_path, 'PNG')
-                
-                # OCR cho page này
-                page_result = self.extract_text_from_image(temp_image_path)
-                
+            for page_num, page_result in enumerate(page_results, 1):
                 if page_result["success"]:
                     page_result["page_number"] = page_num
                     all_results.append(page_result)
-                    total_text += page_result.get("text", "") + "\n"
-                
-                # Xóa ảnh tạm
-                if os.path.exists(temp_image_path):
-                    os.remove(temp_image_path)
-            
-            # Xóa thư mục tạm nếu rỗng
-            try:
-                os.rmdir(output_dir)
-            except:
-                pass
+                    text_parts.append(page_result.get("text", ""))
             
             # Tính toán thống kê
             total_words = sum(result.get("word_count", 0) for result in all_results)
@@ -587,10 +1764,10 @@ class OCRTool:
             return {
                 "success": True,
                 "file_type": "pdf_scan",
-                "total_pages": len(pages),
+                "total_pages": len(page_results),
                 "processed_pages": len(all_results),
                 "pages": all_results,
-                "total_text": total_text.strip(),
+                "total_text": "\n".join(text_parts).strip(),
                 "total_word_count": total_words,
                 "average_confidence": avg_confidence,
                 "processing_date": datetime.utcnow()
@@ -602,6 +1779,134 @@ class OCRTool:
                 "error": f"Lỗi khi xử lý PDF scan: {str(e)}"
             }
     
+    def _dedup_pages(self, pages: Iterable[np.ndarray], order: List[int]) -> Iterator[np.ndarray]:
+        """
+        Bỏ qua trang trùng nội dung (so hash pixel) khi stream các trang PDF
+        
+        Args:
+            pages (Iterable[np.ndarray]): Các trang theo thứ tự
+            order (List[int]): Được điền dần: trang thứ i dùng kết quả của trang duy nhất order[i]
+            
+        Yields:
+            np.ndarray: Các trang không trùng, theo thứ tự xuất hiện đầu tiên
+        """
+        seen: Dict[str, int] = {}
+        for page in pages:
+            page = np.ascontiguousarray(page)
+            key = _content_hash(page.data) + str(page.shape)
+            index = seen.get(key)
+            if index is None:
+                index = seen[key] = len(seen)
+                order.append(index)
+                yield page
+            else:
+                order.append(index)
+    
+    def _dedup_paths(self, image_paths: List[str]) -> Tuple[List[str], List[int]]:
+        """
+        Gom các file ảnh trùng nội dung (so hash bytes của file)
+        
+        Args:
+            image_paths (List[str]): Danh sách đường dẫn ảnh
+            
+        Returns:
+            Tuple[List[str], List[int]]: (các đường dẫn không trùng, chỉ số ảnh duy nhất cho từng ảnh đầu vào)
+        """
+        unique_paths: List[str] = []
+        order: List[int] = []
+        seen: Dict[str, int] = {}
+        for image_path in image_paths:
+            try:
+                with open(image_path, 'rb') as f:
+                    key = _content_hash(f.read())
+            except OSError:
+                # File lỗi/không tồn tại: giữ riêng để báo lỗi như bình thường
+                key = None
+            index = seen.get(key) if key is not None else None
+            if index is None:
+                index = len(unique_paths)
+                unique_paths.append(image_path)
+                if key is not None:
+                    seen[key] = index
+            order.append(index)
+        return unique_paths, order
+    
+    def _pil_to_bgr(self, image: Any) -> np.ndarray:
+        """
+        Chuyển PIL Image sang ndarray BGR liên tục (contiguous) cho OpenCV
+        
+        Args:
+            image (Image.Image): Ảnh PIL
+            
+        Returns:
+            np.ndarray: Ảnh BGR
+        """
+        if image.mode == 'L':
+            return np.asarray(image)
+        if image.mode != 'RGB':
+            image = image.convert('RGB')
+        return cv2.cvtColor(np.asarray(image), cv2.COLOR_RGB2BGR)
+    
+    def _iter_pdf_pages(self, pdf_path: str, page_count: Optional[int] = None) -> Iterator[np.ndarray]:
+        """
+        Convert từng trang PDF thành ảnh BGR ở thread nền (producer) và trả dần cho OCR
+        
+        pdf2image/poppler render theo cụm PDF_RENDER_CHUNK_PAGES trang, chạy song song
+        với OCR trang trước; hàng đợi giới hạn PDF_PREFETCH_PAGES trang nên không
+        phải giữ toàn bộ PDF trong RAM.
+        
+        Args:
+            pdf_path (str): Đường dẫn file PDF
+            page_count (Optional[int]): Số trang (None = đọc từ pdfinfo)
+            
+        Yields:
+            np.ndarray: Ảnh BGR của từng trang theo thứ tự
+        """
+        if page_count is None:
+            page_count = pdf2image.pdfinfo_from_path(pdf_path)["Pages"]
+        pages_queue = queue.Queue(maxsize=PDF_PREFETCH_PAGES)
+        stop = threading.Event()
+        done = object()
+        
+        def put(item) -> bool:
+            # Chờ chỗ trống trong hàng đợi, dừng nếu consumer đã thoát
+            while not stop.is_set():
+                try:
+                    pages_queue.put(item, timeout=0.5)
+                    return True
+                except queue.Full:
+                    continue
+            return False
+        
+        def produce():
+            try:
+                for first_page in range(1, page_count + 1, PDF_RENDER_CHUNK_PAGES):
+                    last_page = min(first_page + PDF_RENDER_CHUNK_PAGES - 1, page_count)
+                    pages = pdf2image.convert_from_path(pdf_path, first_page=first_page, last_page=last_page)
+                    for i in range(len(pages)):
+                        page_array = self._pil_to_bgr(pages[i])
+                        # Bỏ tham chiếu PIL page ngay sau khi convert để giải phóng sớm
+                        pages[i] = None
+                        if not put(page_array):
+                            return
+                    del pages
+                put(done)
+            except Exception as e:
+                put(e)
+        
+        producer = threading.Thread(target=produce, daemon=True)
+        producer.start()
+        try:
+            while True:
+                item = pages_queue.get()
+                if item is done:
+                    return
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            stop.set()
+    
     def batch_ocr(self, image_paths: List[str]) -> Dict[str, Any]:
         """
         Xử lý OCR nhiều ảnh cùng lúc
@@ -614,19 +1919,46 @@ class OCRTool:
         """
         try:
             results = []
-            total_text = ""
+            text_parts = []
+            
+            # Ảnh trùng nội dung trong batch chỉ OCR một lần
+            unique_paths, order = self._dedup_paths(image_paths)
+            if len(unique_paths) < len(image_paths):
+                print(f"♻️ Reusing OCR results for {len(image_paths) - len(unique_paths)} duplicate images")
+            
+            if self._use_easyocr_batch():
+                # EasyOCR: đọc toàn bộ ảnh rồi chạy theo batch
+                batch_results: List[Optional[Dict[str, Any]]] = [None] * len(unique_paths)
+                loaded = []
+                for i, image_path in enumerate(unique_paths):
+                    image = self._load_image(image_path) if os.path.exists(image_path) else None
+                    if image is None:
+                        batch_results[i] = {
+                            "success": False,
+                            "error": "File ảnh không tồn tại hoặc không đọc được"
+                        }
+                    else:
+                        loaded.append((i, image))
+                for (i, _), result in zip(loaded, self._ocr_with_easyocr_batch([img for _, img in loaded])):
+                    batch_results[i] = result
+            elif self._use_tesseract_pool(len(unique_paths)):
+                # Tesseract: chạy song song trên nhiều process
+                batch_results = self._ocr_with_tesseract_pool(unique_paths)
+            else:
+                batch_results = []
+                for i, image_path in enumerate(unique_paths):
+                    print(f"Processing image {i+1}/{len(unique_paths)}: {os.path.basename(image_path)}")
+                    batch_results.append(self.extract_text_from_image(image_path))
             
             for i, image_path in enumerate(image_paths):
-                print(f"Processing image {i+1}/{len(image_paths)}: {os.path.basename(image_path)}")
-                
-                result = self.extract_text_from_image(image_path)
+                result = dict(batch_results[order[i]])
                 result["image_index"] = i
                 result["image_name"] = os.path.basename(image_path)
                 
                 results.append(result)
                 
                 if result["success"]:
-                    total_text += result.get("text", "") + "\n"
+                    text_parts.append(result.get("text", ""))
             
             # Thống kê
             successful = [r for r in results if r["success"]]
@@ -638,7 +1970,7 @@ class OCRTool:
                 "total_images": len(image_paths),
                 "successful_images": len(successful),
                 "results": results,
-                "combined_text": total_text.strip(),
+                "combined_text": "\n".join(text_parts).strip(),
                 "total_word_count": total_words,
                 "average_confidence": avg_confidence,
                 "processing_date": datetime.utcnow()
@@ -661,7 +1993,7 @@ class OCRTool:
             "image_formats": [".jpg", ".jpeg", ".png", ".bmp", ".tiff", ".gif"],
             "pdf_scan": [".pdf"] if PDF2IMAGE_AVAILABLE else [],
             "available_engines": {
-                "tesseract": TESSERACT_AVAILABLE,
+                "tesseract": TESSEROCR_AVAILABLE or TESSERACT_AVAILABLE,
                 "easyocr": EASYOCR_AVAILABLE and self.easyocr_reader is not None
             }
         }
@@ -4,11 +4,65 @@ Hỗ trợ MongoDB với vector search và hybrid search
 """
 
 import math
+import re
+import hashlib
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict
+import numpy as np
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
 from typing import Dict, List, Any, Optional, Tuple
-from datetime import datetime
+from datetime import datetime, timedelta
 from database import DatabaseManager
 from tools.embedding_tool import EmbeddingTool
 
+# Cache embedding của query: LRU trong RAM (dùng chung trong process) + collection MongoDB có TTL
+# (dùng chung giữa các process), tránh gọi OpenAI lại cho query lặp lại
+QUERY_EMBEDDING_CACHE_SIZE = 4096
+QUERY_EMBEDDING_CACHE_COLLECTION = "query_embedding_cache"
+QUERY_EMBEDDING_CACHE_TTL = 7 * 24 * 3600  # giây
+_QUERY_EMBEDDINGS: "OrderedDict[str, List[float]]" = OrderedDict()
+_QUERY_EMBEDDINGS_LOCK = threading.Lock()
+_QUERY_CACHE_INDEXED = False
+
+# Text index trên content cho keyword search (None = chưa tạo)
+_TEXT_INDEX_READY: Optional[bool] = None
+_TOKENS_INDEX_READY = False
+
+# Thống kê embeddings cập nhật dần khi insert ($inc), đối chiếu lại bằng aggregation định kỳ
+EMBEDDING_STATS_COLLECTION = "embedding_stats"
+STATS_RECONCILE_INTERVAL = 24 * 3600  # giây
+
+# Kết quả kiểm tra/tạo Atlas vector index thành công theo (tên database, collection) -> không gọi lại mỗi instance
+_VECTOR_INDEX_RESULTS: Dict[tuple, Dict[str, Any]] = {}
+
+# SimSIMD: kernel cosine SIMD (AVX2/AVX-512/NEON) nhanh hơn NumPy cho vector 1536 chiều
+try:
+    import simsimd
+    SIMSIMD_AVAILABLE = True
+except ImportError:
+    SIMSIMD_AVAILABLE = False
+
+# hnswlib: HNSW index trong RAM thay cho scan toàn collection khi không có Atlas Vector Search
+try:
+    import hnswlib
+    HNSWLIB_AVAILABLE = True
+except ImportError:
+    HNSWLIB_AVAILABLE = False
+
+# Chỉ dùng HNSW khi collection đủ lớn (nhỏ hơn thì scan NumPy đủ nhanh và chính xác tuyệt đối)
+ANN_MIN_DOCUMENTS = 5000
+
+# Scan: chấm sơ bộ bằng int8 rồi rerank (float16) RERANK_FACTOR * limit ứng viên tốt nhất
+RERANK_FACTOR = 4
+ANN_EF_CONSTRUCTION = 200
+ANN_M = 16
+
+# Index cũ hơn collection (insert từ process khác): build lại trong background, tối đa một lần mỗi chừng này giây
+ANN_REBUILD_INTERVAL = 300  # giây
+
 class VectorSearchTool:
     """Tool tìm kiếm vector similarity trong MongoDB"""
     
@@ -29,6 +83,78 @@ class VectorSearchTool:
         # Cấu hình search
         self.default_limit = 10
         self.min_similarity_threshold = 0.5
+        
+        # Atlas Vector Search có dùng được không (None = chưa thử), tránh lặp lại lỗi mỗi query
+        self._atlas_available: Optional[bool] = None
+        
+        # HNSW index trong RAM, build trong background thread; query dùng index hiện có
+        # (hoặc scan khi chưa có) trong lúc build. Lock bảo vệ index và các trường đi kèm
+        self._ann = None
+        self._ann_ids: List[Any] = []
+        self._ann_doc_count = 0
+        self._ann_lock = threading.Lock()
+        self._ann_building = False
+        self._ann_built_at = 0.0
+    
+    def _embed_query(self, query_text: str) -> Dict[str, Any]:
+        """
+        Tạo embedding cho query, có cache theo hash nội dung + model
+        
+        Args:
+            query_text (str): Text query
+            
+        Returns:
+            Dict[str, Any]: Kết quả dạng create_embedding ({"success", "embedding"} hoặc {"success", "error"})
+        """
+        global _QUERY_CACHE_INDEXED
+        model = self.embedding_tool.model
+        key = f"{model}:{hashlib.blake2b(query_text.encode('utf-8'), digest_size=16).hexdigest()}"
+        
+        # Tầng 1: LRU trong RAM
+        with _QUERY_EMBEDDINGS_LOCK:
+            embedding = _QUERY_EMBEDDINGS.get(key)
+            if embedding is not None:
+                _QUERY_EMBEDDINGS.move_to_end(key)
+                return {"success": True, "embedding": embedding, "cached": True}
+        
+        # Tầng 2: MongoDB (bỏ qua nếu lỗi)
+        cache_collection = None
+        try:
+            cache_collection = self.db_manager.db[QUERY_EMBEDDING_CACHE_COLLECTION]
+            cached_doc = cache_collection.find_one({"_id": key}, {"embedding": 1})
+            if cached_doc:
+                embedding = cached_doc["embedding"]
+        except Exception as e:
+            print(f"⚠️ Không đọc được query embedding cache: {e}")
+            cache_collection = None
+        
+        if embedding is None:
+            query_result = self.embedding_tool.create_embedding(query_text)
+            if not query_result["success"]:
+                return query_result
+            embedding = query_result["embedding"]
+            
+            if cache_collection is not None:
+                try:
+                    if not _QUERY_CACHE_INDEXED:
+                        # TTL index: MongoDB tự xóa entry quá hạn
+                        cache_collection.create_index("created_at", expireAfterSeconds=QUERY_EMBEDDING_CACHE_TTL)
+                        _QUERY_CACHE_INDEXED = True
+                    cache_collection.replace_one(
+                        {"_id": key},
+                        {"_id": key, "embedding": embedding, "model": model, "created_at": datetime.utcnow()},
+                        upsert=True
+                    )
+                except Exception as e:
+                    print(f"⚠️ Không ghi được query embedding cache: {e}")
+        
+        with _QUERY_EMBEDDINGS_LOCK:
+            _QUERY_EMBEDDINGS[key] = embedding
+            _QUERY_EMBEDDINGS.move_to_end(key)
+            while len(_QUERY_EMBEDDINGS) > QUERY_EMBEDDING_CACHE_SIZE:
+                _QUERY_EMBEDDINGS.popitem(last=False)
+        
+        return {"success": True, "embedding": embedding}
     
     def _calculate_cosine_similarity(self, vector1: List[float], vector2: List[float]) -> float:
         """
@@ -45,18 +171,21 @@ class VectorSearchTool:
             if len(vector1) != len(vector2):
                 return 0.0
             
-            # Tính dot product
-            dot_product = sum(a * b for a, b in zip(vector1, vector2))
-            
-            # Tính magnitude
-            magnitude1 = math.sqrt(sum(a * a for a in vector1))
-            magnitude2 = math.sqrt(sum(b * b for b in vector2))
-            
-            if magnitude1 == 0 or magnitude2 == 0:
-                return 0.0
+            v1 = np.asarray(vector1, dtype=np.float32)
+            v2 = np.asarray(vector2, dtype=np.float32)
             
             # Cosine similarity
-            similarity = dot_product / (magnitude1 * magnitude2)
+            if SIMSIMD_AVAILABLE:
+                if not v1.any() or not v2.any():
+                    return 0.0
+                # simsimd.cosine trả về cosine distance = 1 - similarity
+                similarity = 1.0 - float(simsimd.cosine(v1, v2))
+            else:
+                # Vector 0 -> tích norm bằng 0, không cần duyệt thêm bằng any()
+                norm_product = float(np.dot(v1, v1)) * float(np.dot(v2, v2))
+                if norm_product == 0.0:
+                    return 0.0
+                similarity = float(np.dot(v1, v2)) / math.sqrt(norm_product)
             
             # Normalize to [0, 1]
             return max(0.0, min(1.0, (similarity + 1) / 2))
@@ -65,9 +194,129 @@ class VectorSearchTool:
             print(f"Lỗi khi tính cosine similarity: {e}")
             return 0.0
     
+    @staticmethod
+    def pack_embedding(embedding: List[float]) -> Dict[str, Any]:
+        """
+        Tạo field phụ lưu kèm embedding: vector đã chuẩn hóa (unit length) dạng float16 bytes,
+        lúc search không phải tính lại norm và đọc/giải mã ít bytes hơn list float; kèm bản
+        int8 (scale riêng từng vector) cho lượt chấm điểm sơ bộ khi scan
+        
+        Args:
+            embedding (List[float]): Vector embedding
+            
+        Returns:
+            Dict[str, Any]: Các field cần thêm vào document
+        """
+        vector = np.asarray(embedding, dtype=np.float32)
+        norm = float(np.linalg.norm(vector))
+        if norm > 0:
+            vector = vector / norm
+        
+        # int8: q = round(x * scale), scale = 127 / max|x| -> x ≈ q / scale
+        max_abs = float(np.abs(vector).max()) if vector.size else 0.0
+        scale = 127.0 / max_abs if max_abs > 0 else 1.0
+        quantized = np.clip(np.rint(vector * scale), -127, 127).astype(np.int8)
+        return {
+            "embedding_f16": vector.astype(np.float16).tobytes(),
+            "embedding_i8": quantized.tobytes(),
+            "embedding_i8_scale": scale
+        }
+    
+    def _unit_embedding_matrix(self, docs: List[Dict[str, Any]], dim: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Ghép embedding (đã chuẩn hóa) của các documents thành ma trận float32
+        
+        Dùng embedding_f16 đã chuẩn hóa sẵn nếu có, ngược lại chuẩn hóa embedding gốc.
+        
+        Args:
+            docs (List[Dict[str, Any]]): Documents từ MongoDB
+            dim (int): Số chiều của query
+            
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: (chỉ số documents hợp lệ, ma trận unit vectors)
+        """
+        rows = []
+        valid = []
+        raw = []
+        for i, doc in enumerate(docs):
+            packed = doc.get("embedding_f16")
+            if packed is not None and len(packed) == dim * 2:
+                rows.append(np.frombuffer(packed, dtype=np.float16))
+            else:
+                embedding = doc.get("embedding")
+                if embedding is None or len(embedding) != dim:
+                    continue
+                raw.append(len(rows))
+                rows.append(embedding)
+            valid.append(i)
+        
+        if not rows:
+            return np.empty(0, dtype=np.intp), np.empty((0, dim), dtype=np.float32)
+        
+        matrix = np.asarray(rows, dtype=np.float32)
+        if raw:
+            # Documents cũ chưa có embedding_f16: chuẩn hóa theo batch
+            norms = np.linalg.norm(matrix[raw], axis=1, keepdims=True)
+            norms[norms == 0] = 1.0
+            matrix[raw] /= norms
+        return np.asarray(valid, dtype=np.intp), matrix
+    
+    def _batch_cosine_similarity(self, query_vector: List[float], docs: List[Dict[str, Any]]) -> np.ndarray:
+        """
+        Tính cosine similarity giữa query và embedding của nhiều documents bằng một phép nhân ma trận
+        
+        Args:
+            query_vector (List[float]): Vector query
+            docs (List[Dict[str, Any]]): Documents từ MongoDB
+            
+        Returns:
+            np.ndarray: Similarity (0-1) theo thứ tự docs; embedding khác số chiều hoặc bằng 0 -> 0
+        """
+        scores = np.zeros(len(docs), dtype=np.float32)
+        query = np.asarray(query_vector, dtype=np.float32)
+        query_norm = float(np.linalg.norm(query))
+        if not docs or query_norm == 0:
+            return scores
+        
+        # Chỉ tính với embeddings cùng số chiều với query
+        valid, matrix = self._unit_embedding_matrix(docs, query.shape[0])
+        if not valid.size:
+            return scores
+        zero_rows = ~matrix.any(axis=1)
+        
+        if SIMSIMD_AVAILABLE:
+            # cdist trả về cosine distance (1 x N)
+            similarity = 1.0 - np.asarray(simsimd.cdist(query[None, :], matrix, metric="cosine"), dtype=np.float32)[0]
+        else:
+            # Các hàng đã là unit vector -> cosine chỉ còn là dot product
+            similarity = matrix @ (query / query_norm)
+        
+        # Normalize to [0, 1]
+        normalized = np.clip((similarity + 1) / 2, 0.0, 1.0)
+        normalized[zero_rows] = 0.0
+        scores[valid] = normalized
+        return scores
+    
     def _create_vector_index(self) -> Dict[str, Any]:
         """
-        Tạo vector search index trong MongoDB (nếu chưa có)
+        Tạo vector search index trong MongoDB (nếu chưa có), kiểm tra một lần mỗi process
+        
+        Chỉ nhớ kết quả thành công: lần lỗi (ví dụ MongoDB chưa sẵn sàng) sẽ được thử lại ở lần sau.
+        
+        Returns:
+            Dict[str, Any]: Kết quả tạo index
+        """
+        cache_key = (self.db_manager.db.name, self.embeddings_collection)
+        result = _VECTOR_INDEX_RESULTS.get(cache_key)
+        if result is None:
+            result = self._build_vector_index()
+            if result.get("success"):
+                _VECTOR_INDEX_RESULTS[cache_key] = result
+        return result
+    
+    def _build_vector_index(self) -> Dict[str, Any]:
+        """
+        Kiểm tra/tạo vector search index trên MongoDB
         
         Returns:
             Dict[str, Any]: Kết quả tạo index
@@ -75,14 +324,16 @@ class VectorSearchTool:
         try:
             collection = self.db_manager.db[self.embeddings_collection]
             
-            # Kiểm tra index đã tồn tại chưa
-            existing_indexes = collection.list_indexes()
-            for index in existing_indexes:
-                if index.get("name") == "vector_index":
+            # Kiểm tra index đã tồn tại chưa (vector index là search index, không nằm trong list_indexes)
+            try:
+                if any(True for _ in collection.list_search_indexes("vector_index")):
                     return {
                         "success": True,
                         "message": "Vector index đã tồn tại"
                     }
+            except Exception:
+                # MongoDB local hoặc pymongo cũ: thử tạo bên dưới
+                pass
             
             # Tạo vector search index (cho MongoDB Atlas)
             # Note: Cần MongoDB Atlas với Vector Search feature
@@ -107,12 +358,16 @@ class VectorSearchTool:
                 }
                 
             except Exception as atlas_error:
-                # Fallback: tạo regular index cho local MongoDB
-                collection.create_index([("embedding", 1)])
-                
+                if "already exists" in str(atlas_error).lower():
+                    return {
+                        "success": True,
+                        "message": "Vector index đã tồn tại"
+                    }
+                # MongoDB local không có vector index; index B-tree trên mảng embedding
+                # chỉ làm chậm insert nên không tạo -> search dùng scan
                 return {
-                    "success": True,
-                    "message": "Regular index đã được tạo (không phải vector index)"
+                    "success": False,
+                    "error": f"Atlas Vector Search không khả dụng: {str(atlas_error)}"
                 }
                 
         except Exception as e:
@@ -132,27 +387,19 @@ class VectorSearchTool:
             Dict[str, Any]: Kết quả lưu trữ
         """
         try:
-            # Validate document
-            required_fields = ["content", "embedding"]
-            for field in required_fields:
-                if field not in document:
-                    return {
-                        "success": False,
-                        "error": f"Thiếu field required: {field}"
-                    }
-            
-            # Thêm metadata
-            document.update({
-                "created_at": datetime.utcnow(),
-                "embedding_model": self.embedding_tool.model,
-                "embedding_dimensions": len(document["embedding"]),
-                "content_length": len(document["content"]),
-                "content_hash": self.embedding_tool.create_text_hash(document["content"])
-            })
+            # Validate document và thêm metadata
+            error = self._prepare_document(document)
+            if error:
+                return {
+                    "success": False,
+                    "error": error
+                }
             
             # Lưu vào MongoDB
             collection = self.db_manager.db[self.embeddings_collection]
             result = collection.insert_one(document)
+            self._ann_add(result.inserted_id, document["embedding"])
+            self.record_stats(self.db_manager.db, self.embeddings_collection, [document])
             
             return {
                 "success": True,
@@ -166,6 +413,92 @@ class VectorSearchTool:
                 "error": f"Lỗi khi lưu embedding: {str(e)}"
             }
     
+    def store_embeddings(self, documents: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Lưu nhiều documents với embedding trong một lần insert_many (một round-trip cho cả batch)
+        
+        Args:
+            documents (List[Dict[str, Any]]): Các documents chứa content và embedding
+            
+        Returns:
+            Dict[str, Any]: Kết quả lưu trữ (kèm danh sách document_ids đã lưu)
+        """
+        try:
+            if not documents:
+                return {
+                    "success": True,
+                    "document_ids": [],
+                    "message": "Không có document nào để lưu"
+                }
+            
+            # Validate tất cả trước khi ghi để không lưu dở một batch không hợp lệ
+            for index, document in enumerate(documents):
+                error = self._prepare_document(document)
+                if error:
+                    return {
+                        "success": False,
+                        "error": f"Document {index}: {error}"
+                    }
+            
+            # ordered=False: server ghi song song, một document lỗi không chặn các document còn lại
+            collection = self.db_manager.db[self.embeddings_collection]
+            try:
+                inserted_ids = collection.insert_many(documents, ordered=False).inserted_ids
+                failed = set()
+                write_error = None
+            except BulkWriteError as e:
+                failed = {item["index"] for item in e.details.get("writeErrors", [])}
+                inserted_ids = [doc["_id"] for i, doc in enumerate(documents) if i not in failed]
+                write_error = f"{len(failed)} document không lưu được: {e.details.get('writeErrors', [{}])[0].get('errmsg')}"
+            
+            inserted_docs = [doc for i, doc in enumerate(documents) if i not in failed]
+            for doc in inserted_docs:
+                self._ann_add(doc["_id"], doc["embedding"])
+            self.record_stats(self.db_manager.db, self.embeddings_collection, inserted_docs)
+            
+            result = {
+                "success": write_error is None,
+                "document_ids": [str(doc_id) for doc_id in inserted_ids],
+                "message": f"Đã lưu {len(inserted_ids)}/{len(documents)} documents"
+            }
+            if write_error:
+                result["error"] = write_error
+            return result
+            
+        except Exception as e:
+            return {
+                "success": False,
+                "error": f"Lỗi khi lưu embeddings: {str(e)}"
+            }
+    
+    def _prepare_document(self, document: Dict[str, Any]) -> Optional[str]:
+        """
+        Validate document và thêm metadata, vector đã chuẩn hóa, content tokens trước khi lưu
+        
+        Args:
+            document (Dict[str, Any]): Document chứa content và embedding (được sửa trực tiếp)
+            
+        Returns:
+            Optional[str]: Thông báo lỗi hoặc None nếu hợp lệ
+        """
+        # Validate document
+        required_fields = ["content", "embedding"]
+        for field in required_fields:
+            if field not in document:
+                return f"Thiếu field required: {field}"
+        
+        # Thêm metadata
+        document.update({
+            "created_at": datetime.utcnow(),
+            "embedding_model": self.embedding_tool.model,
+            "embedding_dimensions": len(document["embedding"]),
+            "content_length": len(document["content"]),
+            "content_hash": self.embedding_tool.create_text_hash(document["content"]),
+            "content_tokens": self.tokenize_content(document["content"]),
+            **self.pack_embedding(document["embedding"])
+        })
+        return None
+    
     def similarity_search(self, 
                          query_text: str, 
                          limit: int = None, 
@@ -184,8 +517,8 @@ class VectorSearchTool:
             Dict[str, Any]: Kết quả tìm kiếm
         """
         try:
-            # Tạo embedding cho query
-            query_result = self.embedding_tool.create_embedding(query_text)
+            # Tạo embedding cho query (có cache)
+            query_result = self._embed_query(query_text)
             if not query_result["success"]:
                 return {
                     "success": False,
@@ -201,34 +534,40 @@ class VectorSearchTool:
             # Tạo MongoDB query
             mongo_filter = filters or {}
             
-            # Lấy tất cả documents từ collection
-            collection = self.db_manager.db[self.embeddings_collection]
-            cursor = collection.find(mongo_filter)
+            # Ưu tiên Atlas Vector Search: server chỉ trả về limit documents.
+            # Không có kết quả (index đang build/không khả dụng) thì scan toàn collection.
+            atlas_results = self._try_atlas_search(query_embedding, limit, mongo_filter)
+            if atlas_results:
+                results = [doc for doc in atlas_results if doc.get("similarity_score", 0) >= similarity_threshold]
+                return {
+                    "success": True,
+                    "query": query_text,
+                    "results": results,
+                    "total_found": len(results),
+                    "limit": limit,
+                    "similarity_threshold": similarity_threshold,
+                    "filters_applied": mongo_filter,
+                    "search_method": "atlas_vector_search",
+                    "search_time": datetime.utcnow()
+                }
             
-            # Tính similarity cho từng document
-            results = []
-            for doc in cursor:
-                if "embedding" not in doc:
-                    continue
+            # Không có Atlas: HNSW trong RAM (không hỗ trợ filter), còn lại scan toàn collection
+            ann_results = None if mongo_filter else self._ann_search(query_embedding, limit)
+            if ann_results is not None:
+                # knn_query đã trả về top-k theo similarity giảm dần
+                doc_ids, scores = ann_results
+                keep = np.flatnonzero(scores >= similarity_threshold)
+                search_method = "hnsw_index"
+            else:
+                # Tính similarity (chấm sơ bộ bằng int8, rerank ứng viên bằng float16)
+                doc_ids, scores = self._scan_scores(query_embedding, mongo_filter, limit)
                 
-                # Tính similarity
-                similarity = self._calculate_cosine_similarity(
-                    query_embedding, 
-                    doc["embedding"]
-                )
-                
-                # Lọc theo threshold
-                if similarity >= similarity_threshold:
-                    # Chuẩn bị kết quả (loại bỏ embedding vector để giảm kích thước)
-                    result_doc = {k: v for k, v in doc.items() if k != "embedding"}
-                    result_doc["similarity_score"] = similarity
-                    results.append(result_doc)
-            
-            # Sắp xếp theo similarity giảm dần
-            results.sort(key=lambda x: x["similarity_score"], reverse=True)
+                # Lọc theo threshold, sắp xếp theo similarity giảm dần và giới hạn kết quả
+                keep = self._top_k(scores, limit, np.flatnonzero(scores >= similarity_threshold))
+                search_method = "scan"
             
-            # Giới hạn kết quả
-            results = results[:limit]
+            # Chỉ tải đầy đủ các documents được chọn (không kèm embedding vector)
+            results = self._fetch_documents([doc_ids[i] for i in keep], scores[keep])
             
             return {
                 "success": True,
@@ -238,6 +577,7 @@ class VectorSearchTool:
                 "limit": limit,
                 "similarity_threshold": similarity_threshold,
                 "filters_applied": mongo_filter,
+                "search_method": search_method,
                 "search_time": datetime.utcnow()
             }
             
@@ -247,6 +587,395 @@ class VectorSearchTool:
                 "error": f"Lỗi khi tìm kiếm similarity: {str(e)}"
             }
     
+    def _top_k(self, scores: np.ndarray, k: int, candidates: Optional[np.ndarray] = None) -> np.ndarray:
+        """
+        Chọn k chỉ số có score cao nhất: argpartition O(M) rồi chỉ sort k phần tử
+        
+        Args:
+            scores (np.ndarray): Scores của tất cả documents
+            k (int): Số kết quả
+            candidates (Optional[np.ndarray]): Chỉ số được xét (None = tất cả)
+            
+        Returns:
+            np.ndarray: Chỉ số theo score giảm dần
+        """
+        indices = np.arange(scores.size) if candidates is None else candidates
+        if k <= 0 or indices.size == 0:
+            return indices[:0]
+        if indices.size > k:
+            indices = indices[np.argpartition(-scores[indices], k - 1)[:k]]
+        return indices[np.argsort(-scores[indices], kind="stable")]
+    
+    def _scan_scores(self,
+                     query_embedding: List[float],
+                     mongo_filter: Dict[str, Any],
+                     limit: int = None) -> Tuple[List[Any], np.ndarray]:
+        """
+        Scan collection và tính similarity, chỉ tải _id và vector (không tải content/metadata)
+        
+        Có limit: lượt đầu chỉ tải vector int8 để chấm điểm sơ bộ, giữ RERANK_FACTOR * limit
+        ứng viên rồi mới tải float16 của chúng để tính similarity chính xác. Không có limit
+        (hoặc chưa có bản int8): documents có embedding_f16 chỉ tải bytes float16, documents
+        cũ chưa có thì tải thêm list embedding trong một query riêng.
+        
+        Args:
+            query_embedding (List[float]): Vector query
+            mongo_filter (Dict[str, Any]): Filter MongoDB
+            limit (int): Số kết quả cần (None = tính chính xác cho tất cả)
+            
+        Returns:
+            Tuple[List[Any], np.ndarray]: (_id các documents được tính, similarity tương ứng)
+        """
+        if limit:
+            candidate_ids = self._quantized_candidates(query_embedding, mongo_filter, limit * RERANK_FACTOR)
+            if candidate_ids is not None:
+                mongo_filter = {"_id": {"$in": candidate_ids}}
+        
+        docs = self._load_vector_docs(mongo_filter)
+        scores = self._batch_cosine_similarity(query_embedding, docs)
+        return [doc["_id"] for doc in docs], scores
+    
+    def _quantized_candidates(self,
+                              query_embedding: List[float],
+                              mongo_filter: Dict[str, Any],
+                              candidate_count: int) -> Optional[List[Any]]:
+        """
+        Lượt chấm điểm sơ bộ trên vector int8 (1 byte/chiều), chọn ứng viên để rerank
+        
+        Args:
+            query_embedding (List[float]): Vector query
+            mongo_filter (Dict[str, Any]): Filter MongoDB
+            candidate_count (int): Số ứng viên giữ lại từ các documents có bản int8
+            
+        Returns:
+            Optional[List[Any]]: _id ứng viên (gồm cả documents chưa có int8, luôn được tính
+            chính xác), hoặc None nếu không có document nào có bản int8 (scan như cũ)
+        """
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query_norm = float(np.linalg.norm(query))
+        if query_norm == 0:
+            return None
+        query = query / query_norm
+        dim = query.shape[0]
+        
+        collection = self.db_manager.db[self.embeddings_collection]
+        has_embedding = {"embedding": {"$exists": True}}
+        scan_filter = {"$and": [mongo_filter, has_embedding]} if mongo_filter else has_embedding
+        docs = list(collection.find(scan_filter, {"embedding_i8": 1, "embedding_i8_scale": 1}).batch_size(1000))
+        
+        rows, scales, quantized_ids, other_ids = [], [], [], []
+        for doc in docs:
+            packed = doc.get("embedding_i8")
+            if packed is not None and len(packed) == dim and doc.get("embedding_i8_scale"):
+                rows.append(np.frombuffer(packed, dtype=np.int8))
+                scales.append(doc["embedding_i8_scale"])
+                quantized_ids.append(doc["_id"])
+            else:
+                other_ids.append(doc["_id"])
+        
+        if not rows:
+            return None
+        if len(rows) <= candidate_count:
+            return quantized_ids + other_ids
+        
+        matrix = np.asarray(rows, dtype=np.int8)
+        if SIMSIMD_AVAILABLE:
+            # Cosine trên int8 không cần scale; query cũng lượng tử hóa để dùng kernel i8
+            query_i8 = np.clip(np.rint(query * (127.0 / float(np.abs(query).max()))), -127, 127).astype(np.int8)
+            approx = 1.0 - np.asarray(simsimd.cdist(query_i8[None, :], matrix, metric="cosine"), dtype=np.float32)[0]
+        else:
+            # x ≈ q / scale -> dot(query, x) ≈ (q @ query) / scale
+            approx = (matrix.astype(np.float32) @ query) / np.asarray(scales, dtype=np.float32)
+        
+        top = np.argpartition(-approx, candidate_count - 1)[:candidate_count]
+        return [quantized_ids[i] for i in top] + other_ids
+    
+    def _load_vector_docs(self, mongo_filter: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """
+        Tải _id và vector (embedding_f16, hoặc embedding với documents cũ) của các documents khớp filter
+        
+        Args:
+            mongo_filter (Dict[str, Any]): Filter MongoDB
+            
+        Returns:
+            List[Dict[str, Any]]: Documents chỉ gồm _id và vector
+        """
+        collection = self.db_manager.db[self.embeddings_collection]
+        has_embedding = {"embedding": {"$exists": True}}
+        scan_filter = {"$and": [mongo_filter, has_embedding]} if mongo_filter else has_embedding
+        
+        docs = list(collection.find(scan_filter, {"embedding_f16": 1}).batch_size(1000))
+        
+        # Documents chưa có embedding_f16: tải list embedding
+        missing = [doc["_id"] for doc in docs if "embedding_f16" not in doc]
+        if missing:
+            embeddings = {
+                doc["_id"]: doc.get("embedding")
+                for doc in collection.find({"_id": {"$in": missing}}, {"embedding": 1}).batch_size(1000)
+            }
+            for doc in docs:
+                if "embedding_f16" not in doc:
+                    doc["embedding"] = embeddings.get(doc["_id"])
+        return docs
+    
+    def _ann_search(self, query_embedding: List[float], limit: int) -> Optional[Tuple[List[Any], np.ndarray]]:
+        """
+        Tìm top-k bằng HNSW index trong RAM (hnswlib)
+        
+        Không build index trong query: chưa có index thì khởi động build ở background và trả về None
+        (caller scan); index cũ hơn collection vẫn được dùng trong lúc build lại.
+        
+        Args:
+            query_embedding (List[float]): Vector query
+            limit (int): Số kết quả tối đa
+            
+        Returns:
+            Optional[Tuple[List[Any], np.ndarray]]: (_id, similarity 0-1) theo thứ tự giảm dần,
+            hoặc None nếu không dùng được HNSW (chưa cài hnswlib, collection nhỏ, index chưa build xong, lỗi)
+        """
+        if not HNSWLIB_AVAILABLE:
+            return None
+        
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query_norm = float(np.linalg.norm(query))
+        if query_norm == 0:
+            return None
+        
+        try:
+            # estimated_document_count đọc metadata, không scan collection
+            doc_count = self.db_manager.db[self.embeddings_collection].estimated_document_count()
+            if doc_count < ANN_MIN_DOCUMENTS:
+                return None
+            
+            with self._ann_lock:
+                index_ready = self._ann is not None and self._ann.dim == query.shape[0]
+                # Có documents được thêm/xóa từ nơi khác (EmbeddingService, process khác) -> build lại
+                stale = index_ready and self._ann_doc_count != doc_count and \
+                    time.monotonic() - self._ann_built_at >= ANN_REBUILD_INTERVAL
+            if not index_ready or stale:
+                self.refresh_ann_index(query.shape[0])
+            if not index_ready:
+                return None
+            
+            with self._ann_lock:
+                if self._ann is None:
+                    return None
+                k = min(limit, self._ann.get_current_count())
+                if k <= 0:
+                    return None
+                self._ann.set_ef(max(k * 2, 50))
+                labels, distances = self._ann.knn_query(query / query_norm, k=k)
+                ids = [self._ann_ids[label] for label in labels[0]]
+        except Exception as e:
+            print(f"⚠️ HNSW search failed, dùng scan: {e}")
+            with self._ann_lock:
+                self._ann = None
+            return None
+        
+        # Space "ip" trên unit vectors: distance = 1 - cosine
+        scores = np.clip((2.0 - distances[0]) / 2, 0.0, 1.0).astype(np.float32)
+        return ids, scores
+    
+    def refresh_ann_index(self, dim: int = None, wait: bool = False) -> bool:
+        """
+        Build lại HNSW index từ collection (mỗi lúc chỉ một lần build)
+        
+        Args:
+            dim (int): Số chiều vector, None = giữ số chiều của index hiện tại
+            wait (bool): True = build ngay trong thread hiện tại, False = build trong background thread
+            
+        Returns:
+            bool: True nếu đã bắt đầu build, False nếu đang có lần build khác hoặc không build được
+        """
+        if not HNSWLIB_AVAILABLE:
+            return False
+        with self._ann_lock:
+            if dim is None:
+                dim = self._ann.dim if self._ann is not None else None
+            if dim is None or self._ann_building:
+                return False
+            self._ann_building = True
+        
+        if wait:
+            self._build_ann_index(dim)
+        else:
+            threading.Thread(target=self._build_ann_index, args=(dim,), daemon=True).start()
+        return True
+    
+    def _build_ann_index(self, dim: int):
+        """
+        Build HNSW index từ toàn bộ vectors cùng số chiều trong collection rồi thay index cũ
+        
+        Args:
+            dim (int): Số chiều vector
+        """
+        try:
+            doc_count = self.db_manager.db[self.embeddings_collection].estimated_document_count()
+            docs = self._load_vector_docs({})
+            valid, matrix = self._unit_embedding_matrix(docs, dim)
+            
+            # Vector 0 không có hướng -> không đưa vào index
+            nonzero = matrix.any(axis=1)
+            valid, matrix = valid[nonzero], matrix[nonzero]
+            
+            index = hnswlib.Index(space="ip", dim=dim)
+            index.init_index(max_elements=max(len(valid), 1) + 1024, ef_construction=ANN_EF_CONSTRUCTION, M=ANN_M)
+            if len(valid):
+                index.add_items(matrix, np.arange(len(valid)))
+            
+            with self._ann_lock:
+                self._ann = index
+                self._ann_ids = [docs[i]["_id"] for i in valid]
+                self._ann_doc_count = doc_count
+            print(f"✅ Đã build HNSW index: {len(valid)} vectors")
+        except Exception as e:
+            print(f"⚠️ Build HNSW index failed: {e}")
+        finally:
+            with self._ann_lock:
+                self._ann_building = False
+                self._ann_built_at = time.monotonic()
+    
+    def _ann_add(self, doc_id: Any, embedding: List[float]):
+        """
+        Thêm vector vừa lưu vào HNSW index (nếu đã build) để không phải build lại
+        
+        Args:
+            doc_id (Any): _id document vừa insert
+            embedding (List[float]): Embedding của document
+        """
+        with self._ann_lock:
+            if self._ann is None:
+                return
+            try:
+                vector = np.asarray(embedding, dtype=np.float32)
+                norm = float(np.linalg.norm(vector))
+                self._ann_doc_count += 1
+                if vector.shape[0] != self._ann.dim or norm == 0:
+                    return
+                if self._ann.get_current_count() >= self._ann.get_max_elements():
+                    self._ann.resize_index(self._ann.get_max_elements() * 2)
+                self._ann.add_items((vector / norm)[None, :], [len(self._ann_ids)])
+                self._ann_ids.append(doc_id)
+            except Exception as e:
+                print(f"⚠️ Không thêm được vector vào HNSW index: {e}")
+                self._ann = None
+    
+    def _fetch_documents(self, doc_ids: List[Any], scores: np.ndarray) -> List[Dict[str, Any]]:
+        """
+        Tải đầy đủ documents (không kèm embedding) theo thứ tự doc_ids và gắn similarity_score
+        
+        Args:
+            doc_ids (List[Any]): _id các documents
+            scores (np.ndarray): Similarity tương ứng
+            
+        Returns:
+            List[Dict[str, Any]]: Documents theo đúng thứ tự doc_ids
+        """
+        if not doc_ids:
+            return []
+        collection = self.db_manager.db[self.embeddings_collection]
+        docs_by_id = {
+            doc["_id"]: doc
+            for doc in collection.find(
+                {"_id": {"$in": list(doc_ids)}},
+                {"embedding": 0, "embedding_f16": 0, "embedding_i8": 0, "embedding_i8_scale": 0, "content_tokens": 0}
+            )
+        }
+        
+        results = []
+        for doc_id, score in zip(doc_ids, scores.tolist()):
+            doc = docs_by_id.get(doc_id)
+            if doc is not None:
+                doc["similarity_score"] = score
+                results.append(doc)
+        return results
+    
+    def _atlas_search(self, query_embedding: List[float], limit: int, filters: Dict[str, Any] = None) -> List[Dict[str, Any]]:
+        """
+        Chạy $vectorSearch (ANN phía server), chỉ trả về tối đa limit documents
+        
+        Args:
+            query_embedding (List[float]): Vector query
+            limit (int): Số kết quả tối đa
+            filters (Dict): Filters bổ sung
+            
+        Returns:
+            List[Dict[str, Any]]: Documents kèm similarity_score (0-1)
+        """
+        # Có filter ($match sau $vectorSearch) thì lấy dư candidates để sau khi lọc vẫn đủ limit
+        search_limit = limit * 10 if filters else limit
+        
+        # MongoDB Atlas Vector Search aggregation pipeline
+        pipeline = [
+            {
+                "$vectorSearch": {
+                    "index": "vector_index",
+                    "path": "embedding",
+                    "queryVector": query_embedding,
+                    "numCandidates": min(max(search_limit * 10, 100), 10000),  # Số candidates để tìm
+                    "limit": search_limit
+                }
+            }
+        ]
+        
+        # Thêm filters nếu có
+        if filters:
+            pipeline.append({"$match": filters})
+            pipeline.append({"$limit": limit})
+        
+        # Thêm metadata
+        pipeline.append({
+            "$addFields": {
+                "similarity_score": {"$meta": "vectorSearchScore"}
+            }
+        })
+        
+        # Loại bỏ embedding vector khỏi kết quả
+        pipeline.append({
+            "$project": {
+                "embedding": 0,
+                "embedding_f16": 0,
+                "embedding_i8": 0,
+                "embedding_i8_scale": 0,
+                "content_tokens": 0
+            }
+        })
+        
+        collection = self.db_manager.db[self.embeddings_collection]
+        return list(collection.aggregate(pipeline))
+    
+    def _try_atlas_search(self, query_embedding: List[float], limit: int, filters: Dict[str, Any] = None) -> Optional[List[Dict[str, Any]]]:
+        """
+        Thử Atlas Vector Search, ghi nhớ kết quả để không thử lại khi không khả dụng
+        
+        Args:
+            query_embedding (List[float]): Vector query
+            limit (int): Số kết quả tối đa
+            filters (Dict): Filters bổ sung
+            
+        Returns:
+            Optional[List[Dict[str, Any]]]: Kết quả hoặc None nếu Atlas không khả dụng
+        """
+        if self._atlas_available is False:
+            return None
+        
+        if self._atlas_available is None:
+            # Lần đầu: đảm bảo vector index tồn tại
+            index_result = self._create_vector_index()
+            if not index_result["success"]:
+                print(f"⚠️ {index_result['error']}, dùng scan")
+                self._atlas_available = False
+                return None
+        
+        try:
+            results = self._atlas_search(query_embedding, limit, filters)
+            self._atlas_available = True
+            return results
+        except Exception as e:
+            print(f"⚠️ Atlas vector search failed, dùng scan: {e}")
+            self._atlas_available = False
+            return None
+    
     def vector_search_atlas(self, 
                            query_text: str, 
                            limit: int = None,
@@ -263,8 +992,8 @@ class VectorSearchTool:
             Dict[str, Any]: Kết quả tìm kiếm
         """
         try:
-            # Tạo embedding cho query
-            query_result = self.embedding_tool.create_embedding(query_text)
+            # Tạo embedding cho query (có cache)
+            query_result = self._embed_query(query_text)
             if not query_result["success"]:
                 return {
                     "success": False,
@@ -274,41 +1003,9 @@ class VectorSearchTool:
             query_embedding = query_result["embedding"]
             limit = limit or self.default_limit
             
-            # MongoDB Atlas Vector Search aggregation pipeline
-            pipeline = [
-                {
-                    "$vectorSearch": {
-                        "index": "vector_index",
-                        "path": "embedding",
-                        "queryVector": query_embedding,
-                        "numCandidates": limit * 10,  # Số candidates để tìm
-                        "limit": limit
-                    }
-                }
-            ]
-            
-            # Thêm filters nếu có
-            if filters:
-                pipeline.append({"$match": filters})
-            
-            # Thêm metadata
-            pipeline.append({
-                "$addFields": {
-                    "similarity_score": {"$meta": "vectorSearchScore"}
-                }
-            })
-            
-            # Loại bỏ embedding vector khỏi kết quả
-            pipeline.append({
-                "$project": {
-                    "embedding": 0
-                }
-            })
-            
             # Thực hiện search
-            collection = self.db_manager.db[self.embeddings_collection]
-            cursor = collection.aggregate(pipeline)
-            results = list(cursor)
+            results = self._atlas_search(query_embedding, limit, filters)
+            self._atlas_available = True
             
             return {
                 "success": True,
@@ -323,6 +1020,7 @@ class VectorSearchTool:
         except Exception as e:
             # Fallback to regular similarity search
             print(f"Atlas vector search failed, falling back: {e}")
+            self._atlas_available = False
             return self.similarity_search(query_text, limit, filters)
     
     def hybrid_search(self, 
@@ -347,74 +1045,42 @@ class VectorSearchTool:
         try:
             limit = limit or self.default_limit
             
-            # 1. Vector search
-            vector_results = self.similarity_search(query_text, limit * 2)
+            # 1-2. Vector search và keyword search độc lập -> chạy song song,
+            # keyword query chạy trong lúc tạo query embedding và scan vector
+            with ThreadPoolExecutor(max_workers=1) as executor:
+                keyword_future = executor.submit(self._keyword_search, keywords, limit * 2) if keywords else None
+                vector_results = self.similarity_search(query_text, limit * 2)
+                keyword_results = keyword_future.result() if keyword_future else []
+            
             if not vector_results["success"]:
                 return vector_results
             
-            # 2. Keyword search
-            keyword_results = []
-            if keywords:
-                # Tạo text search query
-                text_filter = {
-                    "$or": [
-                        {"content": {"$regex": keyword, "$options": "i"}} 
-                        for keyword in keywords
-                    ]
-                }
-                
-                collection = self.db_manager.db[self.embeddings_collection]
-                cursor = collection.find(text_filter)
-                
-                for doc in cursor:
-                    # Tính keyword score dựa trên số keyword match
-                    keyword_score = 0
-                    content_lower = doc.get("content", "").lower()
-                    
-                    for keyword in keywords:
-                        if keyword.lower() in content_lower:
-                            keyword_score += 1
-                    
-                    keyword_score = keyword_score / len(keywords) if keywords else 0
-                    
-                    result_doc = {k: v for k, v in doc.items() if k != "embedding"}
-                    result_doc["keyword_score"] = keyword_score
-                    result_doc["doc_id"] = str(doc["_id"])
-                    keyword_results.append(result_doc)
-            
-            # 3. Kết hợp kết quả
+            # 3. Kết hợp kết quả (sửa trực tiếp các dict kết quả, key là _id gốc)
             combined_results = {}
             
             # Thêm vector results
             for result in vector_results["results"]:
-                doc_id = str(result["_id"])
-                combined_results[doc_id] = {
-                    **result,
-                    "vector_score": result.get("similarity_score", 0),
-                    "keyword_score": 0,
-                    "doc_id": doc_id
-                }
+                result["vector_score"] = result.get("similarity_score", 0)
+                result["keyword_score"] = 0
+                result["doc_id"] = str(result["_id"])
+                combined_results[result["_id"]] = result
             
             # Thêm keyword results
             for result in keyword_results:
-                doc_id = result["doc_id"]
-                if doc_id in combined_results:
-                    combined_results[doc_id]["keyword_score"] = result["keyword_score"]
+                existing = combined_results.get(result["_id"])
+                if existing is not None:
+                    existing["keyword_score"] = result["keyword_score"]
                 else:
-                    combined_results[doc_id] = {
-                        **result,
-                        "vector_score": 0
-                    }
+                    result["vector_score"] = 0
+                    combined_results[result["_id"]] = result
             
             # 4. Tính hybrid score
-            final_results = []
-            for doc_id, result in combined_results.items():
-                hybrid_score = (
+            final_results = list(combined_results.values())
+            for result in final_results:
+                result["hybrid_score"] = (
                     result["vector_score"] * vector_weight + 
                     result["keyword_score"] * keyword_weight
                 )
-                result["hybrid_score"] = hybrid_score
-                final_results.append(result)
             
             # 5. Sắp xếp và giới hạn
             final_results.sort(key=lambda x: x["hybrid_score"], reverse=True)
@@ -439,6 +1105,113 @@ class VectorSearchTool:
                 "error": f"Lỗi khi hybrid search: {str(e)}"
             }
     
+    def _ensure_text_index(self) -> bool:
+        """
+        Tạo text index trên content (một lần mỗi process) cho keyword search
+        
+        Returns:
+            bool: True nếu text index dùng được
+        """
+        global _TEXT_INDEX_READY
+        if _TEXT_INDEX_READY is None:
+            try:
+                collection = self.db_manager.db[self.embeddings_collection]
+                # default_language "none": không stem/bỏ stop words theo tiếng Anh (nội dung có tiếng Việt)
+                collection.create_index([("content", "text")], name="content_text", default_language="none")
+                _TEXT_INDEX_READY = True
+            except Exception as e:
+                print(f"⚠️ Không tạo được text index, dùng regex: {e}")
+                _TEXT_INDEX_READY = False
+        return _TEXT_INDEX_READY
+    
+    @staticmethod
+    def tokenize_content(content: str) -> List[str]:
+        """
+        Tách content thành các token chữ thường không trùng (lưu sẵn để so khớp keyword)
+        
+        Args:
+            content (str): Nội dung text
+            
+        Returns:
+            List[str]: Danh sách token
+        """
+        return sorted(set(re.findall(r"\w+", (content or "").lower())))
+    
+    def _ensure_tokens_index(self):
+        """Tạo index (multikey) trên content_tokens, một lần mỗi process"""
+        global _TOKENS_INDEX_READY
+        if _TOKENS_INDEX_READY:
+            return
+        try:
+            self.db_manager.db[self.embeddings_collection].create_index("content_tokens")
+        except Exception as e:
+            print(f"⚠️ Không tạo được index content_tokens: {e}")
+        _TOKENS_INDEX_READY = True
+    
+    def _keyword_search(self, keywords: List[str], limit: int) -> List[Dict[str, Any]]:
+        """
+        Tìm documents theo keywords bằng MongoDB $text (inverted index),
+        fallback regex khi không có text index
+        
+        Args:
+            keywords (List[str]): Keywords cần tìm
+            limit (int): Số kết quả tối đa
+            
+        Returns:
+            List[Dict[str, Any]]: Documents kèm keyword_score (0-1) và doc_id
+        """
+        collection = self.db_manager.db[self.embeddings_collection]
+        projection = {"embedding": 0, "embedding_f16": 0, "embedding_i8": 0, "embedding_i8_scale": 0}
+        
+        keyword_results = []
+        if self._ensure_text_index():
+            cursor = collection.find(
+                {"$text": {"$search": " ".join(keywords)}},
+                {**projection, "content_tokens": 0, "keyword_score": {"$meta": "textScore"}}
+            ).sort([("keyword_score", {"$meta": "textScore"})]).limit(limit)
+            keyword_results = list(cursor)
+            
+            # textScore không giới hạn -> chia cho điểm cao nhất để về [0, 1] như vector score
+            max_score = max((doc["keyword_score"] for doc in keyword_results), default=0)
+            for doc in keyword_results:
+                doc["keyword_score"] = doc["keyword_score"] / max_score if max_score else 0
+                doc["doc_id"] = str(doc["_id"])
+            return keyword_results
+        
+        # Fallback không có text index: so khớp trên content_tokens (tính sẵn lúc lưu, có index),
+        # documents cũ chưa có content_tokens thì dùng regex như trước
+        keyword_tokens = [set(self.tokenize_content(keyword)) for keyword in keywords]
+        all_tokens = sorted(set().union(*keyword_tokens))
+        self._ensure_tokens_index()
+        text_filter = {
+            "$or": [
+                {"content_tokens": {"$in": all_tokens}},
+                {
+                    "content_tokens": {"$exists": False},
+                    "$or": [
+                        {"content": {"$regex": re.escape(keyword), "$options": "i"}}
+                        for keyword in keywords
+                    ]
+                }
+            ]
+        }
+        
+        for doc in collection.find(text_filter, projection):
+            # Tính keyword score dựa trên số keyword match
+            doc_tokens = doc.pop("content_tokens", None)
+            if doc_tokens is not None:
+                doc_tokens = set(doc_tokens)
+                keyword_score = sum(1 for tokens in keyword_tokens if tokens and tokens <= doc_tokens)
+            else:
+                content_lower = doc.get("content", "").lower()
+                keyword_score = sum(1 for keyword in keywords if keyword.lower() in content_lower)
+            
+            doc["keyword_score"] = keyword_score / len(keywords)
+            doc["doc_id"] = str(doc["_id"])
+            keyword_results.append(doc)
+        
+        return keyword_results
+    
     def get_similar_documents(self, 
                              document_id: str, 
                              limit: int = None,
@@ -455,9 +1228,11 @@ class VectorSearchTool:
             Dict[str, Any]: Kết quả tìm kiếm
         """
         try:
-            # Lấy document gốc
+            # Lấy document gốc: _id có thể là chuỗi uuid (EmbeddingService) hoặc ObjectId (insert_one
+            # không truyền _id) -> truyền đúng kiểu để MongoDB tra index _id thay vì so khớp lệch kiểu
             collection = self.db_manager.db[self.embeddings_collection]
-            source_doc = collection.find_one({"_id": document_id})
+            id_query = {"$in": [document_id, ObjectId(document_id)]} if ObjectId.is_valid(document_id) else document_id
+            source_doc = collection.find_one({"_id": id_query}, {"embedding": 1, "content": 1})
             
             if not source_doc:
                 return {
@@ -478,28 +1253,14 @@ class VectorSearchTool:
             # Lấy tất cả documents khác
             filter_query = {}
             if exclude_self:
-                filter_query["_id"] = {"$ne": document_id}
-            
-            cursor = collection.find(filter_query)
+                filter_query["_id"] = {"$ne": source_doc["_id"]}
             
-            # Tính similarity
-            results = []
-            for doc in cursor:
-                if "embedding" not in doc:
-                    continue
-                
-                similarity = self._calculate_cosine_similarity(
-                    source_embedding, 
-                    doc["embedding"]
-                )
-                
-                result_doc = {k: v for k, v in doc.items() if k != "embedding"}
-                result_doc["similarity_score"] = similarity
-                results.append(result_doc)
+            # Tính similarity (chấm sơ bộ bằng int8, rerank ứng viên bằng float16)
+            doc_ids, scores = self._scan_scores(source_embedding, filter_query, limit)
             
             # Sắp xếp và giới hạn
-            results.sort(key=lambda x: x["similarity_score"], reverse=True)
-            results = results[:limit]
+            top = self._top_k(scores, limit)
+            results = self._fetch_documents([doc_ids[i] for i in top], scores[top])
             
             return {
                 "success": True,
@@ -517,35 +1278,103 @@ class VectorSearchTool:
                 "error": f"Lỗi khi tìm similar documents: {str(e)}"
             }
     
+    @staticmethod
+    def _stats_key(value: Any) -> str:
+        """Tên field an toàn cho MongoDB (không chứa '.' hoặc bắt đầu bằng '$')"""
+        return str(value if value is not None else "unknown").replace(".", "_").lstrip("$") or "unknown"
+    
+    @classmethod
+    def record_stats(cls, db, collection_name: str, documents: List[Dict[str, Any]]):
+        """
+        Cộng dồn thống kê (tổng, theo type, theo model) cho các documents vừa insert
+        
+        Args:
+            db: MongoDB database
+            collection_name (str): Tên collection embeddings
+            documents (List[Dict[str, Any]]): Documents vừa insert
+        """
+        if not documents:
+            return
+        increments = {"total": len(documents)}
+        for doc in documents:
+            type_field = f"types.{cls._stats_key(doc.get('type'))}"
+            model_field = f"models.{cls._stats_key(doc.get('embedding_model'))}"
+            increments[type_field] = increments.get(type_field, 0) + 1
+            increments[model_field] = increments.get(model_field, 0) + 1
+        try:
+            db[EMBEDDING_STATS_COLLECTION].update_one(
+                {"_id": collection_name},
+                {"$inc": increments},
+                upsert=True
+            )
+        except Exception as e:
+            # Không chặn việc lưu embedding; get_collection_stats sẽ tự đối chiếu lại
+            print(f"⚠️ Không cập nhật được embedding stats: {e}")
+    
+    def _reconcile_stats(self) -> Dict[str, Any]:
+        """
+        Tính lại thống kê bằng aggregation (quét collection) và ghi đè document stats
+        
+        Returns:
+            Dict[str, Any]: Document stats mới
+        """
+        collection = self.db_manager.db[self.embeddings_collection]
+        facets = next(collection.aggregate([
+            {"$facet": {
+                "total": [{"$count": "count"}],
+                "types": [{"$group": {"_id": "$type", "count": {"$sum": 1}}}],
+                "models": [{"$group": {"_id": "$embedding_model", "count": {"$sum": 1}}}]
+            }}
+        ]), {})
+        
+        stats = {
+            "_id": self.embeddings_collection,
+            "total": facets["total"][0]["count"] if facets.get("total") else 0,
+            "types": {self._stats_key(item["_id"]): item["count"] for item in facets.get("types", [])},
+            "models": {self._stats_key(item["_id"]): item["count"] for item in facets.get("models", [])},
+            "reconciled_at": datetime.utcnow()
+        }
+        self.db_manager.db[EMBEDDING_STATS_COLLECTION].replace_one(
+            {"_id": self.embeddings_collection}, stats, upsert=True
+        )
+        return stats
+    
     def get_collection_stats(self) -> Dict[str, Any]:
         """
         Lấy thống kê về embeddings collection
         
+        Đọc document stats được cập nhật dần khi insert; chỉ quét collection khi stats
+        chưa có, lệch số lượng (có insert/xóa từ nơi khác) hoặc quá STATS_RECONCILE_INTERVAL.
+        
         Returns:
             Dict[str, Any]: Thống kê collection
         """
         try:
             collection = self.db_manager.db[self.embeddings_collection]
+            stats = self.db_manager.db[EMBEDDING_STATS_COLLECTION].find_one({"_id": self.embeddings_collection})
             
-            # Đếm documents
-            total_docs = collection.count_documents({})
-            
-            # Thống kê theo type
-            type_stats = list(collection.aggregate([
-                {"$group": {"_id": "$type", "count": {"$sum": 1}}},
-                {"$sort": {"count": -1}}
-            ]))
+            reconcile_before = datetime.utcnow() - timedelta(seconds=STATS_RECONCILE_INTERVAL)
+            if (
+                stats is None
+                or stats.get("total") != collection.estimated_document_count()
+                or stats.get("reconciled_at", datetime.min) < reconcile_before
+            ):
+                stats = self._reconcile_stats()
             
-            # Thống kê theo model
-            model_stats = list(collection.aggregate([
-                {"$group": {"_id": "$embedding_model", "count": {"$sum": 1}}},
-                {"$sort": {"count": -1}}
-            ]))
+            # Cùng định dạng với kết quả $group trước đây: [{"_id": ..., "count": ...}] giảm dần
+            type_stats = sorted(
+                ({"_id": key, "count": count} for key, count in stats.get("types", {}).items() if count),
+                key=lambda item: item["count"], reverse=True
+            )
+            model_stats = sorted(
+                ({"_id": key, "count": count} for key, count in stats.get("models", {}).items() if count),
+                key=lambda item: item["count"], reverse=True
+            )
             
             return {
                 "success": True,
                 "collection_name": self.embeddings_collection,
-                "total_documents": total_docs,
+                "total_documents": stats.get("total", 0),
                 "type_distribution": type_stats,
                 "embedding_model_distribution": model_stats,
                 "last_updated": datetime.utcnow()
@@ -2,284 +2,1056 @@
 Web Search Tool - Tool tìm kiếm web với GPT-4.1 và đánh giá kết quả
 """
 
-from langchain.tools import tool
+from langchain_core.tools import StructuredTool
 from langchain_openai import ChatOpenAI
-import requests
-from typing import Dict, Any, List
+from langchain_core.prompts import ChatPromptTemplate
+import httpx
+import importlib.util
+from typing import Dict, Any, List, Iterator, AsyncIterator, Literal, Set
+import os
 import json
+import logging
 import time
+import copy
+import asyncio
+import threading
+import weakref
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from collections import OrderedDict
 from datetime import datetime
+from urllib.parse import urlparse
+from pydantic import BaseModel, Field
+import numpy as np
+from tools.embedding_tool import EmbeddingTool
+
+logger = logging.getLogger(__name__)
+
+# HTTP client dùng chung: giữ kết nối keep-alive, không bắt tay TCP/TLS lại mỗi lần search
+DUCKDUCKGO_URL = "https://api.duckduckgo.com/"
+HTTP_TIMEOUT = 10  # giây
+HTTP_LIMITS = httpx.Limits(max_connections=32, max_keepalive_connections=16)
+HTTP2_AVAILABLE = importlib.util.find_spec("h2") is not None  # http2=True cần package h2
+
+# Model cho các bước phụ (đánh giá kết quả, nội dung fallback)
+EVAL_MODEL = "gpt-4.1-mini"
+
+# Timeout HTTP cho các lần gọi OpenAI (client riêng khi bật HTTP/2)
+LLM_HTTP_TIMEOUT = 120  # giây
+
+# Instance SearX có JSON API (ví dụ https://searx.example.org/search); không đặt thì chỉ dùng DuckDuckGo
+SEARX_URL = os.getenv("SEARX_URL") or None
+
+# Tìm song song nhiều engine: khi đã có kết quả chỉ chờ engine chậm thêm tối đa chừng này giây
+SEARCH_FANOUT_TIMEOUT = 3.0
+SEARCH_FANOUT_WORKERS = 8  # thread dùng chung cho fan-out sync của mọi query
+
+# Circuit breaker DuckDuckGo: lỗi liên tiếp trong cửa sổ thời gian -> bỏ qua engine một lúc
+# thay vì chờ timeout HTTP ở mỗi query (đi thẳng sang engine khác / LLM fallback)
+BREAKER_MAX_FAILURES = 3
+BREAKER_WINDOW = 60  # giây
+BREAKER_COOLDOWN = 30  # giây
+
+# Cache trong RAM cho query trùng khớp: tránh gọi lại DuckDuckGo (~1-2s) và LLM đánh giá
+SEARCH_CACHE_SIZE = 1024
+SEARCH_CACHE_TTL = 600  # giây
+EVAL_CACHE_SIZE = 1024
+EVAL_CACHE_TTL = 3600  # giây
+
+# Engine trả về rỗng (HTTP 200 nhưng không có kết quả): cache ngắn để query lặp lại đi thẳng tới LLM fallback
+EMPTY_RESULTS = ()
+EMPTY_RESULTS_TTL = 120  # giây
+
+# Hạn cache theo loại nội dung do LLM đánh giá (ngữ pháp/từ vựng ổn định, tin tức thay đổi nhanh)
+MAX_CACHE_TTL = 7 * 24 * 3600  # giây
+
+# orjson: parser JSON viết bằng Rust, nhanh hơn json chuẩn (không có thì dùng json)
+try:
+    import orjson
+    ORJSON_AVAILABLE = True
+except ImportError:
+    ORJSON_AVAILABLE = False
+
+def _json_loads(data):
+    """Parse JSON (str hoặc bytes, ví dụ body HTTP chưa decode) bằng orjson nếu có"""
+    if ORJSON_AVAILABLE:
+        return orjson.loads(data)
+    return json.loads(data)
+
+# Độ dài nội dung hiển thị trong response và đưa vào prompt đánh giá
+CONTENT_PREVIEW_CHARS = 400
+EVAL_SNIPPET_CHARS = 120  # đủ để đánh giá mức độ liên quan
+
+# Bỏ qua LLM đánh giá khi quyết định hiển nhiên (tổng số ký tự nội dung của các kết quả hiển thị)
+MIN_EVAL_CONTENT_CHARS = 200
+AUTO_ACCEPT_CONTENT_CHARS = 1500
+TRUSTED_DOMAINS = (
+    "wikipedia.org",
+    "britannica.com",
+    "cambridge.org",
+    "oxfordlearnersdictionaries.com",
+    "merriam-webster.com",
+    "bbc.co.uk",
+    "britishcouncil.org"
+)
+
+# Gộp các yêu cầu đánh giá async đến gần nhau thành một lần gọi LLM
+EVAL_BATCH_WINDOW = 0.05  # giây
+EVAL_BATCH_SIZE = 8
+
+# Rubric đánh giá: system message tĩnh, giống hệt nhau giữa các lần gọi để OpenAI
+# prompt caching dùng lại phần prefix (không chèn dữ liệu của từng câu hỏi vào đây)
+EVALUATION_RUBRIC = """Đánh giá kết quả tìm kiếm web cho câu hỏi của người học tiếng Anh.
+Tiêu chí: kết quả có liên quan không, chất lượng thông tin (1-10), có đủ để trả lời không.
+recommendation: "use_search" nếu kết quả tốt và liên quan, ngược lại "llm_response".
+ttl_seconds: 604800 cho kiến thức ổn định (ngữ pháp, từ vựng), 3600 cho tin tức/sự kiện hiện tại,
+0 nếu thông tin thay đổi liên tục (giá cả, tỉ số, thời tiết).
+Khi có nhiều câu hỏi: đánh giá từng câu độc lập, trả về đúng số đánh giá theo thứ tự câu hỏi."""
+
+EVALUATION_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", EVALUATION_RUBRIC),
+    ("user", "Câu hỏi: {query}\n{snippets}")
+])
+BATCH_EVALUATION_PROMPT = ChatPromptTemplate.from_messages([
+    ("system", EVALUATION_RUBRIC),
+    ("user", "{count} câu hỏi:\n\n{sections}")
+])
+
+# Semantic cache: query diễn đạt khác nhưng cùng ý (cosine embedding >= ngưỡng) dùng lại kết quả
+SEMANTIC_CACHE_SIZE = 5000
+SEMANTIC_CACHE_TTL = 3600  # giây
+SEMANTIC_CACHE_THRESHOLD = 0.92
+
+def _chat_model(model: str, temperature: float) -> ChatOpenAI:
+    """Tạo ChatOpenAI cho lời gọi sync; có package h2 thì dùng HTTP client HTTP/2 keep-alive"""
+    kwargs = {}
+    if HTTP2_AVAILABLE:
+        kwargs["http_client"] = httpx.Client(http2=True, limits=HTTP_LIMITS, timeout=LLM_HTTP_TIMEOUT)
+    return ChatOpenAI(model=model, temperature=temperature, **kwargs)
+
+# ChatOpenAI cho lời gọi async, theo từng event loop: AsyncClient của SDK gắn với loop tạo ra nó
+_ASYNC_MODELS = weakref.WeakKeyDictionary()
+_ASYNC_MODELS_LOCK = threading.Lock()
+
+def _async_chat_model(model: str, temperature: float, schema: type = None):
+    """ChatOpenAI (structured output theo schema nếu có) của event loop đang chạy, tạo lazy"""
+    loop = asyncio.get_running_loop()
+    key = (model, temperature, schema)
+    with _ASYNC_MODELS_LOCK:
+        models = _ASYNC_MODELS.setdefault(loop, {})
+        if key not in models:
+            kwargs = {}
+            if HTTP2_AVAILABLE:
+                kwargs["http_async_client"] = httpx.AsyncClient(http2=True, limits=HTTP_LIMITS, timeout=LLM_HTTP_TIMEOUT)
+            llm = ChatOpenAI(model=model, temperature=temperature, **kwargs)
+            models[key] = llm.with_structured_output(schema) if schema is not None else llm
+        return models[key]
+
+# LLM trả lời cho generate_llm_response_for_query, tạo một lần rồi dùng lại
+_LLM_GEN = None
+
+def _get_gen_llm() -> ChatOpenAI:
+    """ChatOpenAI dùng chung cho generate_llm_response_for_query"""
+    global _LLM_GEN
+    if _LLM_GEN is None:
+        _LLM_GEN = _chat_model("gpt-4.1", temperature=0.3)
+    return _LLM_GEN
+
+def _add_preview(result: Dict) -> Dict:
+    """Cắt sẵn nội dung hiển thị một lần lúc tạo kết quả (response và prompt đánh giá không cắt lại)"""
+    content = result.get('content', '')
+    result['content_short'] = content[:CONTENT_PREVIEW_CHARS]
+    result['content_truncated'] = len(content) > CONTENT_PREVIEW_CHARS
+    return result
+
+def _with_previews(results: List[Dict]) -> List[Dict]:
+    """Đảm bảo kết quả có content_short (kết quả do caller tự tạo chưa qua _add_preview)"""
+    return [r if 'content_short' in r else _add_preview(r) for r in results]
+
+class SearchEvaluation(BaseModel):
+    """Đánh giá kết quả tìm kiếm của một câu hỏi (structured output của LLM)"""
+    is_relevant: bool = Field(description="Các kết quả có liên quan đến câu hỏi không")
+    quality_score: int = Field(description="Chất lượng thông tin, từ 1 đến 10")
+    summary: str = Field(description="Tóm tắt ngắn gọn về kết quả")
+    recommendation: Literal["use_search", "llm_response"] = Field(
+        description='"use_search" nếu kết quả tốt và liên quan, ngược lại "llm_response"'
+    )
+    ttl_seconds: int = Field(description="Số giây thông tin này còn đúng")
+
+class SearchEvaluationBatch(BaseModel):
+    """Đánh giá của nhiều câu hỏi, theo đúng thứ tự câu hỏi"""
+    evaluations: List[SearchEvaluation]
+
+class KnowledgeResult(BaseModel):
+    """Nội dung LLM tạo từ kiến thức khi web search không có kết quả"""
+    title: str = Field(description="Tiêu đề thông tin")
+    content: str = Field(description="Nội dung chi tiết (tiếng Việt + English examples nếu có)")
+    relevance: Literal["high", "medium", "low"]
+
+class _TTLCache:
+    """Cache LRU trong RAM, mỗi entry có hạn dùng riêng (thread-safe)"""
+    
+    def __init__(self, maxsize: int, ttl: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[Any, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    def get(self, key: Any) -> Any:
+        """Lấy bản copy của value, None nếu không có hoặc đã hết hạn"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+        # Trả về bản copy để caller sửa kết quả không làm hỏng cache
+        return copy.deepcopy(value)
+    
+    def set(self, key: Any, value: Any, ttl: float = None):
+        """Lưu value với hạn dùng ttl giây (mặc định self.ttl)"""
+        expires_at = time.monotonic() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (expires_at, copy.deepcopy(value))
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+class _SemanticCache:
+    """Cache theo độ tương đồng embedding của query: ma trận vector đã chuẩn hóa + vòng FIFO"""
+    
+    def __init__(self, maxsize: int, ttl: float, threshold: float):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.threshold = threshold
+        self._vectors = None  # (capacity, dim) float32, cấp phát tăng dần tới maxsize
+        self._entries: List[tuple] = []  # (expires_at, query, results) theo cùng hàng với _vectors
+        self._next = 0  # hàng sẽ ghi đè khi đã đầy (FIFO)
+        self._lock = threading.Lock()
+    
+    def get(self, vector: np.ndarray) -> Any:
+        """Tìm entry gần nhất; trả về (query gốc, bản copy results) nếu đủ giống và còn hạn"""
+        with self._lock:
+            if not self._entries:
+                return None
+            scores = self._vectors[:len(self._entries)] @ vector
+            best = int(np.argmax(scores))
+            expires_at, query, results = self._entries[best]
+            if scores[best] < self.threshold or expires_at <= time.monotonic():
+                return None
+        return query, copy.deepcopy(results)
+    
+    def set(self, vector: np.ndarray, query: str, results: List[Dict]):
+        """Thêm entry mới, ghi đè entry cũ nhất khi đã đủ maxsize"""
+        entry = (time.monotonic() + self.ttl, query, copy.deepcopy(results))
+        with self._lock:
+            if self._vectors is None or self._vectors.shape[1] != vector.shape[0]:
+                self._vectors = np.empty((min(64, self.maxsize), vector.shape[0]), dtype=np.float32)
+                self._entries = []
+                self._next = 0
+            
+            if len(self._entries) < self.maxsize:
+                row = len(self._entries)
+                if row == self._vectors.shape[0]:
+                    # Tăng gấp đôi dung lượng (tối đa maxsize)
+                    grown = np.empty((min(row * 2, self.maxsize), vector.shape[0]), dtype=np.float32)
+                    grown[:row] = self._vectors
+                    self._vectors = grown
+                self._entries.append(entry)
+            else:
+                row = self._next
+                self._next = (self._next + 1) % self.maxsize
+                self._entries[row] = entry
+            self._vectors[row] = vector
+
+# Thread pool dùng chung cho search_all_engines (không tạo executor mới mỗi query)
+_SEARCH_EXECUTOR = ThreadPoolExecutor(max_workers=SEARCH_FANOUT_WORKERS, thread_name_prefix="web-search")
+
+# Task search async của engine chậm vẫn chạy tiếp sau khi đã trả kết quả gộp (để ghi vào cache
+# như bản sync); giữ tham chiếu tới khi xong để task không bị garbage collect giữa chừng
+_BACKGROUND_SEARCHES: Set[asyncio.Task] = set()
 
 class WebSearchTool:
     """Tool tìm kiếm web với GPT-4.1"""
     
     def __init__(self):
-        self.llm = ChatOpenAI(model="gpt-4.1", temperature=0.2)
+        self.llm = _chat_model("gpt-4.1", temperature=0.2)
+        
+        # Structured output: LLM trả về đúng schema, không phải tách JSON khỏi text
+        # Đánh giá kết quả và nội dung fallback là việc nhỏ -> model nhỏ, nhanh và rẻ hơn;
+        # self.llm (gpt-4.1) chỉ dành cho câu trả lời cuối
+        self.eval_llm = _chat_model(EVAL_MODEL, temperature=0)
+        self._evaluation_llm = self.eval_llm.with_structured_output(SearchEvaluation)
+        self._evaluation_batch_llm = self.eval_llm.with_structured_output(SearchEvaluationBatch)
+        self._knowledge_llm = self.eval_llm.with_structured_output(KnowledgeResult)
         self.search_engines = {
             "duckduckgo": "https://api.duckduckgo.com/",
-            "searx": "https://searx.space/search"  # Public instance
+            "searx": SEARX_URL  # None: không cấu hình instance SearX
         }
+        
+        # Client sync cho các tool sync; AsyncClient tạo lazy, mỗi event loop một client
+        # (kết nối của AsyncClient gắn với loop tạo ra nó)
+        self._http_sync = httpx.Client(timeout=HTTP_TIMEOUT, limits=HTTP_LIMITS, http2=HTTP2_AVAILABLE)
+        self._http = weakref.WeakKeyDictionary()
+        self._http_lock = threading.Lock()
+        
+        # Trạng thái circuit breaker của DuckDuckGo (dùng chung giữa các thread)
+        self._breaker = {"failures": 0, "first_failure": 0.0, "open_until": 0.0}
+        self._breaker_lock = threading.Lock()
+        
+        # Cache kết quả DuckDuckGo theo (query, max_results) và kết quả đánh giá theo (query, kết quả)
+        self._search_cache = _TTLCache(SEARCH_CACHE_SIZE, SEARCH_CACHE_TTL)
+        self._eval_cache = _TTLCache(EVAL_CACHE_SIZE, EVAL_CACHE_TTL)
+        
+        # Semantic cache cho query gần giống nhau (embedding tạo lazy, lỗi thì bỏ qua cache)
+        self._semantic_cache = _SemanticCache(SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_TTL, SEMANTIC_CACHE_THRESHOLD)
+        self._embedding_tool = None
+        
+        # Gộp các lần đánh giá async đồng thời
+        self._batch_evaluator = BatchingEvaluator(self)
+    
+    @staticmethod
+    def _eval_key(query: str, results: List[Dict]) -> tuple:
+        """Key cache đánh giá: query + các kết quả được đưa vào prompt"""
+        return (query, tuple(r.get('url') or r.get('title', '') for r in results[:3]))
+    
+    @staticmethod
+    def _cache_ttl(value: Any) -> float:
+        """Hạn cache (giây) từ ttl_seconds của LLM, mặc định EVAL_CACHE_TTL nếu thiếu/không hợp lệ"""
+        try:
+            return min(max(float(value), 0.0), MAX_CACHE_TTL)
+        except (TypeError, ValueError):
+            return EVAL_CACHE_TTL
+    
+    def _embed_query(self, query: str):
+        """Embedding đã chuẩn hóa của query, None nếu không tạo được"""
+        try:
+            if self._embedding_tool is None:
+                self._embedding_tool = EmbeddingTool()
+            result = self._embedding_tool.create_embedding(query, normalize=False)
+            if not result["success"]:
+                return None
+            vector = np.asarray(result["embedding"], dtype=np.float32)
+            norm = float(np.linalg.norm(vector))
+            return vector / norm if norm > 0 else None
+        except Exception as e:
+            logger.warning("⚠️ Không tạo được embedding cho semantic cache: %s", e)
+            return None
     
     def search_duckduckgo(self, query: str, max_results: int = 5) -> List[Dict]:
         """Tìm kiếm qua DuckDuckGo API"""
+        cache_key = (query, max_results)
+        cached = self._search_cache.get(cache_key)
+        if cached is not None:
+            # EMPTY_RESULTS: lần trước engine không có kết quả -> không gọi lại
+            return list(cached)
+        if self._breaker_is_open():
+            return []
+        
         try:
-            params = {
-                'q': query,
-                'format': 'json',
-                'no_html': '1',
-                'skip_disambig': '1'
-            }
-            
-            response = requests.get(
-                "https://api.duckduckgo.com/",
-                params=params,
-                timeout=10
-            )
-            
-            if response.status_code == 200:
-                data = response.json()
-                results = []
-                
-                # Lấy kết quả từ RelatedTopics
-                if 'RelatedTopics' in data:
-                    for topic in data['RelatedTopics'][:max_results]:
-                        if isinstance(topic, dict) and 'Text' in topic:
-                            results.append({
-                                'title': topic.get('Text', '')[:100],
-                                'content': topic.get('Text', ''),
-                                'url': topic.get('FirstURL', ''),
-                                'source': 'DuckDuckGo'
-                            })
-                
-                # Nếu không có RelatedTopics, dùng Abstract
-                if not results and 'Abstract' in data and data['Abstract']:
-                    results.append({
-                        'title': data.get('Heading', 'Search Result'),
-                        'content': data['Abstract'],
-                        'url': data.get('AbstractURL', ''),
-                        'source': 'DuckDuckGo'
-                    })
-                
-                return results
-            
+            response = self._http_sync.get(DUCKDUCKGO_URL, params=self._duckduckgo_params(query))
+            if response.status_code != 200:
+                self._breaker_failure()
+                return []
+            self._breaker_success()
+            return self._handle_duckduckgo_response(response, cache_key, max_results)
+        except Exception as e:
+            self._breaker_failure()
+            logger.warning("DuckDuckGo search error: %s", e)
+        
+        return []
+    
+    async def search_duckduckgo_async(self, query: str, max_results: int = 5) -> List[Dict]:
+        """Tìm kiếm qua DuckDuckGo API (async, không chặn event loop của agent)"""
+        cache_key = (query, max_results)
+        cached = self._search_cache.get(cache_key)
+        if cached is not None:
+            # EMPTY_RESULTS: lần trước engine không có kết quả -> không gọi lại
+            return list(cached)
+        if self._breaker_is_open():
+            return []
+        
+        try:
+            response = await self._get_async_http().get(DUCKDUCKGO_URL, params=self._duckduckgo_params(query))
+            if response.status_code != 200:
+                self._breaker_failure()
+                return []
+            self._breaker_success()
+            return self._handle_duckduckgo_response(response, cache_key, max_results)
+        except Exception as e:
+            self._breaker_failure()
+            logger.warning("DuckDuckGo search error: %s", e)
+        
+        return []
+    
+    def _breaker_is_open(self) -> bool:
+        """DuckDuckGo đang bị ngắt (lỗi liên tiếp gần đây) -> không gọi"""
+        with self._breaker_lock:
+            return time.monotonic() < self._breaker["open_until"]
+    
+    def _breaker_failure(self):
+        """Ghi nhận một lần DuckDuckGo lỗi; đủ BREAKER_MAX_FAILURES trong BREAKER_WINDOW thì ngắt"""
+        now = time.monotonic()
+        with self._breaker_lock:
+            if now - self._breaker["first_failure"] > BREAKER_WINDOW:
+                self._breaker["failures"] = 0
+                self._breaker["first_failure"] = now
+            self._breaker["failures"] += 1
+            if self._breaker["failures"] >= BREAKER_MAX_FAILURES:
+                self._breaker["open_until"] = now + BREAKER_COOLDOWN
+                self._breaker["failures"] = 0
+                logger.warning("DuckDuckGo circuit breaker open for %ss", BREAKER_COOLDOWN)
+    
+    def _breaker_success(self):
+        """DuckDuckGo trả lời bình thường -> reset bộ đếm lỗi"""
+        with self._breaker_lock:
+            self._breaker["failures"] = 0
+            self._breaker["open_until"] = 0.0
+    
+    def _get_async_http(self) -> httpx.AsyncClient:
+        """AsyncClient của event loop đang chạy (tạo lazy, dùng lại trong cùng loop)"""
+        loop = asyncio.get_running_loop()
+        with self._http_lock:
+            client = self._http.get(loop)
+            if client is None:
+                client = self._http[loop] = httpx.AsyncClient(
+                    timeout=HTTP_TIMEOUT, limits=HTTP_LIMITS, http2=HTTP2_AVAILABLE
+                )
+            return client
+    
+    @staticmethod
+    def _duckduckgo_params(query: str) -> Dict[str, str]:
+        """Query params cho DuckDuckGo Instant Answer API"""
+        return {
+            'q': query,
+            'format': 'json',
+            'no_html': '1',
+            'skip_disambig': '1'
+        }
+    
+    def _handle_duckduckgo_response(self, response: httpx.Response, cache_key: tuple, max_results: int) -> List[Dict]:
+        """Chuyển response DuckDuckGo thành danh sách kết quả và lưu cache"""
+        if response.status_code != 200:
+            return []
+        
+        data = _json_loads(response.content)
+        results = []
+        
+        # Lấy kết quả từ RelatedTopics: duyệt cả nhóm con (Topics lồng nhau) theo thứ tự,
+        # bỏ URL trùng trước khi cắt max_results
+        if 'RelatedTopics' in data:
+            seen_urls = set()
+            stack = list(reversed(data['RelatedTopics']))
+            while stack and len(results) < max_results:
+                topic = stack.pop()
+                if not isinstance(topic, dict):
+                    continue
+                if 'Topics' in topic:
+                    stack.extend(reversed(topic['Topics']))
+                if 'Text' not in topic:
+                    continue
+                url = topic.get('FirstURL', '')
+                if url:
+                    if url.lower() in seen_urls:
+                        continue
+                    seen_urls.add(url.lower())
+                results.append({
+                    'title': topic.get('Text', '')[:100],
+                    'content': topic.get('Text', ''),
+                    'url': url,
+                    'source': 'DuckDuckGo'
+                })
+        
+        # Nếu không có RelatedTopics, dùng Abstract
+        if not results and 'Abstract' in data and data['Abstract']:
+            results.append({
+                'title': data.get('Heading', 'Search Result'),
+                'content': data['Abstract'],
+                'url': data.get('AbstractURL', ''),
+                'source': 'DuckDuckGo'
+            })
+        
+        for result in results:
+            _add_preview(result)
+        self._cache_search_results(cache_key, results)
+        return results
+    
+    def search_searx(self, query: str, max_results: int = 5) -> List[Dict]:
+        """Tìm kiếm qua SearX (JSON API)"""
+        if not self.search_engines["searx"]:
+            return []
+        cache_key = ("searx", query, max_results)
+        cached = self._search_cache.get(cache_key)
+        if cached is not None:
+            # EMPTY_RESULTS: lần trước engine không có kết quả -> không gọi lại
+            return list(cached)
+        
+        try:
+            response = self._http_sync.get(self.search_engines["searx"], params=self._searx_params(query))
+            return self._handle_searx_response(response, cache_key, max_results)
         except Exception as e:
-            print(f"DuckDuckGo search error: {e}")
+            logger.warning("SearX search error: %s", e)
         
         return []
     
+    async def search_searx_async(self, query: str, max_results: int = 5) -> List[Dict]:
+        """Tìm kiếm qua SearX (async)"""
+        if not self.search_engines["searx"]:
+            return []
+        cache_key = ("searx", query, max_results)
+        cached = self._search_cache.get(cache_key)
+        if cached is not None:
+            # EMPTY_RESULTS: lần trước engine không có kết quả -> không gọi lại
+            return list(cached)
+        
+        try:
+            response = await self._get_async_http().get(self.search_engines["searx"], params=self._searx_params(query))
+            return self._handle_searx_response(response, cache_key, max_results)
+        except Exception as e:
+            logger.warning("SearX search error: %s", e)
+        
+        return []
+    
+    def _cache_search_results(self, cache_key: tuple, results: List[Dict]):
+        """Cache kết quả engine; không có kết quả thì cache EMPTY_RESULTS với hạn ngắn"""
+        if results:
+            self._search_cache.set(cache_key, results)
+        else:
+            self._search_cache.set(cache_key, EMPTY_RESULTS, ttl=EMPTY_RESULTS_TTL)
+    
+    @staticmethod
+    def _searx_params(query: str) -> Dict[str, str]:
+        """Query params cho SearX JSON API"""
+        return {
+            'q': query,
+            'format': 'json'
+        }
+    
+    def _handle_searx_response(self, response: httpx.Response, cache_key: tuple, max_results: int) -> List[Dict]:
+        """Chuyển response SearX thành danh sách kết quả và lưu cache"""
+        if response.status_code != 200:
+            return []
+        
+        results = []
+        for item in _json_loads(response.content).get('results', [])[:max_results]:
+            content = item.get('content') or item.get('title', '')
+            if not content:
+                continue
+            results.append({
+                'title': item.get('title', '')[:100],
+                'content': content,
+                'url': item.get('url', ''),
+                'source': 'SearX'
+            })
+        
+        for result in results:
+            _add_preview(result)
+        self._cache_search_results(cache_key, results)
+        return results
+    
+    @staticmethod
+    def _merge_results(result_lists: List[List[Dict]]) -> List[Dict]:
+        """Gộp kết quả nhiều search engine theo thứ tự, bỏ trùng URL"""
+        merged = []
+        seen_urls = set()
+        for results in result_lists:
+            for result in results:
+                url = result.get('url', '').lower()
+                if url:
+                    if url in seen_urls:
+                        continue
+                    seen_urls.add(url)
+                merged.append(result)
+        return merged
+    
+    def search_all_engines(self, query: str, max_results: int = 5) -> List[Dict]:
+        """
+        Tìm song song trên DuckDuckGo và SearX rồi gộp kết quả
+        
+        Khi đã có engine trả về kết quả, chỉ chờ các engine còn lại tối đa SEARCH_FANOUT_TIMEOUT giây.
+        """
+        if not self.search_engines["searx"]:
+            return self.search_duckduckgo(query, max_results)
+        
+        futures = [
+            _SEARCH_EXECUTOR.submit(self.search_duckduckgo, query, max_results),
+            _SEARCH_EXECUTOR.submit(self.search_searx, query, max_results)
+        ]
+        done, pending = wait(futures, timeout=SEARCH_FANOUT_TIMEOUT)
+        while pending and not any(future.result() for future in done):
+            # Chưa có kết quả nào: chờ tiếp (mỗi request tự giới hạn bởi HTTP_TIMEOUT)
+            more, pending = wait(pending, return_when=FIRST_COMPLETED)
+            done |= more
+        # Không chờ engine chậm (kết quả của nó vẫn vào cache khi về)
+        return self._merge_results([future.result() for future in futures if future in done])
+    
+    async def search_all_engines_async(self, query: str, max_results: int = 5) -> List[Dict]:
+        """Tìm song song trên DuckDuckGo và SearX (async) rồi gộp kết quả"""
+        if not self.search_engines["searx"]:
+            return await self.search_duckduckgo_async(query, max_results)
+        
+        tasks = [
+            asyncio.create_task(self.search_duckduckgo_async(query, max_results)),
+            asyncio.create_task(self.search_searx_async(query, max_results))
+        ]
+        done, pending = await asyncio.wait(tasks, timeout=SEARCH_FANOUT_TIMEOUT)
+        while pending and not any(task.result() for task in done):
+            # Chưa có kết quả nào: chờ tiếp (mỗi request tự giới hạn bởi HTTP_TIMEOUT)
+            more, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            done |= more
+        for task in pending:
+            # Không hủy engine chậm: để nó chạy xong trong nền và ghi kết quả vào _search_cache
+            _BACKGROUND_SEARCHES.add(task)
+            task.add_done_callback(_BACKGROUND_SEARCHES.discard)
+        return self._merge_results([task.result() for task in tasks if task in done])
+    
     def search_with_llm_fallback(self, query: str) -> List[Dict]:
         """Tìm kiếm với LLM fallback khi API không khả dụng"""
         try:
-            # Thử tìm kiếm qua API trước
-            results = self.search_duckduckgo(query)
-            
-            if results:
+            # Query trùng khớp đã tìm gần đây: trả về ngay, không gọi embedding
+            results = self._search_cache.get(("query", query))
+            if results is not None:
                 return results
             
-            # Fallback: Dùng LLM để tạo nội dung dựa trên kiến thức
-            llm_prompt = f"""
-            Người dùng tìm kiếm: "{query}"
-            
-            Vì không tìm thấy kết quả web search, hãy cung cấp thông tin hữu ích dựa trên kiến thức của bạn.
-            Tập trung vào giáo dục tiếng Anh và học tập.
-            
-            Trả về JSON format:
-            {{
-                "title": "Tiêu đề thông tin",
-                "content": "Nội dung chi tiết (tiếng Việt + English examples nếu có)",
-                "source": "GPT-4.1 Knowledge",
-                "relevance": "high/medium/low"
-            }}
-            """
+            # Query gần giống một query đã tìm -> dùng lại kết quả (và đánh giá) của query đó
+            query_vector, results = self._semantic_lookup(query, self._embed_query(query))
+            if results is not None:
+                return results
             
-            llm_response = self.llm.invoke(llm_prompt)
+            # Thử tìm kiếm qua API trước
+            results = self.search_all_engines(query)
+            if not results:
+                # Fallback: Dùng LLM để tạo nội dung dựa trên kiến thức
+                results = self._knowledge_results(self._knowledge_llm.invoke(self._knowledge_prompt(query)))
             
-            try:
-                # Parse JSON từ LLM response
-                import re
-                json_match = re.search(r'\{.*\}', llm_response.content, re.DOTALL)
-                if json_match:
-                    result_data = json.loads(json_match.group())
-                    return [{
-                        'title': result_data.get('title', 'Knowledge Base Result'),
-                        'content': result_data.get('content', llm_response.content),
-                        'url': '',
-                        'source': 'GPT-4.1 Knowledge',
-                        'relevance': result_data.get('relevance', 'medium')
-                    }]
-            except:
-                # Nếu không parse được JSON, dùng raw content
-                return [{
-                    'title': f'Thông tin về: {query}',
-                    'content': llm_response.content,
-                    'url': '',
-                    'source': 'GPT-4.1 Knowledge',
-                    'relevance': 'medium'
-                }]
+            self._semantic_store(query_vector, query, results)
+            return results
                 
         except Exception as e:
-            return [{
-                'title': 'Lỗi tìm kiếm',
-                'content': f'Không thể tìm kiếm thông tin về "{query}". Lỗi: {str(e)}',
-                'url': '',
-                'source': 'Error',
-                'relevance': 'low'
-            }]
+            return self._search_error(query, e)
     
-    def evaluate_search_results(self, query: str, results: List[Dict]) -> Dict[str, Any]:
-        """Đánh giá kết quả tìm kiếm bằng LLM"""
+    async def search_with_llm_fallback_async(self, query: str) -> List[Dict]:
+        """Tìm kiếm với LLM fallback (async)"""
         try:
-            if not results:
-                return {
-                    "is_relevant": False,
-                    "quality_score": 0,
-                    "summary": "Không tìm thấy kết quả nào",
-                    "recommendation": "llm_response"
-                }
-            
-            # Tạo prompt đánh giá
-            results_text = "\n\n".join([
-                f"Kết quả {i+1}:\nTiêu đề: {r['title']}\nNội dung: {r['content'][:300]}..."
-                for i, r in enumerate(results[:3])
-            ])
+            results = self._search_cache.get(("query", query))
+            if results is not None:
+                return results
             
-            evaluation_prompt = f"""
-            Câu hỏi gốc: "{query}"
+            query_vector = await asyncio.to_thread(self._embed_query, query)
+            query_vector, results = self._semantic_lookup(query, query_vector)
+            if results is not None:
+                return results
             
-            Kết quả tìm kiếm:
-            {results_text}
+            # Chạy trước LLM fallback song song với web search: search có kết quả thì hủy,
+            # không có thì câu trả lời LLM đã chạy được một phần thời gian
+            fallback_task = asyncio.create_task(self._llm_fallback_async(query))
+            try:
+                results = await self.search_all_engines_async(query)
+            except BaseException:
+                fallback_task.cancel()
+                raise
             
-            Hãy đánh giá:
-            1. Các kết quả có liên quan đến câu hỏi không?
-            2. Chất lượng thông tin (1-10)
-            3. Có đủ thông tin để trả lời không?
+            if results:
+                fallback_task.cancel()
+            else:
+                results = await fallback_task
             
-            Trả về JSON:
-            {{
-                "is_relevant": true/false,
-                "quality_score": 1-10,
-                "summary": "Tóm tắt ngắn gọn về kết quả",
-                "recommendation": "use_search" hoặc "llm_response"
-            }}
+            self._semantic_store(query_vector, query, results)
+            return results
+        
+        except Exception as e:
+            return self._search_error(query, e)
+    
+    async def _llm_fallback_async(self, query: str) -> List[Dict]:
+        """Tạo kết quả từ kiến thức LLM (async)"""
+        knowledge_llm = _async_chat_model(EVAL_MODEL, 0, KnowledgeResult)
+        return self._knowledge_results(await knowledge_llm.ainvoke(self._knowledge_prompt(query)))
+    
+    def _semantic_lookup(self, query: str, query_vector):
+        """Tra semantic cache; trả về (query_vector, results hoặc None)"""
+        if query_vector is None:
+            return None, None
+        hit = self._semantic_cache.get(query_vector)
+        if hit is None:
+            return query_vector, None
+        cached_query, results = hit
+        evaluation = self._eval_cache.get(self._eval_key(cached_query, results))
+        if evaluation is not None:
+            self._eval_cache.set(self._eval_key(query, results), evaluation)
+        self._search_cache.set(("query", query), results)
+        return query_vector, results
+    
+    def _semantic_store(self, query_vector, query: str, results: List[Dict]):
+        """Lưu kết quả cuối theo query trùng khớp và vào semantic cache (bỏ qua kết quả lỗi)"""
+        if not results or results[0].get('source') == 'Error':
+            return
+        # Key ("query", ...) tách riêng khỏi cache của từng engine
+        self._search_cache.set(("query", query), results)
+        if query_vector is not None:
+            self._semantic_cache.set(query_vector, query, results)
+    
+    @staticmethod
+    def _knowledge_prompt(query: str) -> str:
+        """Prompt tạo nội dung từ kiến thức LLM khi web search không có kết quả"""
+        return f"""
+            Người dùng tìm kiếm: "{query}"
             
-            Lưu ý: Nếu kết quả tốt và liên quan, chọn "use_search". Nếu không đủ tốt, chọn "llm_response".
+            Vì không tìm thấy kết quả web search, hãy cung cấp thông tin hữu ích dựa trên kiến thức của bạn.
+            Tập trung vào giáo dục tiếng Anh và học tập.
             """
+    
+    @staticmethod
+    def _knowledge_results(knowledge: KnowledgeResult) -> List[Dict]:
+        """Chuyển nội dung LLM tạo từ kiến thức thành kết quả search"""
+        return [_add_preview({
+            'title': knowledge.title or 'Knowledge Base Result',
+            'content': knowledge.content,
+            'url': '',
+            'source': 'GPT-4.1 Knowledge',
+            'relevance': knowledge.relevance
+        })]
+    
+    @staticmethod
+    def _search_error(query: str, error: Exception) -> List[Dict]:
+        """Kết quả thay thế khi tìm kiếm lỗi"""
+        return [_add_preview({
+            'title': 'Lỗi tìm kiếm',
+            'content': f'Không thể tìm kiếm thông tin về "{query}". Lỗi: {str(error)}',
+            'url': '',
+            'source': 'Error',
+            'relevance': 'low'
+        })]
+    
+    def evaluate_search_results(self, query: str, results: List[Dict]) -> Dict[str, Any]:
+        """Đánh giá kết quả tìm kiếm bằng LLM"""
+        try:
+            precheck = self._evaluation_precheck(query, results)
+            if precheck is not None:
+                return precheck
             
-            evaluation = self.llm.invoke(evaluation_prompt)
+            evaluation = self._evaluation_llm.invoke(self._evaluation_prompt(query, results))
+            return self._store_evaluation(query, results, evaluation.model_dump())
             
-            try:
-                # Parse JSON từ evaluation
-                import re
-                json_match = re.search(r'\{.*\}', evaluation.content, re.DOTALL)
-                if json_match:
-                    eval_data = json.loads(json_match.group())
-                    return eval_data
-            except:
-                pass
+        except Exception as e:
+            return self._evaluation_error(e)
+    
+    async def evaluate_search_results_async(self, query: str, results: List[Dict]) -> Dict[str, Any]:
+        """Đánh giá kết quả tìm kiếm bằng LLM (async, gộp với các yêu cầu đồng thời khác)"""
+        try:
+            precheck = self._evaluation_precheck(query, results)
+            if precheck is not None:
+                return precheck
             
-            # Fallback evaluation
-            return {
-                "is_relevant": len(results) > 0,
-                "quality_score": 5,
-                "summary": f"Tìm thấy {len(results)} kết quả",
-                "recommendation": "use_search" if results else "llm_response"
-            }
+            return await self._batch_evaluator.evaluate(query, results)
             
         except Exception as e:
+            return self._evaluation_error(e)
+    
+    def _evaluation_precheck(self, query: str, results: List[Dict]) -> Any:
+        """Đánh giá không cần gọi LLM (không có kết quả hoặc có trong cache), None nếu cần gọi"""
+        if not results:
             return {
                 "is_relevant": False,
                 "quality_score": 0,
-                "summary": f"Lỗi đánh giá: {str(e)}",
+                "summary": "Không tìm thấy kết quả nào",
                 "recommendation": "llm_response"
             }
+        
+        # Quyết định hiển nhiên không cần LLM: nội dung quá ít, hoặc đủ dài và toàn nguồn uy tín
+        shown = results[:3]
+        total_chars = sum(len(r.get('content', '')) for r in shown)
+        if total_chars < MIN_EVAL_CONTENT_CHARS:
+            return {
+                "is_relevant": False,
+                "quality_score": 2,
+                "summary": f"Kết quả quá ngắn ({total_chars} ký tự) để trả lời",
+                "recommendation": "llm_response"
+            }
+        if total_chars > AUTO_ACCEPT_CONTENT_CHARS and all(self._is_trusted_url(r.get('url', '')) for r in shown):
+            return {
+                "is_relevant": True,
+                "quality_score": 8,
+                "summary": f"Tìm thấy {len(results)} kết quả từ nguồn uy tín",
+                "recommendation": "use_search"
+            }
+        
+        # Cache theo query + các kết quả được đưa vào prompt
+        return self._eval_cache.get(self._eval_key(query, results))
+    
+    @staticmethod
+    def _is_trusted_url(url: str) -> bool:
+        """URL thuộc một domain trong TRUSTED_DOMAINS (kể cả subdomain)"""
+        host = urlparse(url).hostname or ''
+        return any(host == domain or host.endswith('.' + domain) for domain in TRUSTED_DOMAINS)
+    
+    @staticmethod
+    def _results_text(results: List[Dict]) -> str:
+        """Snippet ngắn của các kết quả đưa vào prompt đánh giá (không kèm URL)"""
+        lines = []
+        for i, r in enumerate(_with_previews(results[:3])):
+            snippet = r['content_short'][:EVAL_SNIPPET_CHARS]
+            # Tiêu đề DuckDuckGo là phần đầu của nội dung -> không lặp lại
+            if r['title'] and not snippet.startswith(r['title']):
+                snippet = f"{r['title']}: {snippet}"
+            lines.append(f"{i+1}. {snippet}")
+        return "\n".join(lines)
+    
+    def _evaluation_prompt(self, query: str, results: List[Dict]) -> List:
+        """Messages đánh giá kết quả tìm kiếm của một câu hỏi"""
+        return EVALUATION_PROMPT.format_messages(query=query, snippets=self._results_text(results))
+    
+    def _batch_evaluation_prompt(self, items: List[tuple]) -> List:
+        """Messages đánh giá nhiều câu hỏi trong một lần gọi LLM"""
+        sections = "\n\n".join(
+            f"Câu hỏi {i+1}: {query}\n{self._results_text(results)}"
+            for i, (query, results) in enumerate(items)
+        )
+        return BATCH_EVALUATION_PROMPT.format_messages(count=len(items), sections=sections)
+    
+    def _store_evaluation(self, query: str, results: List[Dict], eval_data: Dict[str, Any]) -> Dict[str, Any]:
+        """Lưu đánh giá vào cache với hạn theo ttl_seconds của LLM"""
+        ttl = self._cache_ttl(eval_data.pop("ttl_seconds", None))
+        if ttl > 0:
+            self._eval_cache.set(self._eval_key(query, results), eval_data, ttl=ttl)
+        # Không ghi _search_cache ở đây: results có thể là kết quả gộp nhiều engine hoặc của
+        # query khác (semantic cache); mỗi engine tự cache kết quả gốc của nó
+        return eval_data
+    
+    @staticmethod
+    def _evaluation_error(error: Exception) -> Dict[str, Any]:
+        """Đánh giá khi có lỗi"""
+        return {
+            "is_relevant": False,
+            "quality_score": 0,
+            "summary": f"Lỗi đánh giá: {str(error)}",
+            "recommendation": "llm_response"
+        }
 
-# Khởi tạo tool instance
-web_search_tool = WebSearchTool()
-
-@tool
-def search_web_with_evaluation(query: str) -> str:
+class BatchingEvaluator:
     """
-    Tìm kiếm thông tin trên web khi knowledge base không có, sau đó đánh giá kết quả
-    
-    Args:
-        query: Câu hỏi hoặc từ khóa cần tìm kiếm
+    Gộp các yêu cầu đánh giá đồng thời (async) thành một lần gọi LLM
     
-    Returns:
-        Kết quả tìm kiếm đã được đánh giá hoặc gợi ý sử dụng LLM
+    Yêu cầu đầu tiên mở một cửa sổ EVAL_BATCH_WINDOW giây; các yêu cầu đến trong cửa sổ
+    (tối đa EVAL_BATCH_SIZE) được đánh giá chung trong một prompt trả về JSON array.
+    Chỉ có một yêu cầu thì dùng prompt đánh giá đơn như bản sync.
     """
-    try:
-        # Bước 1: Tìm kiếm web
-        search_results = web_search_tool.search_with_llm_fallback(query)
+    
+    def __init__(self, tool: "WebSearchTool", window: float = None, max_batch: int = None):
+        self.tool = tool
+        self.window = EVAL_BATCH_WINDOW if window is None else window
+        self.max_batch = max_batch or EVAL_BATCH_SIZE
+        # Trạng thái batch theo từng event loop (future/task chỉ dùng được trong loop tạo ra nó)
+        self._states = weakref.WeakKeyDictionary()
+    
+    def _state(self) -> Dict[str, Any]:
+        """Batch đang chờ, timer và các task đang chạy của event loop hiện tại"""
+        loop = asyncio.get_running_loop()
+        state = self._states.get(loop)
+        if state is None:
+            state = self._states[loop] = {"pending": [], "flush_task": None, "tasks": set()}
+        return state
+    
+    async def evaluate(self, query: str, results: List[Dict]) -> Dict[str, Any]:
+        """Thêm yêu cầu vào batch hiện tại và chờ kết quả đánh giá"""
+        state = self._state()
+        future = asyncio.get_running_loop().create_future()
+        state["pending"].append((query, results, future))
+        if len(state["pending"]) >= self.max_batch:
+            self._flush(state)
+        elif state["flush_task"] is None:
+            state["flush_task"] = self._spawn(state, self._flush_after_window(state))
+        return await future
+    
+    @staticmethod
+    def _spawn(state: Dict[str, Any], coro) -> asyncio.Task:
+        """Tạo task và giữ reference tới khi xong (event loop chỉ giữ weak reference)"""
+        task = asyncio.create_task(coro)
+        state["tasks"].add(task)
+        task.add_done_callback(state["tasks"].discard)
+        return task
+    
+    async def _flush_after_window(self, state: Dict[str, Any]):
+        try:
+            await asyncio.sleep(self.window)
+        except asyncio.CancelledError:
+            # Timer bị hủy (thường do loop đang đóng): hủy các yêu cầu đang chờ thay vì để treo
+            for _, _, future in state["pending"]:
+                future.cancel()
+            state["pending"] = []
+            raise
+        finally:
+            state["flush_task"] = None
+        self._flush(state)
+    
+    def _flush(self, state: Dict[str, Any]):
+        """Tách batch đang chờ và chạy đánh giá trong task riêng"""
+        batch, state["pending"] = state["pending"][:self.max_batch], state["pending"][self.max_batch:]
+        if batch:
+            self._spawn(state, self._run_batch(batch))
+    
+    async def _run_batch(self, batch: List[tuple]):
+        try:
+            if len(batch) == 1:
+                query, results, _ = batch[0]
+                evaluation_llm = _async_chat_model(EVAL_MODEL, 0, SearchEvaluation)
+                evaluation = await evaluation_llm.ainvoke(self.tool._evaluation_prompt(query, results))
+                evaluations = [self.tool._store_evaluation(query, results, evaluation.model_dump())]
+            else:
+                evaluations = await self._evaluate_many(batch)
+        except asyncio.CancelledError:
+            for _, _, future in batch:
+                future.cancel()
+            raise
+        except Exception as e:
+            evaluations = [self.tool._evaluation_error(e)] * len(batch)
         
-        if not search_results:
-            return """🌐 **Không tìm thấy kết quả web**
-
-❌ Không có thông tin từ tìm kiếm web
-💡 **Gợi ý:** LLM sẽ trả lời dựa trên kiến thức có sẵn
-
-**Trạng thái:** llm_response_needed"""
+        for (_, _, future), evaluation in zip(batch, evaluations):
+            if not future.done():
+                future.set_result(dict(evaluation))
+    
+    async def _evaluate_many(self, batch: List[tuple]) -> List[Dict[str, Any]]:
+        """Một lần gọi LLM cho cả batch; số đánh giá không khớp thì đánh giá riêng từng yêu cầu"""
+        items = [(query, results) for query, results, _ in batch]
+        batch_llm = _async_chat_model(EVAL_MODEL, 0, SearchEvaluationBatch)
+        response = await batch_llm.ainvoke(self.tool._batch_evaluation_prompt(items))
+        evaluations = response.evaluations
         
-        # Bước 2: Đánh giá kết quả
-        evaluation = web_search_tool.evaluate_search_results(query, search_results)
+        # LLM trả về thiếu/thừa đánh giá: đánh giá riêng từng yêu cầu (song song)
+        if len(evaluations) != len(items):
+            evaluations = await asyncio.gather(*[
+                _async_chat_model(EVAL_MODEL, 0, SearchEvaluation).ainvoke(self.tool._evaluation_prompt(query, results))
+                for query, results in items
+            ])
         
-        # Bước 3: Quyết định response
-        if evaluation.get("recommendation") == "use_search" and evaluation.get("quality_score", 0) >= 6:
-            # Kết quả tốt, hiển thị search results
-            formatted_results = []
-            for i, result in enumerate(search_results[:3], 1):
-                formatted_results.append(f"""
+        return [
+            self.tool._store_evaluation(query, results, evaluation.model_dump())
+            for (query, results), evaluation in zip(items, evaluations)
+        ]
+
+# Khởi tạo tool instance
+web_search_tool = WebSearchTool()
+
+# Template response của search_web_with_evaluation (format một lần, không ghép chuỗi trong vòng lặp)
+_RESULT_TEMPLATE = """
 🔍 **Kết quả {i}**
-📝 **Tiêu đề:** {result['title']}
-🌐 **Nguồn:** {result['source']}
-📄 **Nội dung:** {result['content'][:400]}{'...' if len(result['content']) > 400 else ''}
-{f"🔗 **Link:** {result['url']}" if result['url'] else ''}
-""")
-            
-            return f"""🌐 **Kết quả tìm kiếm web**
+📝 **Tiêu đề:** {title}
+🌐 **Nguồn:** {source}
+📄 **Nội dung:** {content}{ellipsis}
+{link_line}
+"""
+
+_SEARCH_RESULTS_TEMPLATE = """🌐 **Kết quả tìm kiếm web**
 
-📊 **Đánh giá:** {evaluation['summary']}
-⭐ **Chất lượng:** {evaluation['quality_score']}/10
+📊 **Đánh giá:** {summary}
+⭐ **Chất lượng:** {quality_score}/10
 
-{''.join(formatted_results)}
+{results}
 
 💡 **Dựa trên kết quả trên, tôi có thể giúp bạn trả lời câu hỏi chi tiết hơn.**
 **Trạng thái:** search_results_ready"""
-        
-        else:
-            # Kết quả không tốt, gợi ý dùng LLM
-            return f"""🌐 **Kết quả tìm kiếm web không đạt yêu cầu**
 
-📊 **Đánh giá:** {evaluation['summary']}
-⭐ **Chất lượng:** {evaluation['quality_score']}/10
+_SEARCH_REJECTED_TEMPLATE = """🌐 **Kết quả tìm kiếm web không đạt yêu cầu**
+
+📊 **Đánh giá:** {summary}
+⭐ **Chất lượng:** {quality_score}/10
 
 ❌ **Lý do:** Thông tin không đủ chính xác hoặc không liên quan
 💡 **Gợi ý:** LLM sẽ trả lời dựa trên kiến thức chuyên môn
 
 **Trạng thái:** llm_response_needed"""
-            
-    except Exception as e:
-        return f"""🌐 **Lỗi tìm kiếm web**
 
-❌ **Lỗi:** {str(e)}
+_NO_RESULTS_RESPONSE = """🌐 **Không tìm thấy kết quả web**
+
+❌ Không có thông tin từ tìm kiếm web
 💡 **Gợi ý:** LLM sẽ trả lời dựa trên kiến thức có sẵn
 
 **Trạng thái:** llm_response_needed"""
 
-@tool
-def generate_llm_response_for_query(query: str) -> str:
+_SEARCH_ERROR_TEMPLATE = """🌐 **Lỗi tìm kiếm web**
+
+❌ **Lỗi:** {error}
+💡 **Gợi ý:** LLM sẽ trả lời dựa trên kiến thức có sẵn
+
+**Trạng thái:** llm_response_needed"""
+
+def _search_web_with_evaluation(query: str) -> str:
     """
-    Tạo response bằng LLM khi web search không khả dụng hoặc không phù hợp
+    Tìm kiếm thông tin trên web khi knowledge base không có, sau đó đánh giá kết quả
     
     Args:
-        query: Câu hỏi cần trả lời
+        query: Câu hỏi hoặc từ khóa cần tìm kiếm
     
     Returns:
-        Response từ LLM dựa trên kiến thức có sẵn
+        Kết quả tìm kiếm đã được đánh giá hoặc gợi ý sử dụng LLM
     """
     try:
-        llm = ChatOpenAI(model="gpt-4.1", temperature=0.3)
+        # Bước 1: Tìm kiếm web
+        search_results = web_search_tool.search_with_llm_fallback(query)
+        if not search_results:
+            return _NO_RESULTS_RESPONSE
+        
+        # Bước 2: Đánh giá kết quả
+        evaluation = web_search_tool.evaluate_search_results(query, search_results)
         
-        response_prompt = f"""
+        # Bước 3: Quyết định response
+        return _format_search_response(search_results, evaluation)
+            
+    except Exception as e:
+        return _SEARCH_ERROR_TEMPLATE.format(error=str(e))
+
+async def _search_web_with_evaluation_async(query: str) -> str:
+    """Bản async của search_web_with_evaluation: HTTP và LLM đều await trên event loop của agent"""
+    try:
+        search_results = await web_search_tool.search_with_llm_fallback_async(query)
+        if not search_results:
+            return _NO_RESULTS_RESPONSE
+        
+        evaluation = await web_search_tool.evaluate_search_results_async(query, search_results)
+        return _format_search_response(search_results, evaluation)
+            
+    except Exception as e:
+        return _SEARCH_ERROR_TEMPLATE.format(error=str(e))
+
+# Tool có cả hai đường: agent async (ainvoke) chạy coroutine, caller sync (invoke / gọi trực tiếp)
+# dùng bản sync với httpx.Client riêng thay vì asyncio.run mỗi lần
+search_web_with_evaluation = StructuredTool.from_function(
+    func=_search_web_with_evaluation,
+    coroutine=_search_web_with_evaluation_async,
+    name="search_web_with_evaluation"
+)
+
+def _format_search_response(search_results: List[Dict], evaluation: Dict[str, Any]) -> str:
+    """Tạo response của tool từ kết quả tìm kiếm và đánh giá"""
+    if evaluation.get("recommendation") == "use_search" and evaluation.get("quality_score", 0) >= 6:
+        # Kết quả tốt, hiển thị search results
+        formatted_results = "".join(
+            _RESULT_TEMPLATE.format(
+                i=i,
+                title=result['title'],
+                source=result['source'],
+                content=result['content_short'],
+                ellipsis='...' if result['content_truncated'] else '',
+                link_line=f"🔗 **Link:** {result['url']}" if result['url'] else ''
+            )
+            for i, result in enumerate(_with_previews(search_results[:3]), 1)
+        )
+        return _SEARCH_RESULTS_TEMPLATE.format(
+            summary=evaluation['summary'],
+            quality_score=evaluation['quality_score'],
+            results=formatted_results
+        )
+    
+    # Kết quả không tốt, gợi ý dùng LLM
+    return _SEARCH_REJECTED_TEMPLATE.format(
+        summary=evaluation['summary'],
+        quality_score=evaluation['quality_score']
+    )
+
+def _tutor_prompt(query: str) -> str:
+    """Prompt AI Tutor trả lời câu hỏi bằng kiến thức của LLM"""
+    return f"""
         Câu hỏi: "{query}"
         
         Bạn là AI Tutor chuyên về tiếng Anh. Hãy trả lời câu hỏi trên dựa trên kiến thức của bạn.
@@ -297,16 +1069,42 @@ def generate_llm_response_for_query(query: str) -> str:
         
         💡 *Lưu ý: Thông tin này dựa trên kiến thức AI. Bạn có thể tham khảo thêm nguồn khác.*
         """
-        
-        llm_response = llm.invoke(response_prompt)
-        return llm_response.content
-        
-    except Exception as e:
-        return f"""🤖 **AI Tutor Response**
+
+def generate_llm_response_stream(query: str) -> Iterator[str]:
+    """
+    Stream response của LLM theo từng đoạn để hiển thị ngay khi có token đầu tiên
+    
+    Args:
+        query: Câu hỏi cần trả lời
+    
+    Returns:
+        Iterator các đoạn text của response
+    """
+    for chunk in _get_gen_llm().stream(_tutor_prompt(query)):
+        if chunk.content:
+            yield chunk.content
+
+async def generate_llm_response_astream(query: str) -> AsyncIterator[str]:
+    """
+    Bản async của generate_llm_response_stream
+    
+    Args:
+        query: Câu hỏi cần trả lời
+    
+    Returns:
+        AsyncIterator các đoạn text của response
+    """
+    async for chunk in _async_chat_model("gpt-4.1", 0.3).astream(_tutor_prompt(query)):
+        if chunk.content:
+            yield chunk.content
+
+def _llm_error_response(query: str, error: Exception) -> str:
+    """Response của AI Tutor khi LLM lỗi"""
+    return f"""🤖 **AI Tutor Response**
 
 Xin lỗi, tôi gặp lỗi khi xử lý câu hỏi: "{query}"
 
-❌ **Lỗi:** {str(e)}
+❌ **Lỗi:** {str(error)}
 
 💡 **Gợi ý:** Bạn có thể:
 - Diễn đạt lại câu hỏi
@@ -314,3 +1112,34 @@ Xin lỗi, tôi gặp lỗi khi xử lý câu hỏi: "{query}"
 - Upload tài liệu liên quan để tôi có thêm ngữ cảnh
 
 *Lưu ý: Đây là response tự động từ AI Tutor.*"""
+
+def _generate_llm_response_for_query(query: str) -> str:
+    """
+    Tạo response bằng LLM khi web search không khả dụng hoặc không phù hợp
+    
+    Args:
+        query: Câu hỏi cần trả lời
+    
+    Returns:
+        Response từ LLM dựa trên kiến thức có sẵn
+    """
+    try:
+        # Dùng chung đường stream, gom các chunk lại thành response hoàn chỉnh
+        return "".join(generate_llm_response_stream(query))
+        
+    except Exception as e:
+        return _llm_error_response(query, e)
+
+async def _generate_llm_response_for_query_async(query: str) -> str:
+    """Bản async của generate_llm_response_for_query"""
+    try:
+        return "".join([chunk async for chunk in generate_llm_response_astream(query)])
+        
+    except Exception as e:
+        return _llm_error_response(query, e)
+
+generate_llm_response_for_query = StructuredTool.from_function(
+    func=_generate_llm_response_for_query,
+    coroutine=_generate_llm_response_for_query_async,
+    name="generate_llm_response_for_query"
+)